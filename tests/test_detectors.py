@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the detector bank: the registered detectors against the standalone
+detectors, and block by block against whole run estimates.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import numpy as np
+
+from lteu_wifi.parser import RegMon
+from lteu_wifi.detectors import DetectorBank
+from lteu_wifi.ed_detector import EdDetector
+from lteu_wifi.online_ed_detector import OnlineEdDetector, MIN_VECTORIZED_BATCH
+from lteu_wifi.phase_detector import to_uniform_grid
+from lteu_wifi.synth_trace import generate_regmon_counters, format_regmon_lines
+
+def make_regmon_dat():
+    return RegMon().decode_regmon_fields(generate_regmon_counters(20, duty_cycle=0.4, seed=5))
+
+def test_ed_matches_ed_detector():
+    regmon_dat = make_regmon_dat()
+    result = DetectorBank(['ed']).estimate(regmon_dat)['ed']
+    assert result == EdDetector().estimate_eff_available_airtime_wifi(regmon_dat)
+
+def test_blocks_match_whole_run():
+    regmon_dat = make_regmon_dat()
+    whole = DetectorBank().estimate(regmon_dat)
+    bank = DetectorBank()
+    for start in range(0, regmon_dat.size, 3000):
+        bank.update(regmon_dat[start:start + 3000])
+    blocks = bank.get_results()
+    for name, result in whole.items():
+        assert np.isclose(blocks[name], result, atol=1e-3), name
+
+def test_phase_keeps_one_segment():
+    regmon_dat = make_regmon_dat()
+    bank = DetectorBank(['phase'])
+    detector = bank.detectors['phase']
+    for start in range(0, regmon_dat.size, 1000):
+        bank.update(regmon_dat[start:start + 1000])
+        # bins of at most one segment (5 s at 0.5 ms) plus one block are kept
+        assert detector.num_pending <= 10000 + 1000
+    assert np.isclose(bank.get_results()['phase'], 0.6, atol=0.02)
+
+def test_uniform_grid_backward_steps():
+    # a sample stepping back in time goes into its own bin
+    ktime = np.array([0, 1, 2, 5, 3, 4, 6], dtype=np.uint64) * 1000000
+    grid, t0 = to_uniform_grid(ktime, np.arange(7.0), 1e6)
+    assert t0 == 0
+    np.testing.assert_array_equal(grid, [0, 1, 2, 4, 5, 3, 6])
+
+def test_online_per_line_matches_vectorized():
+    # small batches are decoded sample by sample, large ones vectorized: same flags, malformed
+    # lines (truncated, empty field) are skipped by both
+    lines = format_regmon_lines(generate_regmon_counters(2, reset_rate=0.02, seed=7))
+    lines[10] = lines[10].replace(' ', '  ', 1)
+    lines[500] = lines[500][:20]
+    lines[1500] = lines[1500].replace(' ', ' x ', 1)
+    results = []
+    for batch_len in (MIN_VECTORIZED_BATCH - 1, MIN_VECTORIZED_BATCH * 4):
+        detector = OnlineEdDetector()
+        ktimes, flags = [], []
+        for start in range(0, len(lines), batch_len):
+            batch_ktimes, batch_flags = detector.decode_lines(lines[start:start + batch_len])
+            ktimes += batch_ktimes
+            flags += batch_flags
+        assert detector.num_malformed == 2
+        results.append((np.array(ktimes, dtype=np.uint64), np.array(flags, dtype=bool)))
+    np.testing.assert_array_equal(results[0][0], results[1][0])
+    np.testing.assert_array_equal(results[0][1], results[1][1])
+    assert results[0][0].size == len(lines) - 3 and results[0][1].any()
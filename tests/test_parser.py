@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the trace parsers: the vectorized decoders against the per sample
+reference loops & the compact storage of decoded RegMon data.
+
+Usage:
+    pip install -e .
+    python3 -m pytest tests
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import json
+import numpy as np
+import pytest
+
+from lteu_wifi.parser import Iperf3, RegMon, CompactRegMon
+from lteu_wifi.synth_trace import generate_regmon_counters, write_regmon_fields_pklz, format_regmon_lines, \
+    generate_iperf3_doc, write_iperf3_pklz
+
+def assert_equal_fields(dat, ref):
+    # field by field, nan in the same places
+    assert dat.dtype.names == ref.dtype.names
+    for name in ref.dtype.names:
+        np.testing.assert_array_equal(dat[name], ref[name], err_msg=name)
+
+### RegMon decoder ###
+def make_edge_case_fields():
+    # synthetic samples with MIB resets (also to a MAC counter of zero & to the same value),
+    # TX/RX/ED deltas exceeding the MAC delta & falling counters
+    fields = generate_regmon_counters(2, reset_rate=0.02, seed=3)
+    mac, tx, rx, ed = 2, 3, 4, 5
+    fields[100, mac] = 0                            # reset to zero: rel_* undefined
+    fields[200, mac] = fields[199, mac]             # unchanged MAC counter counts as reset
+    fields[300, tx] = fields[299, tx] + 10 ** 7     # TX delta > MAC delta: clamped
+    fields[400, rx] = fields[399, rx] + 10 ** 7
+    fields[500, ed] = fields[499, ed] + 10 ** 7
+    fields[600, tx] = 0                             # falling TX counter: negative delta
+    fields[700, 7] = 12345                          # ACK failures
+    return fields
+
+def make_edge_case_lines():
+    # lines of make_edge_case_fields with fixed & variable field widths & empty lines
+    fields = make_edge_case_fields()
+    lines = format_regmon_lines(fields, fixed_width=True)
+    var_lines = format_regmon_lines(fields, fixed_width=False)
+    lines[1::3] = var_lines[1::3]
+    for pos in (50, 51, 800):
+        lines.insert(pos, '')
+    return lines
+
+def test_regmon_decode_matches_loop():
+    lines = make_edge_case_lines()
+    regmon = RegMon()
+    regmon_dat = regmon.decode_regmon_data(lines)
+    assert_equal_fields(regmon_dat, RegMon().decode_regmon_data_loop(lines))
+    # all edge cases did happen
+    assert regmon.stats['mib_resets'] > 2
+    assert regmon.stats['clamped_tx'] and regmon.stats['clamped_rx'] and regmon.stats['clamped_ed']
+    assert regmon.stats['nan_rows'] >= 1 and regmon.stats['empty_lines'] == 3
+    assert regmon_dat['d_tx'].min() < 0
+
+def test_regmon_decode_fixed_width_matches_loop():
+    # fast path for equally wide lines only
+    lines = format_regmon_lines(make_edge_case_fields(), fixed_width=True)
+    assert_equal_fields(RegMon().decode_regmon_data(lines), RegMon().decode_regmon_data_loop(lines))
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_regmon_decode_iter_matches_loop(chunk_size):
+    lines = make_edge_case_lines()
+    chunks = [lines[i:i + chunk_size] for i in range(0, len(lines), chunk_size)]
+    chunks.insert(1, []) # empty chunk
+    regmon_dat = np.concatenate(list(RegMon().decode_regmon_data_iter(chunks)))
+    assert_equal_fields(regmon_dat, RegMon().decode_regmon_data_loop(lines))
+
+### Iperf3 decoder ###
+@pytest.fixture(params=[0, 1], ids=['tx', 'rx'])
+def iperf3_file(request, tmp_path):
+    # synthetic iperf output with -nan throughput in some intervals, a cookie with usec and
+    # reverse (downlink) or not
+    doc = json.loads(generate_iperf3_doc(10, seed=4, cookie_usec=123456).replace(b'-nan', b'"NAN"'))
+    doc['start']['test_start']['reverse'] = request.param
+    for pos in (0, 17, 99):
+        doc['intervals'][pos]['sum']['bits_per_second'] = 'NAN'
+    fn = str(tmp_path / 'iperf3.pklz')
+    write_iperf3_pklz(fn, json.dumps(doc).replace('"NAN"', '-nan').encode('utf-8'), compresslevel=1)
+    return fn
+
+def test_iperf3_decode_matches_loop(iperf3_file):
+    iperf = Iperf3()
+    dat = iperf.load_data(iperf3_file)
+    iperf3_dat = iperf.decode_iperf3_data(dat)
+    assert_equal_fields(iperf3_dat, Iperf3().decode_iperf3_data_loop(dat))
+    assert iperf.stats['nan_intervals'] == 3
+    assert iperf3_dat['ktime'][0] == 1482495000123456000 + 100000000
+
+### CompactRegMon ###
+@pytest.fixture
+def regmon_reset_file(tmp_path):
+    # clean synthetic trace with MIB resets, incl. ones the decoder doesn't detect as such
+    fn = str(tmp_path / 'regmon.pklz')
+    write_regmon_fields_pklz(fn, generate_regmon_counters(60, reset_rate=0.01, seed=0), compresslevel=1)
+    return fn
+
+def test_compact_roundtrip_with_resets(regmon_reset_file):
+    regmon_dat = RegMon().load_decoded(regmon_reset_file)
+    # negative TX/RX deltas are valid decoder output
+    assert regmon_dat['d_tx'].min() < 0 or regmon_dat['d_rx'].min() < 0
+    assert_equal_fields(RegMon().load_compact(regmon_reset_file).to_array(), regmon_dat)
+    assert_equal_fields(RegMon().load_compact(regmon_reset_file, streaming=True).to_array(), regmon_dat)
+
+def test_compact_wide_counters():
+    # deltas beyond the int32 range are kept as int64
+    regmon_dat = RegMon().decode_regmon_fields(generate_regmon_counters(1, seed=1))
+    regmon_dat['d_tx'][0] = -2 ** 31 - 1
+    regmon_dat['d_mac'][1] = 2 ** 32 - 1
+    compact = CompactRegMon.from_array(regmon_dat)
+    assert compact.get_raw('d_tx').dtype == np.int64
+    assert compact.get_raw('d_rx').dtype == np.int32
+    for name in ('ktime', 'd_mac', 'd_tx', 'd_rx'):
+        np.testing.assert_array_equal(compact[name], regmon_dat[name], err_msg=name)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the on-disk cache of decoded traces: store & load round trip,
+invalidation on changed trace files, eviction and the decoder counters of cached
+traces.
+
+Usage:
+    pip install -e .
+    python3 -m pytest tests
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import numpy as np
+import pytest
+
+from lteu_wifi.parser import Iperf3, RegMon
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.synth_trace import generate_regmon_counters, write_regmon_fields_pklz, generate_iperf3_doc, \
+    write_iperf3_pklz
+
+@pytest.fixture
+def regmon_file(tmp_path):
+    fn = str(tmp_path / 'regmon.pklz')
+    write_regmon_fields_pklz(fn, generate_regmon_counters(10, reset_rate=0.01, seed=1), compresslevel=1)
+    return fn
+
+@pytest.fixture
+def iperf3_file(tmp_path):
+    fn = str(tmp_path / 'iperf3.pklz')
+    write_iperf3_pklz(fn, generate_iperf3_doc(10, seed=2), compresslevel=1)
+    return fn
+
+def test_round_trip(tmp_path, regmon_file):
+    cache = TraceCache(str(tmp_path / 'cache'))
+    dat = RegMon().decode_regmon_data(RegMon().load_data(regmon_file))
+    assert cache.load(regmon_file, 'v1') is None
+    cache.store(regmon_file, 'v1', dat)
+    cached = cache.load(regmon_file, 'v1')
+    assert cached.dtype == dat.dtype
+    np.testing.assert_array_equal(cached, dat)
+    # memory mapped & read-only
+    assert isinstance(cached, np.memmap) and not cached.flags.writeable
+    # another decoder version is another entry
+    assert cache.load(regmon_file, 'v2') is None
+    assert cache.stats == {'hits': 1, 'misses': 2, 'stores': 1, 'evictions': 0}
+
+def test_get_or_decode_decodes_once(tmp_path, regmon_file):
+    cache = TraceCache(str(tmp_path / 'cache'))
+    calls = []
+    def decode(fn):
+        calls.append(fn)
+        return np.arange(10.0)
+    for _ in range(3):
+        np.testing.assert_array_equal(cache.get_or_decode(regmon_file, 'v1', decode), np.arange(10.0))
+    assert calls == [regmon_file]
+
+@pytest.mark.parametrize('change', ['size', 'mtime', 'content'])
+def test_invalidation(tmp_path, regmon_file, change):
+    # size & mtime key an entry, with content_hash size & content: a change of the content
+    # at the same size & mtime isn't seen by the former, a touched file misses only there
+    for content_hash in (False, True):
+        cache = TraceCache(str(tmp_path / ('cache_%d' % content_hash)), content_hash=content_hash)
+        cache.store(regmon_file, 'v1', np.arange(10.0))
+        st = os.stat(regmon_file)
+        with open(regmon_file, 'r+b') as fo:
+            data = fo.read()
+            if change == 'size':
+                fo.write(b'\0')
+            elif change == 'content':
+                fo.seek(len(data) // 2)
+                fo.write(bytes([data[len(data) // 2] ^ 0xff]))
+        # same mtime unless the mtime is what changes
+        mtime_ns = st.st_mtime_ns + (10 ** 9 if change == 'mtime' else 0)
+        os.utime(regmon_file, ns=(st.st_atime_ns, mtime_ns))
+        missed = cache.load(regmon_file, 'v1') is None
+        assert missed == {'size': True, 'mtime': not content_hash, 'content': content_hash}[change]
+        # restore the file for the next cache
+        with open(regmon_file, 'wb') as fo:
+            fo.write(data)
+        os.utime(regmon_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def test_eviction(tmp_path, regmon_file, iperf3_file):
+    # least recently used entries go first, together with their decoder counters
+    cache = TraceCache(str(tmp_path / 'cache'), max_size=1)
+    cache.store(regmon_file, 'v1', np.arange(10.0), counts={'samples': 10})
+    assert cache.stats['evictions'] == 1
+    assert os.listdir(cache.cache_dir) == []
+    cache.max_size = 10 ** 6
+    cache.store(regmon_file, 'v1', np.arange(10.0), counts={'samples': 10})
+    cache.store(iperf3_file, 'v1', np.arange(10.0))
+    assert len(os.listdir(cache.cache_dir)) == 3
+    cache.clear()
+    assert os.listdir(cache.cache_dir) == []
+
+def test_counters_on_cache_hit(tmp_path, regmon_file, iperf3_file):
+    # decoder counters are the same on a cold & a warm cache and without cache
+    cache = TraceCache(str(tmp_path / 'cache'))
+    runs = []
+    for cache_arg in (cache, cache, None):
+        regmon, iperf = RegMon(cache=cache_arg), Iperf3(cache=cache_arg)
+        regmon.load_decoded(regmon_file)
+        iperf.load_decoded(iperf3_file)
+        runs.append((regmon.stats, iperf.stats))
+    assert cache.stats['misses'] == 2 and cache.stats['stores'] == 2 and cache.stats['hits'] == 2
+    assert runs[1] == runs[0] and runs[2] == runs[0]
+    assert runs[0][0]['samples'] > 0 and runs[0][0]['mib_resets'] > 0
+    assert runs[0][1]['intervals'] == 100
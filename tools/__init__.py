@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+This is the lteu_wifi package: parsers of the recorded traces (RegMon, iperf &
+IOMeter), the LTE-U detectors and the scripts running them on whole campaigns.
+
+Nothing is imported here, i.e. importing a submodule only pulls in what it
+needs (numpy for the parsers & detectors, matplotlib only when plotting).
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+__version__ = '1.0.0'
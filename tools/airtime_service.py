@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+This is an asyncio service monitoring the effective available airtime of many
+APs at once. RegMon lines in the recorded hex format are received from UNIX or
+TCP stream connections (one AP per connection) and UDP datagrams (one AP per
+datagram), decoded in batches with the RegMon delta logic in a process pool and
+turned into a rolling ED estimate per AP (same threshold semantics as EdDetector
+over the last samples), which is served as JSON by a local HTTP endpoint.
+
+Lines may be prefixed by the AP name and a space (see replay.py --tag), otherwise
+a stream connection is named by its number. Each AP has a bounded buffer of
+received lines: a full buffer stops reading from its connection, i.e. the
+sender is slowed down, datagrams are dropped and counted. Every batch_ms the
+buffered lines of all APs are decoded, the APs split into one group per worker
+process; decoding of an AP is sequential.
+
+Latency per AP is the time from receiving a batch until the estimate includes it.
+
+Usage:
+    python3 airtime_service.py --unix /tmp/regmon.sock --http 8080
+    python3 replay.py ../traces --target unix:/tmp/regmon.sock --tag --copies 100
+    curl http://127.0.0.1:8080/aps
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import urllib.parse
+import collections
+import concurrent.futures
+import numpy as np
+
+from lteu_wifi.parser import RegMon, REGMON_NUM_FIELDS
+
+# received bytes buffered per AP before the sender is blocked (streams) or data is dropped (UDP)
+MAX_BUFFER_BYTES = 1 << 20
+# max. bytes read from a stream connection at once
+READ_SIZE = 1 << 16
+# received lines are decoded at most every BATCH_MS per AP
+BATCH_MS = 20.0
+# latencies kept per AP for the percentiles
+NUM_RECENT_LATENCIES = 1000
+
+def get_tag(data):
+    # AP name & prefix (name and space) of the first line of data if prefixed by the AP name
+    # (see replay.py --tag), else (None, None)
+    parts = data[:data.find(b'\n')].split(b' ', REGMON_NUM_FIELDS)
+    if len(parts) > REGMON_NUM_FIELDS:
+        return parts[0].decode('ascii', 'replace'), parts[0] + b' '
+    return None, None
+
+def decode_batch(data, prefix, prev_line, threshold):
+    # decodes a batch of complete RegMon lines (bytes, optionally each prefixed by prefix) of one
+    # AP, prev_line is the last line of the previous batch. Returns the interference flags of the
+    # samples, the ktime of the last sample, the last line & the decoder stats.
+    if prefix:
+        data = data[len(prefix):].replace(b'\n' + prefix, b'\n')
+    lines = [line for line in data.decode('ascii').split('\n') if line]
+    if prev_line is not None:
+        lines.insert(0, prev_line)
+    regmon = RegMon()
+    block = regmon.decode_regmon_fields(regmon.get_regmon_fields_array(lines))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # same as EdDetector: d_others / 0 is inf (interfered), 0 / 0 is nan (not interfered)
+        flags = block['d_others'] / block['d_mac'] > threshold
+    ktime = int(block['ktime'][-1]) if block.size else None
+    return flags, ktime, lines[-1] if lines else prev_line, regmon.stats
+
+def decode_batches(jobs, threshold):
+    # decode_batch of the (data, prefix, prev_line) jobs of several APs in one call of a worker
+    # process; malformed batches give the ValueError instead of the result
+    results = []
+    for data, prefix, prev_line in jobs:
+        try:
+            results.append(decode_batch(data, prefix, prev_line, threshold))
+        except ValueError as ex:
+            results.append(ex)
+    return results
+
+### ApMonitor ###
+class ApMonitor():
+    # rolling ED estimate & metrics of one AP, updated with the decoded batches
+    def __init__(self, name, window_len=2000, max_buffer=MAX_BUFFER_BYTES):
+        self.name = name
+        self.window_len = window_len
+        # received lines not decoded yet, the time the oldest of them was received & whether
+        # there is space for more
+        self.max_buffer = max_buffer
+        self.buf = bytearray()
+        self.t_recv = None
+        self.space = asyncio.Event()
+        self.space.set()
+        self.prefix = None
+        self.prev_line = None
+        # interference flags of the last window_len samples, as arrays of the decoded batches
+        self.window = collections.deque()
+        self.num_in_window = 0
+        self.num_in_intf = 0
+        # since start, i.e. EdDetector over the whole stream
+        self.num_samples = 0
+        self.num_samples_intf = 0
+        self.ktime = None
+        self.stats = collections.Counter()
+        self.num_bytes = 0
+        self.num_dropped = 0
+        self.num_errors = 0
+        self.t_start = time.monotonic()
+        self.t_update = None
+        self.latency_max = 0.0
+        self.latency_recent = collections.deque(maxlen=NUM_RECENT_LATENCIES)
+
+    def update(self, flags, ktime, t_recv):
+        # adds the interference flags of decoded samples received at t_recv (oldest batch,
+        # time.monotonic()), ktime of the last one
+        if flags.size > 0:
+            self.window.append(flags)
+            self.num_in_window += flags.size
+            self.num_in_intf += int(np.count_nonzero(flags))
+            self.num_samples += flags.size
+            self.num_samples_intf += int(np.count_nonzero(flags))
+            self.ktime = ktime
+            # drop the samples which fell out of the window
+            while self.num_in_window - self.window[0].size >= self.window_len:
+                old = self.window.popleft()
+                self.num_in_window -= old.size
+                self.num_in_intf -= int(np.count_nonzero(old))
+            excess = self.num_in_window - self.window_len
+            if excess > 0:
+                self.num_in_intf -= int(np.count_nonzero(self.window[0][:excess]))
+                self.window[0] = self.window[0][excess:]
+                self.num_in_window -= excess
+        self.t_update = time.monotonic()
+        latency = self.t_update - t_recv
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_recent.append(latency)
+
+    def get_airtime(self):
+        # eff. available airtime over the window
+        if self.num_in_window == 0:
+            return np.nan
+        return 1 - self.num_in_intf / self.num_in_window
+
+    def get_airtime_total(self):
+        if self.num_samples == 0:
+            return np.nan
+        return 1 - self.num_samples_intf / self.num_samples
+
+    def get_latency(self, q):
+        # latency percentile of the recent batches, ms
+        if not self.latency_recent:
+            return np.nan
+        return float(np.percentile(self.latency_recent, q)) * 1e3
+
+    def get_state(self):
+        now = time.monotonic()
+        return {
+            'ap': self.name,
+            'airtime': self.get_airtime(),
+            'airtime_total': self.get_airtime_total(),
+            'window_samples': self.num_in_window,
+            'ktime': self.ktime,
+            'samples': self.num_samples,
+            'samples_per_s': self.num_samples / max(now - self.t_start, 1e-9),
+            'bytes': self.num_bytes,
+            'buffered_bytes': len(self.buf),
+            'dropped_datagrams': self.num_dropped,
+            'errors': self.num_errors,
+            'mib_resets': self.stats['mib_resets'],
+            'age_s': now - self.t_update if self.t_update is not None else None,
+            'latency_ms': {
+                'p50': self.get_latency(50),
+                'p99': self.get_latency(99),
+                'max': self.latency_max * 1e3 if self.latency_recent else np.nan,
+            },
+        }
+
+### AirtimeService ###
+class AirtimeService():
+    def __init__(self, threshold=0.1, window_len=2000, processes=None, batch_ms=BATCH_MS,
+                 max_buffer=MAX_BUFFER_BYTES):
+        self.threshold = threshold
+        self.window_len = window_len
+        self.batch_s = batch_ms / 1000.0
+        self.max_buffer = max_buffer
+        self.num_workers = processes or os.cpu_count()
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.num_workers)
+        self.aps = {}
+        self.tasks = []
+        self.num_connections = 0
+
+    def get_ap(self, name):
+        # monitor of the AP, created on first use
+        ap = self.aps.get(name)
+        if ap is None:
+            ap = ApMonitor(name, self.window_len, self.max_buffer)
+            self.aps[name] = ap
+        return ap
+
+    async def decode(self):
+        # decodes the buffered lines of all APs every batch_s; the APs are split into one group
+        # per worker process, i.e. a round costs one call per worker instead of one per AP
+        loop = asyncio.get_running_loop()
+        while True:
+            t_round = time.monotonic()
+            jobs = []
+            for ap in self.aps.values():
+                if not ap.buf:
+                    continue
+                jobs.append((ap, ap.t_recv, bytes(ap.buf)))
+                # the stream of the AP is read again
+                ap.buf.clear()
+                ap.t_recv = None
+                ap.space.set()
+            groups = [jobs[i::self.num_workers] for i in range(min(self.num_workers, len(jobs)))]
+            results = await asyncio.gather(*(loop.run_in_executor(
+                self.pool, decode_batches, [(data, ap.prefix, ap.prev_line) for ap, t_recv, data in group],
+                self.threshold) for group in groups))
+            for group, group_results in zip(groups, results):
+                for (ap, t_recv, data), res in zip(group, group_results):
+                    if isinstance(res, ValueError):
+                        # malformed lines, the batch is dropped
+                        ap.num_errors += 1
+                        print('%s: %s' % (ap.name, res), file=sys.stderr)
+                        continue
+                    flags, ktime, ap.prev_line, stats = res
+                    ap.stats.update(stats)
+                    ap.update(flags, ktime, t_recv)
+            await asyncio.sleep(max(t_round + self.batch_s - time.monotonic(), 0))
+
+    ### sources ###
+    async def handle_stream(self, reader, writer):
+        # one AP per connection, named by the tag of its first line or the connection number
+        self.num_connections += 1
+        ap = None
+        buf = b''
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                t_recv = time.monotonic()
+                end = data.rfind(b'\n') + 1
+                if end == 0:
+                    buf += data
+                    continue
+                batch, buf = buf + data[:end], data[end:]
+                if ap is None:
+                    name, prefix = get_tag(batch)
+                    ap = self.get_ap(name if name is not None else 'conn-%d' % self.num_connections)
+                    ap.prefix = prefix
+                ap.num_bytes += len(batch)
+                # waits while the buffer is full, i.e. no further data is read from the connection
+                while len(ap.buf) >= ap.max_buffer:
+                    ap.space.clear()
+                    await ap.space.wait()
+                ap.buf += batch
+                if ap.t_recv is None:
+                    ap.t_recv = t_recv
+        finally:
+            writer.close()
+
+    def handle_datagram(self, data):
+        # one AP per datagram, named by the tag of its first line
+        t_recv = time.monotonic()
+        if not data.endswith(b'\n'):
+            data += b'\n'
+        name, prefix = get_tag(data)
+        ap = self.get_ap(name if name is not None else 'udp')
+        ap.prefix = prefix
+        if len(ap.buf) + len(data) > ap.max_buffer:
+            ap.num_dropped += 1
+            return
+        ap.buf += data
+        ap.num_bytes += len(data)
+        if ap.t_recv is None:
+            ap.t_recv = t_recv
+
+    ### query endpoint ###
+    async def handle_http(self, reader, writer):
+        # GET /aps: state of all APs, GET /aps/<name>: of one AP
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            parts = request.decode('ascii', 'replace').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            status, body = '200 OK', None
+            if path in ('/', '/aps'):
+                body = [ap.get_state() for name, ap in sorted(self.aps.items())]
+            elif path.startswith('/aps/'):
+                ap = self.aps.get(urllib.parse.unquote(path[len('/aps/'):]))
+                if ap is not None:
+                    body = ap.get_state()
+            if body is None:
+                status, body = '404 Not Found', {'error': 'unknown path %s' % path}
+            data = json.dumps(body, default=float).encode('ascii')
+            writer.write(b'HTTP/1.0 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n' % (
+                status.encode('ascii'), len(data)) + data)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def report(self, interval):
+        # aggregate throughput & latency of all APs
+        num_samples_old = 0
+        while True:
+            await asyncio.sleep(interval)
+            aps = list(self.aps.values())
+            num_samples = sum(ap.num_samples for ap in aps)
+            p99 = [ap.get_latency(99) for ap in aps if ap.latency_recent]
+            print('%d APs, %.0f samples/s, latency p99 max %.1f ms, %d bytes buffered, %d dropped, %d errors' % (
+                len(aps), (num_samples - num_samples_old) / interval, max(p99) if p99 else np.nan,
+                sum(len(ap.buf) for ap in aps), sum(ap.num_dropped for ap in aps),
+                sum(ap.num_errors for ap in aps)), file=sys.stderr)
+            num_samples_old = num_samples
+
+    async def serve(self, unix=None, tcp=None, udp=None, http_port=None, report_interval=5.0):
+        loop = asyncio.get_running_loop()
+        servers = []
+        if unix:
+            if os.path.exists(unix):
+                os.remove(unix)
+            servers.append(await asyncio.start_unix_server(self.handle_stream, unix))
+        if tcp:
+            host, port = tcp
+            servers.append(await asyncio.start_server(self.handle_stream, host, port))
+        if udp:
+            service = self
+            class DatagramProtocol(asyncio.DatagramProtocol):
+                def datagram_received(self, data, addr):
+                    service.handle_datagram(data)
+            transport, protocol = await loop.create_datagram_endpoint(DatagramProtocol, local_addr=udp)
+        if http_port:
+            servers.append(await asyncio.start_server(self.handle_http, '127.0.0.1', http_port))
+        if report_interval:
+            self.tasks.append(asyncio.ensure_future(self.report(report_interval)))
+        try:
+            # runs until cancelled, also if there is only the UDP endpoint
+            await asyncio.gather(loop.create_future(), self.decode(), *(server.serve_forever() for server in servers))
+        finally:
+            for task in self.tasks:
+                task.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+def parse_addr(value):
+    # HOST:PORT, HOST defaults to localhost
+    host, sep, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Airtime monitoring of many APs')
+    arg_parser.add_argument('--unix', help='listen on a UNIX stream socket')
+    arg_parser.add_argument('--tcp', type=parse_addr, help='listen on TCP HOST:PORT')
+    arg_parser.add_argument('--udp', type=parse_addr, help='receive datagrams on UDP HOST:PORT')
+    arg_parser.add_argument('--http', type=int, default=8080, help='port of the query endpoint on localhost')
+    arg_parser.add_argument('--threshold', type=float, default=0.1)
+    arg_parser.add_argument('--window', type=int, default=2000, help='window length in samples')
+    arg_parser.add_argument('--batch-ms', type=float, default=BATCH_MS, help='min. interval of the decoding per AP')
+    arg_parser.add_argument('--max-buffer', type=int, default=MAX_BUFFER_BYTES, help='buffered bytes per AP')
+    arg_parser.add_argument('--report-interval', type=float, default=5.0, help='s, 0 disables the reports')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='decoding processes, default: all cores')
+    args = arg_parser.parse_args()
+    if not (args.unix or args.tcp or args.udp):
+        arg_parser.error('no source given, see --unix, --tcp & --udp')
+
+    service = AirtimeService(args.threshold, args.window, args.processes, args.batch_ms, args.max_buffer)
+    try:
+        asyncio.run(service.serve(args.unix, args.tcp, args.udp, args.http, args.report_interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+This is a time alignment of RegMon and iperf traces. The RegMon bins (0.5 ms)
+are aggregated into the iperf intervals (100 ms), which gives a per interval
+table of MAC layer features and the measured throughput as ground truth, e.g.
+to evaluate detectors at 100 ms granularity instead of one point per run.
+
+Usage:
+    python3 align.py ../traces/wiplus_dl_lte-fb_20161223/
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sys
+import numpy as np
+
+from lteu_wifi.parser import Iperf3, RegMon, Config
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+
+USE_CACHE = True
+NUM_PROCESSES = None
+# intervals with less RegMon coverage are not evaluated
+MIN_COVERAGE = 0.9
+# estimate the clock offset between iperf & RegMon per run, otherwise both clocks are taken as is
+ESTIMATE_CLOCK_OFFSET = True
+# an estimated clock offset is only taken if the correlation at it reaches MIN_OFFSET_CORR and
+# exceeds the one without offset by MIN_OFFSET_GAIN, otherwise the clocks are taken as is
+MIN_OFFSET_CORR = 0.3
+MIN_OFFSET_GAIN = 0.1
+
+# RegMon counters summed up per iperf interval
+ALIGN_SUM_FIELDS = ('d_mac', 'd_tx', 'd_rx', 'd_idle', 'd_others', 'd_fack')
+
+# one row per iperf interval; features are nan for intervals without RegMon bins
+ALIGN_DTYPE = np.dtype([
+    ('ktime', np.uint64), # end of the iperf interval, RegMon clock
+    ('ktime_start', np.uint64),
+    ('num_bins', np.int64),
+    ('coverage', np.float64), # fraction of the interval covered by RegMon bins
+    ('d_mac', np.float64),
+    ('d_tx', np.float64),
+    ('d_rx', np.float64),
+    ('d_idle', np.float64),
+    ('d_others', np.float64),
+    ('d_fack', np.float64),
+    ('rel_tx', np.float64),
+    ('rel_rx', np.float64),
+    ('rel_idle', np.float64),
+    ('rel_others', np.float64),
+    ('ed_airtime', np.float64), # ED detector estimate within the interval
+    ('rx_thrpt', np.float64),
+    ('tx_thrpt', np.float64),
+    ('norm_thrpt', np.float64), # ground truth, see Iperf3.get_normalized_tx_thr
+])
+
+def get_interval_bounds(iperf3_dat, clock_offset_ns=0):
+    # start & end (ns, RegMon clock) of each iperf interval; iperf reports the end of
+    # consecutive intervals, the first one is assumed to be of the median length
+    ends = iperf3_dat['ktime'].astype(np.int64) + np.int64(clock_offset_ns)
+    if ends.size == 0:
+        return ends, ends
+    first_len = np.int64(np.median(np.diff(ends))) if ends.size > 1 else np.int64(0)
+    starts = np.concatenate(([ends[0] - first_len], ends[:-1]))
+    return starts, ends
+
+def _interval_sums(cum, lo, hi):
+    # sums over the samples lo:hi from a prefix sum with leading zero
+    return cum[hi] - cum[lo]
+
+def _prefix_sum(x):
+    return np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+
+def get_bin_ranges(regmon_ktime, starts, ends):
+    # RegMon bins are stamped with their end: a bin belongs to the interval (start, end]
+    # containing its ktime; returns the bin index range lo:hi of each interval. ktime may step
+    # backwards, the bins are searched in its running maximum
+    regmon_ktime = np.maximum.accumulate(regmon_ktime)
+    lo = np.searchsorted(regmon_ktime, starts, side='right')
+    hi = np.searchsorted(regmon_ktime, ends, side='right')
+    return lo, hi
+
+def align(regmon_dat, iperf3_dat, clock_offset_ns=0, max_tx_throughput=29.0, ed_threshold=0.1):
+    # joins the RegMon bins into the iperf intervals, see ALIGN_DTYPE; clock_offset_ns is
+    # added to the iperf timestamps to get the RegMon clock. Gaps in the RegMon trace and
+    # intervals only partially covered (start & end of the run) show up as coverage < 1.
+    starts, ends = get_interval_bounds(iperf3_dat, clock_offset_ns)
+    ret = np.empty(ends.size, dtype=ALIGN_DTYPE)
+    ret['ktime'] = np.maximum(ends, 0)
+    ret['ktime_start'] = np.maximum(starts, 0)
+    ret['rx_thrpt'] = iperf3_dat['rx_thrpt']
+    ret['tx_thrpt'] = iperf3_dat['tx_thrpt']
+    ret['norm_thrpt'] = iperf3_dat['tx_thrpt'] / (1.0 * max_tx_throughput)
+    if ends.size == 0:
+        return ret
+
+    regmon_ktime = regmon_dat['ktime'].astype(np.int64)
+    lo, hi = get_bin_ranges(regmon_ktime, starts, ends)
+    num_bins = hi - lo
+    ret['num_bins'] = num_bins
+    empty = num_bins == 0
+
+    # covered time: bin lengths clipped to the interval
+    bin_start = regmon_dat['ktime_start'].astype(np.int64)
+    bin_len = (regmon_ktime - bin_start).astype(np.float64)
+    covered = _interval_sums(_prefix_sum(bin_len), lo, hi)
+    # the first bin of an interval may start before it
+    first = np.minimum(lo, regmon_ktime.size - 1)
+    overhang = np.where(empty, 0.0, np.maximum(starts - bin_start[first], 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret['coverage'] = np.clip((covered - overhang) / (ends - starts), 0.0, 1.0)
+
+    for name in ALIGN_SUM_FIELDS:
+        ret[name] = np.where(empty, np.nan, _interval_sums(_prefix_sum(regmon_dat[name]), lo, hi))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name in ('tx', 'rx', 'idle', 'others'):
+            ret['rel_' + name] = ret['d_' + name] / ret['d_mac'] * 100
+        # same semantics as EdDetector: inf counts as interfered, nan does not
+        in_intf = regmon_dat['d_others'] / regmon_dat['d_mac'] > ed_threshold
+        ret['ed_airtime'] = 1 - _interval_sums(_prefix_sum(in_intf), lo, hi) / num_bins
+    return ret
+
+def _offset_correlation(regmon_ktime, cum_busy, starts, ends, thrpt, offsets):
+    # correlation of the per interval busy time with the throughput for each candidate
+    # offset, computed for all offsets at once as a (num_offsets, num_intervals) matrix
+    lo, hi = get_bin_ranges(regmon_ktime, starts[np.newaxis, :] + offsets[:, np.newaxis],
+                            ends[np.newaxis, :] + offsets[:, np.newaxis])
+    busy = _interval_sums(cum_busy, lo, hi)
+    # only intervals covered for all offsets are compared
+    valid = np.all(hi - lo > 0, axis=0) & ~np.isnan(thrpt)
+    if np.count_nonzero(valid) < 3:
+        return np.full(offsets.size, np.nan)
+    busy = busy[:, valid]
+    thrpt = thrpt[valid]
+
+    busy = busy - busy.mean(axis=1, keepdims=True)
+    thrpt = thrpt - thrpt.mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (busy @ thrpt) / (np.sqrt(np.sum(busy ** 2, axis=1)) * np.sqrt(np.sum(thrpt ** 2)))
+
+def estimate_clock_offset(regmon_dat, iperf3_dat, max_offset_ms=500.0, step_ms=1.0, max_intervals=2000,
+                          min_corr=MIN_OFFSET_CORR, min_gain=MIN_OFFSET_GAIN):
+    # clock offset (ns) between iperf & RegMon maximizing the correlation of the per
+    # interval TX+RX busy time with the iperf throughput. Searched coarse to fine over
+    # at most max_intervals evenly spaced intervals. A weak peak (below min_corr or less than
+    # min_gain above the correlation without offset) is no evidence of an offset, 0 then.
+    starts, ends = get_interval_bounds(iperf3_dat)
+    thrpt = iperf3_dat['tx_thrpt'] + iperf3_dat['rx_thrpt']
+    if ends.size < 3:
+        return 0
+    if ends.size > max_intervals:
+        sel = np.linspace(0, ends.size - 1, max_intervals).astype(np.int64)
+        starts, ends, thrpt = starts[sel], ends[sel], thrpt[sel]
+
+    regmon_ktime = regmon_dat['ktime'].astype(np.int64)
+    cum_busy = _prefix_sum(regmon_dat['d_tx'] + regmon_dat['d_rx'])
+    corr_zero = _offset_correlation(regmon_ktime, cum_busy, starts, ends, thrpt, np.zeros(1, dtype=np.int64))[0]
+    best = 0.0
+    best_corr = np.nan
+    span = max_offset_ms
+    # each stage evaluates 41 offsets, i.e. a resolution of span / 20
+    while True:
+        stage_step = max(span / 20, step_ms)
+        offsets = best + np.arange(-span, span + stage_step / 2, stage_step)
+        # stay on the step_ms grid
+        offsets = np.unique(np.clip(np.round(offsets / step_ms) * step_ms, -max_offset_ms, max_offset_ms))
+        corr = _offset_correlation(regmon_ktime, cum_busy, starts, ends, thrpt,
+                                   (offsets * 1e6).astype(np.int64))
+        if np.all(np.isnan(corr)):
+            return 0
+        best = offsets[np.nanargmax(corr)]
+        best_corr = np.nanmax(corr)
+        if stage_step <= step_ms:
+            break
+        span = 2 * stage_step
+    if not best_corr >= min_corr or (not np.isnan(corr_zero) and best_corr - corr_zero < min_gain):
+        return 0
+    return int(round(best * 1e6))
+
+### evaluation of the ED detector per iperf interval ###
+def align_run(directory):
+    cache = TraceCache(enabled=USE_CACHE)
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    run_params = cfg.get_run_params(config_data)
+    regmon_dat = RegMon(cache=cache).load_decoded(os.path.join(directory, config_data['regmon']['result_file']))
+    iperf3_dat = Iperf3(cache=cache).load_decoded(os.path.join(directory, config_data['iperf3']['result_file']))
+
+    clock_offset = estimate_clock_offset(regmon_dat, iperf3_dat) if ESTIMATE_CLOCK_OFFSET else 0
+    table = align(regmon_dat, iperf3_dat, clock_offset)
+    valid = (table['coverage'] >= MIN_COVERAGE) & ~np.isnan(table['norm_thrpt'])
+    err = table['ed_airtime'][valid] - table['norm_thrpt'][valid]
+    return {
+        'directory': directory,
+        'lte_u_dc': run_params['lteu_duty_cycle'],
+        'lte_u_tx_pwr': run_params['lteu_tx_pwr'],
+        'clock_offset_ms': clock_offset / 1e6,
+        'num_intervals': table.size,
+        'num_valid': int(np.count_nonzero(valid)),
+        'mae': float(np.mean(np.abs(err))) if err.size else np.nan,
+        'bias': float(np.mean(err)) if err.size else np.nan,
+    }
+
+def main():
+    base_dirs = sys.argv[1:] if len(sys.argv) > 1 else ['../traces/wiplus_dl_lte-fb_20161223/']
+    results, failures = run_campaign(base_dirs, align_run, processes=NUM_PROCESSES)
+    print_failures(failures)
+
+    print('LTE-U duty cycle | tx pwr | clock offset | valid intervals | MAE | bias (ED detector per iperf interval)')
+    for res in results:
+        print('%.2f | %d dBm | %.1f ms | %d/%d | %.4f | %+.4f' % (
+            res['lte_u_dc'], res['lte_u_tx_pwr'], res['clock_offset_ms'], res['num_valid'],
+            res['num_intervals'], res['mae'], res['bias']))
+
+if __name__ == '__main__':
+    main()
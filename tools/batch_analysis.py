@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+This is the batch analysis of one or more campaigns with the ED detector. The
+per run results are kept in a results file together with a manifest of the
+inputs (size, modification time & content hash of config.json and the trace
+files), the detector parameters and the code version. On a re-run only new
+runs and runs whose inputs, parameters or code changed are recomputed; all
+others are taken from the results file.
+
+Usage:
+    python3 batch_analysis.py ../traces/wiplus_dl_lte-fb_20161223/ ../traces/wiplus_dl_lte-vb-rnd9_2016122/
+    python3 batch_analysis.py ../traces --results ed_results.json --threshold 0.2 -j 4
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import json
+import argparse
+import functools
+
+from lteu_wifi.parser import Config, format_run_param, REGMON_DECODER_VERSION, IPERF3_DECODER_VERSION
+from lteu_wifi.trace_cache import file_sha1
+from lteu_wifi.campaign import find_measurement_dirs, filter_dirs, run_dirs, print_failures
+from lteu_wifi.validate import validate_run, load_quarantine
+from lteu_wifi import run_ed_detector
+
+# bump whenever analyze_run computes something different, invalidates all stored results
+ANALYSIS_VERSION = 'ed-3'
+RESULTS_FILE_VERSION = 1
+
+def get_code_version():
+    return '%s|%s|%s' % (ANALYSIS_VERSION, REGMON_DECODER_VERSION, IPERF3_DECODER_VERSION)
+
+def get_input_files(directory):
+    # config.json & the trace files referenced by it
+    fnames = [os.path.join(directory, 'config.json')]
+    try:
+        config_data = Config().load_config(fnames[0])
+        for key in ('regmon', 'iperf3'):
+            fnames.append(os.path.join(directory, config_data[key]['result_file']))
+    except (OSError, ValueError, KeyError, TypeError):
+        # the run fails anyway, config.json alone decides about a retry
+        pass
+    return fnames
+
+def get_manifest(directory, old_manifest=None):
+    # input fingerprint of a run: size, mtime & sha1 of each input file; the hash of a file
+    # is only computed again if its size or mtime differ from old_manifest
+    old_files = (old_manifest or {}).get('files', {})
+    files = {}
+    for fname in get_input_files(directory):
+        name = os.path.basename(fname)
+        try:
+            st = os.stat(fname)
+        except OSError:
+            files[name] = None
+            continue
+        old = old_files.get(name)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            sha1 = old['sha1']
+        else:
+            sha1 = file_sha1(fname)
+        files[name] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': sha1}
+    return {'files': files}
+
+def is_up_to_date(entry, manifest, params):
+    # stored entry is valid if the content of all inputs & the parameters are unchanged
+    if entry is None or entry['params'] != params:
+        return False
+    old_files = entry['manifest']['files']
+    if set(old_files) != set(manifest['files']):
+        return False
+    for name, info in manifest['files'].items():
+        old = old_files[name]
+        if (info is None) != (old is None):
+            return False
+        if info is not None and info['sha1'] != old['sha1']:
+            return False
+    return True
+
+def load_results(fn):
+    if not os.path.exists(fn):
+        return {}
+    with open(fn) as fo:
+        data = json.load(fo)
+    if data.get('version') != RESULTS_FILE_VERSION:
+        print('Ignoring results file %s of another version' % fn)
+        return {}
+    return data['runs']
+
+def store_results(fn, runs):
+    # atomic replace, an interrupted run never leaves a broken results file
+    tmp_fn = '%s.%d.tmp' % (fn, os.getpid())
+    with open(tmp_fn, 'w') as fo:
+        json.dump({'version': RESULTS_FILE_VERSION, 'runs': runs}, fo, indent=4, sort_keys=True, default=float)
+    os.replace(tmp_fn, fn)
+
+def validate_dirs(dirs, processes=None):
+    # failure records (see campaign._run_worker) of the folders failing validate.py
+    reports, failures = run_dirs(dirs, validate_run, processes)
+    invalid = [{'directory': rep['directory'], 'error': 'ValidationError', 'message': '; '.join(rep['errors']),
+                'stage': 'validate', 'traceback': None} for rep in reports if rep['status'] == 'error']
+    for failure in failures:
+        invalid.append(dict(failure, stage='validate'))
+    return invalid
+
+def run_batch(roots, results_fn, threshold, max_tx_throughput, processes=None, force=False, retry_failed=False,
+              skip=None, validate=False):
+    # returns the entries of the runs below the roots (stored & recomputed), ordered by folder;
+    # folders in skip (e.g. a quarantine list) are not computed, with validate the folders to
+    # compute are checked by validate.py first and invalid ones are stored as failed
+    params = {'threshold': threshold, 'max_tx_throughput': max_tx_throughput,
+              'bootstrap_replicates': run_ed_detector.BOOTSTRAP_REPLICATES, 'code_version': get_code_version()}
+    runs = load_results(results_fn)
+
+    dirs = [os.path.abspath(d) for d in find_measurement_dirs(roots)]
+    manifests = {}
+    todo = []
+    for directory in dirs:
+        entry = runs.get(directory)
+        manifests[directory] = get_manifest(directory, entry['manifest'] if entry else None)
+        if (force or not is_up_to_date(entry, manifests[directory], params) or
+                (retry_failed and entry['status'] == 'failed')):
+            todo.append(directory)
+
+    # runs which disappeared below the given roots; runs below other roots are kept
+    prefixes = [os.path.join(os.path.abspath(root), '') for root in roots]
+    found = set(dirs)
+    removed = [d for d in runs if d not in found and any(d.startswith(p) for p in prefixes)]
+    for directory in removed:
+        del runs[directory]
+
+    num_todo = len(todo)
+    if skip:
+        todo = filter_dirs(todo, skip)
+    print('Batch analysis: %d runs, %d up to date, %d to compute, %d skipped, %d removed' % (
+        len(dirs), len(dirs) - num_todo, len(todo), num_todo - len(todo), len(removed)))
+    invalid = []
+    if validate and todo:
+        invalid = validate_dirs(todo, processes)
+        invalid_dirs = set(failure['directory'] for failure in invalid)
+        todo = [d for d in todo if d not in invalid_dirs]
+        print('Validation: %d runs failed' % len(invalid))
+    worker = functools.partial(run_ed_detector.analyze_run, threshold=threshold, max_tx_throughput=max_tx_throughput)
+    results, failures = run_dirs(todo, worker, processes)
+    failures += invalid
+    print_failures(failures)
+
+    for res in results:
+        runs[res['directory']] = {'status': 'ok', 'result': res, 'params': params,
+                                  'manifest': manifests[res['directory']]}
+    for failure in failures:
+        runs[failure['directory']] = {'status': 'failed', 'result': failure, 'params': params,
+                                      'manifest': manifests[failure['directory']]}
+    store_results(results_fn, runs)
+    # skipped runs without a stored entry are left out
+    return [runs[d] for d in dirs if d in runs]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Incremental batch analysis with the ED detector')
+    arg_parser.add_argument('roots', nargs='+', help='campaign folders')
+    arg_parser.add_argument('--results', default='ed_results.json', help='results file incl. manifest')
+    arg_parser.add_argument('--threshold', type=float, default=run_ed_detector.THRESHOLD)
+    arg_parser.add_argument('--max-thr', type=float, default=run_ed_detector.MAX_TX_THROUGHPUT,
+                            help='max. WiFi throughput in Mbps for normalization')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default: all cores')
+    arg_parser.add_argument('--force', action='store_true', help='recompute all runs')
+    arg_parser.add_argument('--retry-failed', action='store_true', help='recompute failed runs')
+    arg_parser.add_argument('--validate', action='store_true', help='check the runs to compute with validate.py first')
+    arg_parser.add_argument('--quarantine', help='list of folders to skip, see validate.py')
+    args = arg_parser.parse_args()
+
+    skip = load_quarantine(args.quarantine) if args.quarantine else None
+    entries = run_batch(args.roots, args.results, args.threshold, args.max_thr, args.processes, args.force,
+                        args.retry_failed, skip, args.validate)
+
+    print('LTE-U TX power | real eff. airtime | estimated eff. airtime')
+    for entry in entries:
+        if entry['status'] == 'ok':
+            res = entry['result']
+            print('%s | %f | %f' % (format_run_param(res['lte_u_tx_pwr'], '%d'), res['real_airtime'],
+                                    res['est_airtime']))
+    print('Results written to %s' % args.results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+This is a benchmark of the trace processing stages on synthetic traces of
+different length (see synth_trace.py). For each trace size the wall time,
+samples/s and peak memory of each stage (gunzip, unpickle, decode, detect and
+the iperf load & decode) are measured and written as JSON, so that the results
+of different versions can be compared.
+
+The import time of the modules started by the workers & online tools is
+measured as well, each in a fresh interpreter with -X importtime; modules which
+are to be imported lazily only (matplotlib) are reported if pulled in anyway.
+
+Usage:
+    python3 bench.py --sizes 10 60 600 3600 --output bench.json
+    python3 bench.py --compare bench_old.json --output bench.json
+    python3 bench.py --sizes --output imports.json
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import io
+import os
+import sys
+import gzip
+import json
+import time
+import pickle
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+import subprocess
+import numpy as np
+
+from lteu_wifi.parser import Iperf3, RegMon
+from lteu_wifi.ed_detector import EdDetector
+from lteu_wifi.synth_trace import generate_regmon_counters, write_regmon_fields_pklz, generate_iperf3_doc, \
+    write_iperf3_pklz
+
+# trace sizes, s
+DEFAULT_SIZES = [10, 60, 600]
+# modules of the import time benchmark
+IMPORT_MODULES = [
+    'lteu_wifi.cli',
+    'lteu_wifi.parser',
+    'lteu_wifi.ed_detector',
+    'lteu_wifi.detectors',
+    'lteu_wifi.run_ed_detector',
+    'lteu_wifi.batch_analysis',
+    'lteu_wifi.online_ed_detector',
+    'lteu_wifi.airtime_service',
+    'lteu_wifi.replay',
+]
+# heavy dependencies only to be imported on the code paths using them
+LAZY_MODULES = ('matplotlib',)
+
+### stages: each takes the output of the previous one ###
+def stage_gunzip(fn):
+    with gzip.open(fn, 'rb') as fo:
+        return fo.read()
+
+def stage_unpickle(raw):
+    # same as RegMon.load_data on the already decompressed stream
+    data = []
+    fo = io.BytesIO(raw)
+    while True:
+        try:
+            data.extend(pickle.load(fo))
+        except EOFError:
+            break
+    return data
+
+def stage_decode(lines):
+    return RegMon().decode_regmon_data(lines)
+
+def stage_detect(regmon_dat):
+    return EdDetector().estimate_eff_available_airtime_wifi(regmon_dat)
+
+def stage_iperf3_load(fn):
+    return Iperf3().load_data(fn)
+
+def stage_iperf3_decode(dat):
+    return Iperf3().decode_iperf3_data(dat)
+
+# (name, function, input: file or the output of the named stage)
+REGMON_STAGES = [
+    ('gunzip', stage_gunzip, 'regmon_file'),
+    ('unpickle', stage_unpickle, 'gunzip'),
+    ('decode', stage_decode, 'unpickle'),
+    ('detect', stage_detect, 'decode'),
+]
+IPERF3_STAGES = [
+    ('iperf3_load', stage_iperf3_load, 'iperf3_file'),
+    ('iperf3_decode', stage_iperf3_decode, 'iperf3_load'),
+]
+
+def run_stage(func, arg, measure_memory=False):
+    # returns (output, wall time in s, peak memory in bytes or None); the decoder output
+    # on stdout is suppressed
+    with contextlib.redirect_stdout(io.StringIO()):
+        if measure_memory:
+            tracemalloc.start()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        t_start = time.perf_counter()
+        out = func(arg)
+        wall = time.perf_counter() - t_start
+        peak = None
+        if measure_memory:
+            peak = tracemalloc.get_traced_memory()[1] - mem_start
+            tracemalloc.stop()
+    return out, wall, peak
+
+def run_stages(stages, inputs, num_samples, repeat, measure_memory):
+    # runs a chain of stages; the wall time is the best of repeat runs without memory
+    # tracing, the peak memory comes from an extra traced run
+    results = []
+    outputs = dict(inputs)
+    for name, func, src in stages:
+        walls = []
+        for i in range(max(repeat, 1)):
+            out, wall, peak = run_stage(func, outputs[src])
+            walls.append(wall)
+        if measure_memory:
+            del out
+            out, wall, peak = run_stage(func, outputs[src], measure_memory=True)
+        outputs[name] = out
+        wall = min(walls)
+        results.append({
+            'stage': name,
+            'num_samples': num_samples,
+            'wall_s': wall,
+            'samples_per_s': num_samples / wall if wall > 0 else None,
+            'peak_mem_mb': peak / 2 ** 20 if peak is not None else None,
+        })
+    return results
+
+def bench_size(tmp_dir, duration_s, repeat=3, measure_memory=True, seed=0):
+    regmon_fn = os.path.join(tmp_dir, 'regmon_%d.pklz' % duration_s)
+    iperf3_fn = os.path.join(tmp_dir, 'iperf3_%d.pklz' % duration_s)
+    fields = generate_regmon_counters(duration_s, reset_rate=1e-4, seed=seed)
+    num_samples = fields.shape[0]
+    # fast compression only, the read speed is about the same
+    write_regmon_fields_pklz(regmon_fn, fields, compresslevel=1)
+    del fields
+    write_iperf3_pklz(iperf3_fn, generate_iperf3_doc(duration_s, seed=seed), compresslevel=1)
+
+    results = run_stages(REGMON_STAGES, {'regmon_file': regmon_fn}, num_samples, repeat, measure_memory)
+    results += run_stages(IPERF3_STAGES, {'iperf3_file': iperf3_fn}, int(round(duration_s / 0.1)), repeat,
+                          measure_memory)
+    for res in results:
+        res['duration_s'] = duration_s
+        res['file_size'] = os.path.getsize(iperf3_fn if res['stage'].startswith('iperf3') else regmon_fn)
+    os.remove(regmon_fn)
+    os.remove(iperf3_fn)
+    return results
+
+### import times ###
+def parse_importtime(text):
+    # {module: (self, cumulative) import time in us} of the -X importtime output
+    times = {}
+    for line in text.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            times[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+        except (IndexError, ValueError):
+            pass # header line
+    return times
+
+def bench_import(module, repeat=5, top=5):
+    # import time of module in a fresh interpreter, the best of repeat runs (the first one may
+    # include compiling the .pyc files); wall_ms is the whole interpreter run incl. startup
+    best = None
+    for i in range(max(repeat, 1)):
+        t_start = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        wall = time.perf_counter() - t_start
+        if proc.returncode != 0:
+            raise RuntimeError('import %s failed:\n%s' % (module, proc.stderr.strip().splitlines()[-1]))
+        times = parse_importtime(proc.stderr)
+        if module not in times:
+            raise RuntimeError('no -X importtime output for %s' % module)
+        if best is None or times[module][1] < best[1][module][1]:
+            best = (wall, times)
+    wall, times = best
+    return {
+        'module': module,
+        'import_ms': times[module][1] / 1000,
+        'wall_ms': wall * 1000,
+        'numpy_ms': times['numpy'][1] / 1000 if 'numpy' in times else None,
+        'lazy_imported': [name for name in LAZY_MODULES if name in times],
+        'top_self_ms': [[name, t_self / 1000] for name, (t_self, t_cum) in
+                        sorted(times.items(), key=lambda item: -item[1][0])[:top]],
+    }
+
+def print_import_results(results, baseline=None):
+    base = {}
+    if baseline is not None:
+        base = {r['module']: r for r in baseline.get('imports', [])}
+    print('module | import [ms] | numpy [ms] | interpreter run [ms] | lazy modules imported%s' % (
+        ' | speedup' if baseline is not None else ''))
+    for res in results:
+        line = '%s | %.1f | %s | %.1f | %s' % (
+            res['module'], res['import_ms'], '%.1f' % res['numpy_ms'] if res['numpy_ms'] is not None else '-',
+            res['wall_ms'], ', '.join(res['lazy_imported']) or '-')
+        old = base.get(res['module'])
+        if old is not None:
+            line += ' | %.2fx' % (old['import_ms'] / res['import_ms'])
+        print(line)
+
+def get_meta_data():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def print_results(results, baseline=None):
+    # baseline: results of an earlier run, the speedup is shown for matching size & stage
+    base = {}
+    if baseline is not None:
+        base = {(r['duration_s'], r['stage']): r for r in baseline.get('results', [])}
+    print('duration [s] | stage | samples | wall [s] | samples/s | peak mem [MB]%s' % (
+        ' | speedup' if baseline is not None else ''))
+    for res in results:
+        line = '%d | %s | %d | %.4f | %.0f | %s' % (
+            res['duration_s'], res['stage'], res['num_samples'], res['wall_s'], res['samples_per_s'],
+            '%.1f' % res['peak_mem_mb'] if res['peak_mem_mb'] is not None else '-')
+        old = base.get((res['duration_s'], res['stage']))
+        if old is not None:
+            line += ' | %.2fx' % (old['wall_s'] / res['wall_s'])
+        print(line)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark of the trace processing stages')
+    arg_parser.add_argument('--sizes', type=float, nargs='*', default=DEFAULT_SIZES,
+                            help='trace durations, s; none: import times only')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage, the best one counts')
+    arg_parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement')
+    arg_parser.add_argument('--no-imports', action='store_true', help='skip the import time measurement')
+    arg_parser.add_argument('--output', default='bench.json', help='JSON result file')
+    arg_parser.add_argument('--compare', help='JSON result file of an earlier run')
+    args = arg_parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='lteu_bench_')
+    try:
+        results = []
+        for duration_s in args.sizes:
+            print('Benchmarking %g s trace ...' % duration_s, file=sys.stderr)
+            results += bench_size(tmp_dir, duration_s, args.repeat, not args.no_memory)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    imports = []
+    if not args.no_imports:
+        print('Benchmarking import times ...', file=sys.stderr)
+        imports = [bench_import(module, args.repeat) for module in IMPORT_MODULES]
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fo:
+            baseline = json.load(fo)
+    if results:
+        print_results(results, baseline)
+    if imports:
+        print_import_results(imports, baseline)
+
+    with open(args.output, 'w') as fo:
+        json.dump({'meta': get_meta_data(), 'results': results, 'imports': imports}, fo, indent=4)
+    print('Results written to %s' % args.output)
+
+if __name__ == '__main__':
+    main()
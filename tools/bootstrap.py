@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+This is a moving-block bootstrap for confidence intervals of the eff. available
+airtime, both of the estimate from the RegMon bins and of the real one from the
+iperf intervals. Both series are autocorrelated by the LTE-U ON/OFF cycle, so
+blocks of consecutive samples spanning a whole CSAT period are resampled instead
+of single samples (circular, i.e. blocks wrap around the end of the run).
+
+Resampling works on block sums from a prefix sum: a replicate is the sum of
+randomly chosen block sums, all replicates are drawn as one (replicates, blocks)
+index matrix, i.e. without a Python loop per replicate.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import numpy as np
+
+# replicates per run & confidence level of the intervals
+NUM_REPLICATES = 1000
+CONFIDENCE = 0.95
+# CSAT period if not given by the run parameters, ms
+DEFAULT_PERIOD_MS = 160.0
+# max. number of block indices drawn at once, bounds the memory for long traces
+MAX_DRAW = 1 << 24
+
+def get_block_len(period_ms, res_ms, periods_per_block=1.0):
+    # block length in samples covering periods_per_block CSAT periods, at least one sample
+    if period_ms is None or not period_ms > 0:
+        period_ms = DEFAULT_PERIOD_MS
+    return max(int(np.ceil(periods_per_block * period_ms / res_ms)), 1)
+
+def get_period_ms(run_params):
+    # CSAT period from the run parameters (see Config.get_run_params) or None
+    on_ms, off_ms = run_params.get('lteu_on_ms'), run_params.get('lteu_off_ms')
+    if on_ms is None or off_ms is None:
+        return None
+    return on_ms + off_ms
+
+def block_bootstrap_means(values, block_len, num_replicates=NUM_REPLICATES, seed=None):
+    # means of num_replicates (circular) moving-block bootstrap replicates of values; nan values
+    # are left out, i.e. each replicate is the sum over the drawn blocks divided by their valid
+    # samples
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    n = values.size
+    if n == 0 or not np.any(valid):
+        return np.full(num_replicates, np.nan)
+    block_len = min(block_len, n)
+    # circular blocks: wrapped around the end, each sample is in the same number of blocks,
+    # which avoids a bias towards the middle of the trace
+    wrapped = np.concatenate((values, values[:block_len - 1]))
+    wrapped_valid = ~np.isnan(wrapped)
+    cum = np.concatenate(([0.0], np.cumsum(np.where(wrapped_valid, wrapped, 0.0))))
+    cum_cnt = np.concatenate(([0], np.cumsum(wrapped_valid)))
+    # sums over the n overlapping blocks
+    block_sums = cum[block_len:] - cum[:-block_len]
+    block_cnts = cum_cnt[block_len:] - cum_cnt[:-block_len]
+
+    rng = np.random.default_rng(seed)
+    num_blocks = int(np.ceil(n / block_len))
+    sums = np.empty(num_replicates)
+    cnts = np.empty(num_replicates)
+    step = max(MAX_DRAW // num_blocks, 1)
+    for start in range(0, num_replicates, step):
+        num = min(step, num_replicates - start)
+        idx = rng.integers(0, block_sums.size, size=(num, num_blocks))
+        sums[start:start + num] = block_sums[idx].sum(axis=1)
+        cnts[start:start + num] = block_cnts[idx].sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / cnts
+
+def confidence_interval(values, block_len, num_replicates=NUM_REPLICATES, confidence=CONFIDENCE, seed=None):
+    # percentile interval (lower, upper) of the mean of values
+    means = block_bootstrap_means(values, block_len, num_replicates, seed)
+    means = means[~np.isnan(means)]
+    if means.size == 0:
+        return np.nan, np.nan
+    alpha = 1 - confidence
+    lower, upper = np.percentile(means, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return float(lower), float(upper)
+
+def get_airtime_intervals(in_intf, norm_thrpt, period_ms, regmon_res_ms=0.5, iperf_res_ms=100.0,
+                          num_replicates=NUM_REPLICATES, confidence=CONFIDENCE, seed=None):
+    # confidence intervals of the estimated (1 - share of interfered RegMon bins, see EdDetector)
+    # & the real eff. available airtime (mean normalized iperf throughput of the intervals)
+    est = confidence_interval(1.0 - np.asarray(in_intf, dtype=np.float64), get_block_len(period_ms, regmon_res_ms),
+                              num_replicates, confidence, seed)
+    real = confidence_interval(norm_thrpt, get_block_len(period_ms, iperf_res_ms), num_replicates, confidence,
+                               None if seed is None else seed + 1)
+    return est, real
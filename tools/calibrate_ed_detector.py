@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+This example script calibrates the threshold of the simple ED detector. A whole
+grid of thresholds is evaluated for every run in a single pass and compared with
+the eff. available airtime measured by iperf. The best threshold and the error
+tables (overall and per LTE-U duty cycle & tx power) are shown.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sys
+import numpy as np
+
+from lteu_wifi.parser import Iperf3, RegMon, Config, format_run_param
+from lteu_wifi.ed_detector import EdDetector
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+
+# keep decoded traces in the on-disk cache
+USE_CACHE = True
+# number of worker processes, None: one per core
+NUM_PROCESSES = None
+# max. iperf throughput used for normalization, see run_ed_detector.py
+MAX_TX_THROUGHPUT = 29.0
+# candidate thresholds
+THRESHOLDS = np.linspace(0.0, 1.0, 1001)
+# campaign folders
+base_dirs = ['../traces/wiplus_dl_lte-fb_20161223/', '../traces/wiplus_dl_lte-vb-rnd9_2016122/']
+
+def sweep_run(directory):
+    # eff. airtime of all thresholds for a single measurement folder
+    cache = TraceCache(enabled=USE_CACHE)
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    run_params = cfg.get_run_params(config_data)
+
+    regmon = RegMon(cache=cache)
+    regmon_dat = regmon.load_decoded(os.path.join(directory, config_data['regmon']['result_file']))
+    est_airtime = EdDetector().sweep_thresholds(regmon_dat, THRESHOLDS)
+
+    iperf = Iperf3(cache=cache)
+    iperf3_dat = iperf.load_decoded(os.path.join(directory, config_data['iperf3']['result_file']))
+    real_airtime = iperf.get_normalized_tx_thr(iperf3_dat, MAX_TX_THROUGHPUT)
+
+    return {
+        'directory': directory,
+        'lte_u_dc': run_params['lteu_duty_cycle'],
+        'lte_u_tx_pwr': run_params['lteu_tx_pwr'],
+        'real_airtime': float(real_airtime),
+        'est_airtime': est_airtime,
+    }
+
+def get_errors(real_airtime, est_airtime):
+    # real_airtime: (runs,), est_airtime: (runs, thresholds); returns MAE, RMSE & bias per threshold
+    err = est_airtime - real_airtime[:, np.newaxis]
+    return np.mean(np.abs(err), axis=0), np.sqrt(np.mean(err ** 2, axis=0)), np.mean(err, axis=0)
+
+def main():
+    dirs = sys.argv[1:] if len(sys.argv) > 1 else base_dirs
+
+    print('Calibrating the ED detector ... start')
+    results, failures = run_campaign(dirs, sweep_run, processes=NUM_PROCESSES)
+    print('Calibrating the ED detector ... stop')
+    print_failures(failures)
+
+    # runs without valid iperf data can't be used
+    results = [res for res in results if not np.isnan(res['real_airtime'])]
+    if not results:
+        print('No runs to calibrate with.')
+        sys.exit(1)
+
+    real_airtime = np.array([res['real_airtime'] for res in results])
+    est_airtime = np.array([res['est_airtime'] for res in results])
+    mae, rmse, bias = get_errors(real_airtime, est_airtime)
+    best = np.argmin(mae)
+    threshold = THRESHOLDS[best]
+
+    print('Best threshold: %.3f (MAE %.4f, RMSE %.4f, bias %+.4f, %d runs)' % (
+        threshold, mae[best], rmse[best], bias[best], len(results)))
+    default = np.argmin(np.abs(THRESHOLDS - EdDetector().threshold))
+    print('Default threshold: %.3f (MAE %.4f, RMSE %.4f, bias %+.4f)' % (
+        THRESHOLDS[default], mae[default], rmse[default], bias[default]))
+
+    print('Errors with the best threshold per LTE-U duty cycle & tx power ...')
+    print('duty cycle | tx pwr | runs | MAE | RMSE | bias')
+    # parameters missing in the folder name (None) form their own groups, sorted last
+    keys = [(res['lte_u_dc'], res['lte_u_tx_pwr']) for res in results]
+    groups = sorted(set(keys), key=lambda group: [(val is None, val) for val in group])
+    for group in groups:
+        sel = np.array([key == group for key in keys])
+        g_mae, g_rmse, g_bias = get_errors(real_airtime[sel], est_airtime[sel][:, best:best + 1])
+        print('%s | %s dBm | %d | %.4f | %.4f | %+.4f' % (
+            format_run_param(group[0], '%.2f'), format_run_param(group[1], '%d'), np.count_nonzero(sel),
+            g_mae[0], g_rmse[0], g_bias[0]))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+This is a runner for processing all measurement folders of one or more
+campaigns in parallel using a process pool.
+
+Each measurement folder (config.json, regmon.pklz, iperf3.pklz, ...) is handed
+to a worker function which returns a small, picklable per-run result, e.g. a
+dict of scalars. Large arrays should never be returned from a worker.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import traceback
+import multiprocessing
+
+def find_measurement_dirs(base_dirs):
+    # all folders below the given campaign roots containing a config.json, sorted
+    if isinstance(base_dirs, str):
+        base_dirs = [base_dirs]
+    dirs = []
+    for base_dir in base_dirs:
+        for directory, subdirs, files in os.walk(base_dir):
+            if 'config.json' in files:
+                dirs.append(directory)
+    return sorted(dirs)
+
+def _run_worker(args):
+    worker, directory = args
+    try:
+        return True, worker(directory)
+    except Exception as ex:
+        failure = {
+            'directory': directory,
+            'error': type(ex).__name__,
+            'message': str(ex),
+            # pipeline stage the error came from, see profiling.StageTimer
+            'stage': getattr(ex, 'stage', None),
+            'traceback': traceback.format_exc(),
+        }
+        return False, failure
+
+def run_campaign(base_dirs, worker, processes=None, skip=None):
+    # applies worker(directory) to all measurement folders; processes=None uses all
+    # cores, processes=1 runs in the calling process. Folders in skip (e.g. the
+    # quarantine list of validate.py) are left out. Returns the list of results
+    # and the list of failures, both ordered by folder.
+    dirs = find_measurement_dirs(base_dirs)
+    if skip:
+        dirs = filter_dirs(dirs, skip)
+    return run_dirs(dirs, worker, processes)
+
+def filter_dirs(dirs, skip):
+    # dirs without the folders in skip, compared by absolute path
+    skip = set(os.path.abspath(d) for d in skip)
+    kept = [d for d in dirs if os.path.abspath(d) not in skip]
+    if len(kept) < len(dirs):
+        print('Skipping %d quarantined folders' % (len(dirs) - len(kept)))
+    return kept
+
+def run_dirs(dirs, worker, processes=None):
+    # as run_campaign for a given list of measurement folders
+    args = [(worker, directory) for directory in dirs]
+    if not args:
+        return [], []
+    if processes == 1:
+        outcomes = [_run_worker(a) for a in args]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            outcomes = pool.map(_run_worker, args, chunksize=1)
+
+    results = []
+    failures = []
+    for ok, res in outcomes:
+        if ok:
+            results.append(res)
+        else:
+            failures.append(res)
+    return results, failures
+
+def print_failures(failures):
+    for failure in failures:
+        stage = ' in %s' % failure['stage'] if failure.get('stage') else ''
+        print('Failed to parse %s%s, %s: %s' % (failure['directory'], stage, failure['error'], failure['message']))
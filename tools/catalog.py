@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+This is a catalog of all measurement runs below one or more trace roots. The
+typed run parameters (LTE-U duty cycle & power, WiFi settings, ...) and the trace
+files of each run are kept in an SQLite database, so runs can be selected by
+their parameters without opening any trace file.
+
+Usage:
+    python3 catalog.py update catalog.db ../traces
+    python3 catalog.py query catalog.db --duty 33 --min-pwr -20 --max-pwr 0
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sqlite3
+import argparse
+
+from lteu_wifi.parser import Config, format_run_param
+
+# column name -> SQL type
+CATALOG_COLUMNS = [
+    ('directory', 'TEXT PRIMARY KEY'),
+    ('campaign', 'TEXT'),
+    ('meas_name', 'TEXT'),
+    ('lteu_modulation', 'TEXT'),
+    ('lteu_duty_cycle', 'REAL'),
+    ('lteu_on_ms', 'REAL'),
+    ('lteu_off_ms', 'REAL'),
+    ('lteu_tx_pwr', 'INTEGER'),
+    ('wifi_std', 'TEXT'),
+    ('wifi_freq', 'INTEGER'),
+    ('wifi_channel', 'INTEGER'),
+    ('wifi_tx_pwr', 'INTEGER'),
+    ('regmon_res', 'REAL'),
+    ('runtime', 'INTEGER'),
+    ('config_mtime', 'INTEGER'),
+    # size & mtime of all files of the folder, a run is re-read when it changes
+    ('files_state', 'TEXT'),
+    ('regmon_file', 'TEXT'),
+    ('regmon_size', 'INTEGER'),
+    ('iperf3_file', 'TEXT'),
+    ('iperf3_size', 'INTEGER'),
+    ('iometer_file', 'TEXT'),
+    ('iometer_size', 'INTEGER'),
+]
+CATALOG_COLUMN_NAMES = [c[0] for c in CATALOG_COLUMNS]
+
+class Catalog():
+    def __init__(self, db_fn):
+        self.db_fn = db_fn
+        self.conn = sqlite3.connect(db_fn)
+        self.conn.row_factory = sqlite3.Row
+        self.create_tables()
+
+    def create_tables(self):
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS runs (%s)' %
+                              ', '.join('%s %s' % c for c in CATALOG_COLUMNS))
+            # catalogs of older versions: missing columns are added (NULL, i.e. the runs are re-read)
+            existing = set(row['name'] for row in self.conn.execute('PRAGMA table_info(runs)'))
+            for name, sql_type in CATALOG_COLUMNS:
+                if name not in existing:
+                    self.conn.execute('ALTER TABLE runs ADD COLUMN %s %s' % (name, sql_type))
+            self.conn.execute('CREATE INDEX IF NOT EXISTS runs_lteu ON runs (lteu_duty_cycle, lteu_tx_pwr)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS runs_campaign ON runs (campaign)')
+
+    def close(self):
+        self.conn.close()
+
+    def get_file_info(self, directory, config_data, key):
+        # path & size of a trace file referenced by the config, (None, None) if missing
+        if key not in config_data or 'result_file' not in config_data[key]:
+            return None, None
+        fname = os.path.join(directory, config_data[key]['result_file'])
+        try:
+            return fname, os.path.getsize(fname)
+        except OSError:
+            return fname, None
+
+    def get_files_state(self, directory, files):
+        # name, size & mtime of the files of a folder, e.g. trace files fetched or replaced
+        # after the config (git lfs pull) change it
+        state = []
+        for name in sorted(files):
+            st = os.stat(os.path.join(directory, name))
+            state.append('%s:%d:%d' % (name, st.st_size, st.st_mtime_ns))
+        return '|'.join(state)
+
+    def make_row(self, directory, files_state=None):
+        cfg = Config()
+        config_fn = os.path.join(directory, 'config.json')
+        config_data = cfg.load_config(config_fn)
+        row = cfg.get_run_params(config_data)
+        row['directory'] = directory
+        # campaign is given by the folder layout, data_dir in the config is not always accurate
+        row['campaign'] = os.path.basename(os.path.dirname(directory))
+        row['config_mtime'] = os.stat(config_fn).st_mtime_ns
+        row['files_state'] = files_state
+        for key in ('regmon', 'iperf3', 'iometer'):
+            row[key + '_file'], row[key + '_size'] = self.get_file_info(directory, config_data, key)
+        return [row[name] for name in CATALOG_COLUMN_NAMES]
+
+    def update(self, trace_roots):
+        # scans the trace roots; only new or modified runs are (re-)read, runs which
+        # disappeared below one of the roots are removed. Returns (added/updated, removed, failed).
+        if isinstance(trace_roots, str):
+            trace_roots = [trace_roots]
+
+        known = {}
+        for row in self.conn.execute('SELECT directory, files_state FROM runs'):
+            known[row['directory']] = row['files_state']
+
+        found = set()
+        rows = []
+        failed = []
+        for trace_root in trace_roots:
+            for directory, subdirs, files in os.walk(os.path.abspath(trace_root)):
+                if 'config.json' not in files:
+                    continue
+                found.add(directory)
+                try:
+                    files_state = self.get_files_state(directory, files)
+                    if known.get(directory) == files_state:
+                        continue
+                    rows.append(self.make_row(directory, files_state))
+                except (OSError, ValueError, KeyError) as ex:
+                    failed.append((directory, str(ex)))
+
+        roots = [os.path.join(os.path.abspath(r), '') for r in trace_roots]
+        removed = [d for d in known if d not in found and any(d.startswith(r) for r in roots)]
+
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO runs (%s) VALUES (%s)' % (
+                ', '.join(CATALOG_COLUMN_NAMES), ', '.join('?' * len(CATALOG_COLUMN_NAMES))), rows)
+            self.conn.executemany('DELETE FROM runs WHERE directory = ?', [(d,) for d in removed])
+        return len(rows), len(removed), failed
+
+    def select(self, order_by='directory', **criteria):
+        # criteria: <column>=value for equality, min_<column>/max_<column> for ranges,
+        # e.g. select(lteu_duty_cycle=0.33, min_lteu_tx_pwr=-20, max_lteu_tx_pwr=0)
+        where = []
+        args = []
+        for key, val in criteria.items():
+            if val is None:
+                continue
+            if key.startswith('min_'):
+                col, op = key[4:], '>='
+            elif key.startswith('max_'):
+                col, op = key[4:], '<='
+            else:
+                col, op = key, '='
+            if col not in CATALOG_COLUMN_NAMES:
+                raise ValueError('Unknown catalog column: %s' % col)
+            where.append('%s %s ?' % (col, op))
+            args.append(val)
+        if order_by not in CATALOG_COLUMN_NAMES:
+            raise ValueError('Unknown catalog column: %s' % order_by)
+
+        sql = 'SELECT * FROM runs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY %s' % order_by
+        return [dict(row) for row in self.conn.execute(sql, args)]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Catalog of measurement runs')
+    subparsers = arg_parser.add_subparsers(dest='cmd')
+    p_update = subparsers.add_parser('update', help='scan trace roots and update the catalog')
+    p_update.add_argument('db')
+    p_update.add_argument('roots', nargs='+')
+    p_query = subparsers.add_parser('query', help='select runs by their parameters')
+    p_query.add_argument('db')
+    p_query.add_argument('--campaign')
+    p_query.add_argument('--duty', type=float, help='LTE-U duty cycle in %%')
+    p_query.add_argument('--min-pwr', type=int, help='min. LTE-U tx power in dBm')
+    p_query.add_argument('--max-pwr', type=int, help='max. LTE-U tx power in dBm')
+    args = arg_parser.parse_args()
+
+    if args.cmd == 'update':
+        catalog = Catalog(args.db)
+        num_updated, num_removed, failed = catalog.update(args.roots)
+        print('Catalog %s: %d runs added/updated, %d removed' % (args.db, num_updated, num_removed))
+        for directory, msg in failed:
+            print('Failed to read %s, %s' % (directory, msg))
+    elif args.cmd == 'query':
+        catalog = Catalog(args.db)
+        duty = args.duty / 100.0 if args.duty is not None else None
+        for run in catalog.select(campaign=args.campaign, lteu_duty_cycle=duty,
+                                  min_lteu_tx_pwr=args.min_pwr, max_lteu_tx_pwr=args.max_pwr):
+            print('%s\t%s\t%s dBm\t%s' % (run['campaign'], format_run_param(run['lteu_duty_cycle'], '%.2f'),
+                                          format_run_param(run['lteu_tx_pwr'], '%d'), run['directory']))
+    else:
+        arg_parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+This is the command line entry point of the installed package: runs one of the
+scripts by name with the remaining arguments, e.g.
+
+Usage:
+    lteu-wifi run_ed_detector ../traces/wiplus_dl_lte-fb_20161223/
+    lteu-wifi replay ../traces/wiplus_dl_lte-fb_20161223/ --target null
+    lteu-wifi --list
+
+Only the module of the chosen command is imported.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import sys
+import importlib
+
+# command -> module with a main() reading sys.argv
+COMMANDS = {
+    'read_trace': 'read the traces of a campaign',
+    'run_ed_detector': 'ED detector: eff. available airtime per run',
+    'run_phase_detector': 'LTE-U ON/OFF phase detector',
+    'run_detectors': 'all registered detectors',
+    'calibrate_ed_detector': 'threshold sweep of the ED detector',
+    'align': 'RegMon to iperf clock alignment',
+    'batch_analysis': 'incremental ED detector runs over many campaigns',
+    'catalog': 'SQLite catalog of the measurement folders',
+    'plot_campaign': 'MAC state plots of whole campaigns',
+    'validate': 'data quality checks & quarantine list',
+    'rolling_features': 'windowed feature extraction',
+    'sched_sim': 'interference-aware scheduling simulator',
+    'online_ed_detector': 'ED detector on a live RegMon stream',
+    'replay': 'replay of recorded campaigns as live RegMon feeds',
+    'airtime_service': 'airtime monitoring service for many APs',
+    'synth_trace': 'synthetic measurement folders',
+    'bench': 'benchmark of the processing stages & import times',
+}
+
+def print_usage(fo=sys.stdout):
+    print('usage: lteu-wifi COMMAND [ARGS ...]\n\ncommands:', file=fo)
+    for name, text in COMMANDS.items():
+        print('  %-22s %s' % (name, text), file=fo)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help', '--list'):
+        print_usage()
+        return 0
+    command = argv[0].replace('-', '_')
+    if command not in COMMANDS:
+        print('Unknown command: %s\n' % argv[0], file=sys.stderr)
+        print_usage(sys.stderr)
+        return 2
+    module = importlib.import_module('lteu_wifi.' + command)
+    # the scripts parse sys.argv themselves
+    sys.argv = ['lteu-wifi %s' % command] + argv[1:]
+    return module.main()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+This is a registry of detectors estimating the effective available airtime for
+WiFi from RegMon data. The per bin features all detectors are based on
+(interference ratio, busy ratios, ACK failures, ...) are computed once per run
+or block and handed to every detector in the same pass, i.e. N detectors cost
+one feature pass plus N cheap reductions.
+
+New detectors implement reset(), update(features) & get_result() and are added
+with register_detector(); each registered name is one detector configuration.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import numpy as np
+
+from lteu_wifi.profiling import StageTimer
+from lteu_wifi.ed_detector import EdDetector
+from lteu_wifi.phase_detector import LteuPhaseDetector
+
+### RegMonFeatures ###
+class RegMonFeatures():
+    # per bin features of a decoded RegMon array or block (REGMON_DTYPE or CompactRegMon);
+    # ratios are relative to d_mac, an empty MAC delta gives nan (0 / 0) or inf. Features
+    # no registered detector uses by default are computed on first access only.
+    def __init__(self, regmon_dat):
+        self.regmon_dat = regmon_dat
+        self.size = regmon_dat.size
+        self.ktime = regmon_dat['ktime']
+        self.d_mac = regmon_dat['d_mac']
+        self.d_others = regmon_dat['d_others']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # relative time spent in state interference, see EdDetector
+            self.intf_ratio = self.d_others / self.d_mac
+        # bins with at least one TX ACK failure
+        self.fack = regmon_dat['d_fack'] > 0
+        self._busy_ratio = None
+        self._own_ratio = None
+
+    @property
+    def busy_ratio(self):
+        # relative time the channel is not idle, incl. own TX & RX
+        if self._busy_ratio is None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._busy_ratio = (self.d_mac - self.regmon_dat['d_idle']) / self.d_mac
+        return self._busy_ratio
+
+    @property
+    def own_ratio(self):
+        # relative time used by the WiFi link itself
+        if self._own_ratio is None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._own_ratio = (self.regmon_dat['d_tx'] + self.regmon_dat['d_rx']) / self.d_mac
+        return self._own_ratio
+
+### Detectors ###
+class EdBinDetector():
+    # EdDetector on the shared features: share of bins with an interference ratio above
+    # threshold (inf counts as interfered, nan does not) taken as blocked for WiFi
+    def __init__(self, threshold=0.1):
+        self.detector = EdDetector(threshold)
+        self.threshold = threshold
+
+    def reset(self):
+        self.detector.reset()
+
+    def update(self, features):
+        self.detector.update_intf_ratio(features.intf_ratio)
+
+    def get_result(self):
+        if self.detector.num_bins == 0:
+            return np.nan
+        return self.detector.get_eff_available_airtime_wifi()
+
+class EdTimeDetector():
+    # as EdBinDetector but weighted by the bin length (d_mac), i.e. robust against jitter
+    # of the sampling interval
+    def __init__(self, threshold=0.1):
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.time = 0.0
+        self.time_in_intf = 0.0
+
+    def update(self, features):
+        self.time += np.sum(features.d_mac)
+        self.time_in_intf += np.sum(features.d_mac[features.intf_ratio > self.threshold])
+
+    def get_result(self):
+        if self.time <= 0:
+            return np.nan
+        return 1 - self.time_in_intf / self.time
+
+class EdFackDetector():
+    # bins above the ED threshold or with TX ACK failures are taken as blocked for WiFi
+    def __init__(self, threshold=0.1):
+        self.threshold = threshold
+        self.reset()
+
+    def reset(self):
+        self.num_bins = 0
+        self.num_bins_blocked = 0
+
+    def update(self, features):
+        self.num_bins += features.size
+        self.num_bins_blocked += np.count_nonzero((features.intf_ratio > self.threshold) | features.fack)
+
+    def get_result(self):
+        if self.num_bins == 0:
+            return np.nan
+        return 1 - self.num_bins_blocked / self.num_bins
+
+class OthersShareDetector():
+    # time share of the other sources (interference) over the whole run taken as blocked
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.time = 0.0
+        self.time_others = 0.0
+
+    def update(self, features):
+        self.time += np.sum(features.d_mac)
+        self.time_others += np.sum(features.d_others)
+
+    def get_result(self):
+        if self.time <= 0:
+            return np.nan
+        return 1 - min(self.time_others / self.time, 1.0)
+
+class PhaseDutyCycleDetector():
+    # duty cycle of the detected LTE-U ON phases taken as blocked, see LteuPhaseDetector;
+    # the ON/OFF signal is evaluated segment by segment (segment_s of data, one grid
+    # continued across the segments), i.e. only the bins of the current segment are kept
+    def __init__(self, threshold=0.1, segment_s=5.0):
+        self.detector = LteuPhaseDetector(threshold)
+        self.segment_ns = int(segment_s * 1e9)
+        self.reset()
+
+    def reset(self):
+        self.ktime = []
+        self.intf_ratio = []
+        self.num_pending = 0
+        # start of the grid of the next segment, ns
+        self.t_next = None
+        self.num_on = 0
+        self.num_grid = 0
+
+    def update(self, features):
+        if features.size == 0:
+            return
+        self.ktime.append(np.array(features.ktime, dtype=np.uint64))
+        # empty MAC deltas: inf counts as interfered, nan as not (see LteuPhaseDetector)
+        self.intf_ratio.append(np.nan_to_num(features.intf_ratio, nan=0.0, posinf=1.0))
+        self.num_pending += features.size
+        if self.t_next is None:
+            self.t_next = int(self.ktime[0][0])
+        if int(self.ktime[-1][-1]) - self.t_next >= self.segment_ns:
+            self.flush()
+
+    def flush(self):
+        # ON/OFF signal of the pending bins, added to the counts
+        if not self.num_pending:
+            return
+        x, t0 = self.detector.get_on_signal(np.concatenate(self.ktime), np.concatenate(self.intf_ratio), self.t_next)
+        self.num_on += int(np.count_nonzero(x))
+        self.num_grid += x.size
+        self.t_next = t0 + int(round(x.size * self.detector.res_ms * 1e6))
+        self.ktime = []
+        self.intf_ratio = []
+        self.num_pending = 0
+
+    def get_result(self):
+        self.flush()
+        if self.num_grid == 0:
+            return np.nan
+        return 1 - self.num_on / self.num_grid
+
+### Registry ###
+# name -> (detector class, constructor parameters)
+DETECTORS = {}
+
+def register_detector(name, cls, **params):
+    DETECTORS[name] = (cls, params)
+
+def create_detectors(names=None):
+    # new instances of the named (default: all) registered detectors
+    if names is None:
+        names = list(DETECTORS)
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError('Unknown detector(s): %s (known: %s)' % (', '.join(unknown), ', '.join(DETECTORS)))
+    return {name: DETECTORS[name][0](**DETECTORS[name][1]) for name in names}
+
+register_detector('ed', EdBinDetector, threshold=0.1)
+register_detector('ed_time', EdTimeDetector, threshold=0.1)
+register_detector('ed_fack', EdFackDetector, threshold=0.1)
+register_detector('others_share', OthersShareDetector)
+register_detector('phase', PhaseDutyCycleDetector, threshold=0.1)
+
+### DetectorBank ###
+class DetectorBank():
+    # runs several detectors on the same features, computed once per run or block
+    def __init__(self, names=None, timer=None):
+        self.detectors = create_detectors(names)
+        self.timer = timer if timer is not None else StageTimer()
+
+    def reset(self):
+        for detector in self.detectors.values():
+            detector.reset()
+
+    def update(self, regmon_block):
+        # consume one decoded block, e.g. as yielded by RegMon.decode_regmon_data_iter
+        with self.timer.stage('features'):
+            features = RegMonFeatures(regmon_block)
+        with self.timer.stage('detect'):
+            for detector in self.detectors.values():
+                detector.update(features)
+
+    def get_results(self):
+        # eff. available airtime per detector name
+        with self.timer.stage('detect'):
+            return {name: float(detector.get_result()) for name, detector in self.detectors.items()}
+
+    def estimate(self, regmon_dat):
+        # results of all detectors for a whole run
+        self.reset()
+        self.update(regmon_dat)
+        return self.get_results()
@@ -6,32 +6,62 @@ indicator for strong interference and is being blocked for WiFi.
 
 @author: Zubow (TU Berlin)
 """
-import re
-import json
-import gzip
-import pickle
-import os
+import logging
 import numpy as np
-import pickle
-import pprint
-import matplotlib
-import matplotlib.pyplot as plt
+
+logger = logging.getLogger(__name__)
 
 ### EdDetector ###
 class EdDetector():
     def __init__(self, threshold=0.1):
         self.threshold = threshold
+        self.reset()
 
-    def estimate_eff_available_airtime_wifi(self, regmon_dat):
+    def reset(self):
+        # state of the incremental estimation, see update()
+        self.num_bins = 0
+        self.num_bins_in_intf = 0
+
+    def get_intf_ratio(self, regmon_dat):
         # relative time spent in each bin in state interference
-        intf_ratio = regmon_dat['d_others'] / regmon_dat['d_mac']
+        return regmon_dat['d_others'] / regmon_dat['d_mac']
+
+    def count_bins_in_intf(self, regmon_dat):
         # count the number of bins with sufficient large interference value
-        vals_above_thr = intf_ratio[np.where(intf_ratio > self.threshold)]
+        return np.count_nonzero(self.get_intf_ratio(regmon_dat) > self.threshold)
+
+    def sweep_thresholds(self, regmon_dat, thresholds):
+        # eff. available airtime for every threshold in one pass: the interference ratios
+        # are sorted once and the number of bins above each threshold is looked up
+        intf_ratio = self.get_intf_ratio(regmon_dat)
+        # nan (0 / 0) is never above a threshold; np.sort puts nan last
+        intf_ratio = np.sort(intf_ratio[~np.isnan(intf_ratio)])
+        num_bins_in_intf = intf_ratio.size - np.searchsorted(intf_ratio, thresholds, side='right')
+        return 1 - num_bins_in_intf / regmon_dat.size
+
+    def estimate_eff_available_airtime_wifi(self, regmon_dat):
         # take ratio between interfered bins and total bins as LTE-U duty cycle
-        num_bins_in_intf = vals_above_thr.shape[0] / regmon_dat.size
+        num_bins_in_intf = self.count_bins_in_intf(regmon_dat) / regmon_dat.size
         # only bins with low interference levels can be used by WiFI
         eff_available_airtime_wifi = 1 - num_bins_in_intf
 
-        print('Estimated eff. available airtime wifi: %f' % eff_available_airtime_wifi)
+        logger.info('Estimated eff. available airtime wifi: %f' % eff_available_airtime_wifi)
+
+        return eff_available_airtime_wifi
+
+    def update(self, regmon_block):
+        # consume one decoded block, e.g. as yielded by RegMon.decode_regmon_data_iter
+        self.update_intf_ratio(self.get_intf_ratio(regmon_block))
+
+    def update_intf_ratio(self, intf_ratio):
+        # as update() for the already computed interference ratios of a block
+        self.num_bins += intf_ratio.size
+        self.num_bins_in_intf += np.count_nonzero(intf_ratio > self.threshold)
+
+    def get_eff_available_airtime_wifi(self):
+        # estimate over all blocks passed to update() since the last reset()
+        eff_available_airtime_wifi = 1 - self.num_bins_in_intf / self.num_bins
+
+        logger.info('Estimated eff. available airtime wifi: %f' % eff_available_airtime_wifi)
 
         return eff_available_airtime_wifi
\ No newline at end of file
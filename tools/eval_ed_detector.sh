@@ -1,3 +1,4 @@
 #!/bin/bash
 
-python3 run_ed_detector.py
+# needs the package installed, e.g. pip install -e . in the repository root
+lteu-wifi run_ed_detector
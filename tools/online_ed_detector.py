@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+This is an online variant of the ED detector. RegMon lines are consumed as they
+arrive (appended file, pipe or local UNIX socket) and the effective available
+airtime for WiFi is estimated over a sliding window of the most recent samples,
+using the same threshold semantics as EdDetector.
+
+Usage:
+    regmon ... | python3 online_ed_detector.py
+    python3 online_ed_detector.py --file regmon.log --window 2000 --report 200
+    python3 online_ed_detector.py --unix /tmp/regmon.sock
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import collections
+import numpy as np
+
+from lteu_wifi.parser import RegMon, REGMON_NUM_FIELDS
+
+# batches smaller than this are decoded sample by sample, which is cheaper than the vectorized path
+MIN_VECTORIZED_BATCH = 256
+
+### OnlineEdDetector ###
+class OnlineEdDetector():
+    def __init__(self, threshold=0.1, window_len=2000, report_interval=200):
+        # window_len & report_interval in samples, e.g. 2000 samples = 1 s at 0.5 ms
+        self.threshold = threshold
+        self.window_len = window_len
+        self.report_interval = report_interval
+        self.regmon = RegMon()
+        self.reset()
+
+    def reset(self):
+        # ring buffer of interference flags of the last window_len samples
+        self.window = bytearray(self.window_len)
+        self.window_pos = 0
+        self.num_samples = 0
+        self.num_in_window = 0
+        self.num_in_intf = 0
+        # fields of the last line, i.e. the previous sample
+        self.fields_old = None
+        self.ktime = None
+        # lines skipped as malformed, e.g. truncated
+        self.num_malformed = 0
+        # processing time per sample, s
+        self.latency_cnt = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_recent = collections.deque(maxlen=1000)
+
+    def parse_lines(self, lines):
+        # field matrix of lines (see RegMon.get_regmon_fields_array), malformed lines are skipped
+        # and counted instead of stopping the feed
+        try:
+            return self.regmon.get_regmon_fields_array(lines)
+        except ValueError:
+            pass
+        rows = []
+        for line in lines:
+            try:
+                rows.append(self.regmon.get_regmon_fields_array([line]))
+            except ValueError:
+                self.num_malformed += 1
+        if not rows:
+            return np.zeros((0, REGMON_NUM_FIELDS), dtype=np.uint64)
+        return np.concatenate(rows)
+
+    def decode_lines(self, lines):
+        # ktime & interference flag of each sample in lines, keeps the decoder state
+        fields = self.parse_lines(lines)
+        if len(fields) < MIN_VECTORIZED_BATCH:
+            ktimes = []
+            flags = []
+            for row in fields.tolist():
+                fields_now = tuple(row)
+                if self.fields_old is not None:
+                    sample = self.regmon.decode_regmon_sample(self.fields_old, fields_now)
+                    ktime, d_mac, d_others = sample[0], sample[2], sample[6]
+                    ktimes.append(ktime)
+                    # same as EdDetector: d_others / 0 is inf, 0 / 0 is nan
+                    if d_mac > 0:
+                        flags.append(d_others / d_mac > self.threshold)
+                    else:
+                        flags.append(d_others > 0)
+                self.fields_old = fields_now
+            return ktimes, flags
+
+        if self.fields_old is not None:
+            fields = np.concatenate((np.array([self.fields_old], dtype=np.uint64), fields))
+        self.fields_old = tuple(int(v) for v in fields[-1])
+        block = self.regmon.decode_regmon_fields(fields)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            intf_ratio = block['d_others'] / block['d_mac']
+        return block['ktime'].tolist(), (intf_ratio > self.threshold).tolist()
+
+    def push_lines(self, lines):
+        # consumes RegMon lines, returns the list of (ktime, eff. airtime) estimates
+        # emitted every report_interval samples
+        t_start = time.perf_counter()
+        lines = [line for line in lines if line]
+        if not lines:
+            return []
+        ktimes, flags = self.decode_lines(lines)
+
+        estimates = []
+        window = self.window
+        for ktime, flag in zip(ktimes, flags):
+            # O(1) sliding window update
+            flag = 1 if flag else 0
+            self.num_in_intf += flag - window[self.window_pos]
+            window[self.window_pos] = flag
+            self.window_pos += 1
+            if self.window_pos == self.window_len:
+                self.window_pos = 0
+            if self.num_in_window < self.window_len:
+                self.num_in_window += 1
+            self.num_samples += 1
+            if self.num_samples % self.report_interval == 0:
+                estimates.append((ktime, self.get_eff_available_airtime_wifi()))
+        if ktimes:
+            self.ktime = ktimes[-1]
+
+        if flags:
+            latency = (time.perf_counter() - t_start) / len(flags)
+            self.latency_cnt += len(flags)
+            self.latency_sum += latency * len(flags)
+            self.latency_max = max(self.latency_max, latency)
+            self.latency_recent.append(latency)
+        return estimates
+
+    def get_eff_available_airtime_wifi(self):
+        # estimate over the current window
+        if self.num_in_window == 0:
+            return np.nan
+        return 1 - self.num_in_intf / self.num_in_window
+
+    def get_latency_stats(self):
+        # per-sample processing time in usec
+        if self.latency_cnt == 0:
+            return {'samples': 0, 'mean': np.nan, 'max': np.nan, 'p99_recent': np.nan}
+        return {
+            'samples': self.latency_cnt,
+            'mean': self.latency_sum / self.latency_cnt * 1e6,
+            'max': self.latency_max * 1e6,
+            'p99_recent': np.percentile(self.latency_recent, 99) * 1e6,
+        }
+
+### input sources: generators yielding lists of complete lines ###
+def _split_lines(buf, data):
+    # appends data to the partial line in buf, returns (complete lines, rest)
+    buf += data
+    lines = buf.split(b'\n')
+    return [line.decode('ascii', 'replace').strip() for line in lines[:-1]], lines[-1]
+
+def read_file(fn, follow=True, poll_interval=0.01):
+    # lines of a file; with follow=True new lines appended to the file are read as well
+    buf = b''
+    with open(fn, 'rb') as fo:
+        while True:
+            data = fo.read(1 << 16)
+            if data:
+                lines, buf = _split_lines(buf, data)
+                if lines:
+                    yield lines
+            elif follow:
+                time.sleep(poll_interval)
+            else:
+                break
+
+def read_fd(fd):
+    # lines from a pipe, FIFO or stdin; returns when the writer closes it
+    buf = b''
+    while True:
+        data = os.read(fd, 1 << 16)
+        if not data:
+            break
+        lines, buf = _split_lines(buf, data)
+        if lines:
+            yield lines
+
+def read_unix_socket(path):
+    # listens on a UNIX stream socket and yields the lines of one connection at a time
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    try:
+        while True:
+            conn, addr = server.accept()
+            with conn:
+                buf = b''
+                while True:
+                    data = conn.recv(1 << 16)
+                    if not data:
+                        break
+                    lines, buf = _split_lines(buf, data)
+                    if lines:
+                        yield lines
+    finally:
+        server.close()
+        os.remove(path)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Online ED detector for live RegMon feeds')
+    source = arg_parser.add_mutually_exclusive_group()
+    source.add_argument('--file', help='read (and follow) an appended RegMon log file')
+    source.add_argument('--fifo', help='read from a named pipe; default is stdin')
+    source.add_argument('--unix', help='listen on a UNIX stream socket')
+    arg_parser.add_argument('--no-follow', action='store_true', help='stop at the end of --file')
+    arg_parser.add_argument('--threshold', type=float, default=0.1)
+    arg_parser.add_argument('--window', type=int, default=2000, help='window length in samples')
+    arg_parser.add_argument('--report', type=int, default=200, help='report interval in samples')
+    args = arg_parser.parse_args()
+
+    if args.file:
+        source = read_file(args.file, follow=not args.no_follow)
+    elif args.fifo:
+        source = read_fd(os.open(args.fifo, os.O_RDONLY))
+    elif args.unix:
+        source = read_unix_socket(args.unix)
+    else:
+        source = read_fd(sys.stdin.fileno())
+
+    detector = OnlineEdDetector(args.threshold, args.window, args.report)
+    try:
+        for lines in source:
+            for ktime, airtime in detector.push_lines(lines):
+                print('%d\t%f' % (ktime, airtime))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+    stats = detector.get_latency_stats()
+    print('Processed %d samples (%d malformed lines skipped), latency per sample: mean %.2f usec, '
+          'max %.2f usec, p99 %.2f usec' % (stats['samples'], detector.num_malformed, stats['mean'], stats['max'],
+                                            stats['p99_recent']), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
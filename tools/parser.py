@@ -9,25 +9,170 @@ import json
 import gzip
 import pickle
 import os
+import logging
 import numpy as np
-import pickle
-import pprint
+
+from lteu_wifi.profiling import StageTimer
+
+# progress messages of the decoders, e.g. silenced by logging.getLogger('lteu_wifi.parser').setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+### Timing statistics ###
+class TimingStats():
+    # start, end & mean resolution of a time series; can be fed block by block
+    def __init__(self, name):
+        self.name = name
+        self.num_samples = 0
+        self.t_first = None
+        self.t_last = None
+        self.t_start = None
+        self.t_end = None
+
+    def update(self, dat):
+        ts = dat['ktime']
+        if ts.size == 0:
+            return
+        if self.num_samples == 0:
+            self.t_first = int(ts[0])
+            self.t_start = int(np.min(ts))
+            self.t_end = int(np.max(ts))
+        else:
+            self.t_start = min(self.t_start, int(np.min(ts)))
+            self.t_end = max(self.t_end, int(np.max(ts)))
+        self.t_last = int(ts[-1])
+        self.num_samples += ts.size
+
+    def get_resolution(self):
+        # mean distance between consecutive samples, ns
+        if self.num_samples < 2:
+            return np.nan
+        return (self.t_last - self.t_first) / (self.num_samples - 1)
+
+    def get_duration(self):
+        # s
+        return (self.t_end - self.t_start) / 1e9
+
+    def show(self):
+        print('%s start:      %d' % (self.name, self.t_start))
+        print('%s end:        %d' % (self.name, self.t_end))
+        print('%s resolution: %d nsec' % (self.name, self.get_resolution()))
+        print('%s duration:   %f sec' % (self.name, self.get_duration()))
+        print('')
+
+# bump whenever the output of decode_iperf3_data changes, invalidates cached data
+IPERF3_DECODER_VERSION = 'iperf3-1'
+IPERF3_STREAMS_DECODER_VERSION = 'iperf3-streams-1'
+
+# json constants incl. the -nan written by iperf, see Iperf3.load_data
+IPERF3_CONSTANTS = {'NaN': np.nan, 'Infinity': np.inf, '-Infinity': -np.inf}
+
+IPERF3_DTYPE = np.dtype([
+    ('ktime', np.uint64),
+    ('rx_thrpt', np.float64),
+    ('tx_thrpt', np.float64),
+])
+
+IPERF3_STREAMS_DTYPE = np.dtype([
+    ('ktime', np.uint64),
+    ('interval', np.int64),
+    ('socket', np.int64),
+    ('thrpt', np.float64), # Mbps
+    ('retransmits', np.float64),
+    ('snd_cwnd', np.float64),
+    ('rtt', np.float64), # usec
+    ('jitter_ms', np.float64),
+    ('lost_packets', np.float64),
+    ('packets', np.float64),
+    ('lost_percent', np.float64),
+])
 
 class Iperf3():
-    def __init__(self):
-        pass
+    def __init__(self, cache=None, timer=None):
+        # optional TraceCache for decoded data
+        self.cache = cache
+        # wall time per stage, see profiling.StageTimer
+        self.timer = timer if timer is not None else StageTimer()
+        # data quality counters of the decoded data
+        self.stats = {'intervals': 0, 'nan_intervals': 0}
 
     def load_data(self, fn):
         data = None
-        with gzip.open(fn, 'rb') as fo:
-            pkl_dat = pickle.load(fo).decode('utf-8')
-            pkl_dat = re.sub('-nan', 'NaN', pkl_dat) # fix python json failure
-            data = json.loads(pkl_dat)
+        with self.timer.stage('iperf3_load'):
+            with gzip.open(fn, 'rb') as fo:
+                pkl_dat = pickle.load(fo)
+            # iperf writes nan as -nan which is no valid json; the json scanner can't be hooked for
+            # it, so the token is replaced (only if present) and then parsed as NaN by parse_constant
+            if b'-nan' in pkl_dat:
+                pkl_dat = pkl_dat.replace(b'-nan', b'NaN')
+            data = json.loads(pkl_dat, parse_constant=IPERF3_CONSTANTS.__getitem__)
         return data
 
+    def load_decoded(self, fn, streams=False):
+        # load_data & decode_iperf3_data (or decode_iperf3_streams) in one step, served from
+        # the cache if possible
+        if streams:
+            decode, version = self.decode_iperf3_streams, IPERF3_STREAMS_DECODER_VERSION
+        else:
+            decode, version = self.decode_iperf3_data, IPERF3_DECODER_VERSION
+        if self.cache is None:
+            return decode(self.load_data(fn))
+        return self.cache.get_or_decode(fn, version, lambda fn: decode(self.load_data(fn)), self.stats)
+
+    def get_ktime_start(self, dat):
+        # start of the test from the iperf cookie <host>.<sec>.<usec>..., nsec
+        cookie = dat['start']['cookie'].split('.')
+        return int(cookie[1]) * 10 ** 9 + int(cookie[2]) * 1000
+
+    def is_reverse(self, dat):
+        return dat['start']['test_start']['reverse'] == 1
+
     def decode_iperf3_data(self, dat, debug=False):
+        with self.timer.stage('iperf3_decode'):
+            ret = self._decode_iperf3_data(dat)
+        self.stats['intervals'] += ret.size
+        self.stats['nan_intervals'] += int(np.count_nonzero(np.isnan(ret['rx_thrpt'] + ret['tx_thrpt'])))
+        return ret
+
+    def _decode_iperf3_data(self, dat):
+        intervals = dat['intervals']
+        num_samples = len(intervals)
+        logger.info('Decoding %d Iperf3 samples...' % num_samples)
+
+        # collect the columns first, converted in bulk
+        sums = [ival['sum'] for ival in intervals]
+        t_end = np.array([s['end'] for s in sums], dtype=np.float64)
+        thrpt = np.array([s['bits_per_second'] for s in sums], dtype=np.float64) / 1e6 # Mbps
+
+        ret = np.empty(num_samples, dtype=IPERF3_DTYPE)
+        ret['ktime'] = self.get_ktime_start(dat) + (t_end * 1e9).astype(np.uint64) # nsec
+        if self.is_reverse(dat):
+            ret['rx_thrpt'] = thrpt
+            ret['tx_thrpt'] = 0.0
+        else:
+            ret['rx_thrpt'] = 0.0
+            ret['tx_thrpt'] = thrpt
+        return ret
+
+    def decode_iperf3_streams(self, dat, debug=False):
+        # one row per interval & stream incl. the TCP retransmissions (sender only) and the
+        # UDP jitter/loss; fields not reported by iperf for the test are nan
+        intervals = dat['intervals']
+        streams = [st for ival in intervals for st in ival['streams']]
+        logger.info('Decoding %d Iperf3 stream samples...' % len(streams))
+
+        ret = np.empty(len(streams), dtype=IPERF3_STREAMS_DTYPE)
+        t_end = np.array([st['end'] for st in streams], dtype=np.float64)
+        ret['ktime'] = self.get_ktime_start(dat) + (t_end * 1e9).astype(np.uint64) # nsec
+        ret['interval'] = np.repeat(np.arange(len(intervals)), [len(ival['streams']) for ival in intervals])
+        ret['socket'] = [st.get('socket', -1) for st in streams]
+        ret['thrpt'] = np.array([st['bits_per_second'] for st in streams], dtype=np.float64) / 1e6 # Mbps
+        for name in ('retransmits', 'snd_cwnd', 'rtt', 'jitter_ms', 'lost_packets', 'packets', 'lost_percent'):
+            ret[name] = [st.get(name, np.nan) for st in streams]
+        return ret
+
+    def decode_iperf3_data_loop(self, dat, debug=False):
+        # reference implementation of decode_iperf3_data, one interval at a time
         num_samples = len(dat['intervals'])
-        print('Decoding %d Iperf3 samples...' % num_samples)
 
         rx = False
         if (dat['start']['test_start']['reverse'] == 1):
@@ -43,7 +188,7 @@ class Iperf3():
             ('rx_thrpt', np.float64),
             ('tx_thrpt', np.float64),
         ])
-        ret = np.full(num_samples, np.nan, dtype=ret_dtype)
+        ret = np.empty(num_samples, dtype=ret_dtype)
 
         for ival_cnt, ival in enumerate(dat['intervals']):
             ktime = ktime_start + int(float(ival['sum']['end']) * 1e9) # nsec
@@ -59,16 +204,9 @@ class Iperf3():
 
     def show_timing_info(self, iperf3_dat):
         # timing data
-        iperf3_ts = iperf3_dat['ktime']
-        iperf3_t_res = np.mean(np.ediff1d(iperf3_ts))  # ns
-        iperf3_t_start = np.nanmin(iperf3_ts)  # ns
-        iperf3_t_end = np.nanmax(iperf3_ts)  # ns
-        iperf3_t_range = (iperf3_t_end - iperf3_t_start) / 1e9  # s
-        print('Iperf3 start:      %d' % iperf3_t_start)
-        print('Iperf3 end:        %d' % iperf3_t_end)
-        print('Iperf3 resolution: %d nsec' % iperf3_t_res)
-        print('Iperf3 duration:   %f sec' % iperf3_t_range)
-        print('')
+        timing = TimingStats('Iperf3')
+        timing.update(iperf3_dat)
+        timing.show()
 
         iperf3_estats = {'tx_thrpt': {}, 'rx_thrpt': {}}
         iperf3_estats['tx_thrpt']['avg'] = np.nanmean(iperf3_dat['tx_thrpt'])
@@ -85,24 +223,310 @@ class Iperf3():
 
         normalized_tx_thr = iperf3_estats['tx_thrpt']['avg'] / (1.0 * max_tx_throughput)
 
-        print('Normalized TX throughput: %f' % normalized_tx_thr)
+        logger.info('Normalized TX throughput: %f' % normalized_tx_thr)
         return normalized_tx_thr
 
 ### RegMon data: https://github.com/thuehn/RegMon ###
+REGMON_NUM_FIELDS = 12
+
+# bump whenever the output of decode_regmon_data changes, invalidates cached data
+REGMON_DECODER_VERSION = 'regmon-1'
+
+# decoded RegMon samples, one row per pair of consecutive lines
+REGMON_DTYPE = np.dtype([
+    ('ktime', np.uint64),
+    ('ktime_start', np.uint64),
+    ('ktime_stop', np.uint64),
+    ('d_mac', np.float64),
+    ('d_tx', np.float64),
+    ('d_rx', np.float64),
+    ('d_idle', np.float64),
+    ('d_others', np.float64),
+    ('d_fack', np.float64),
+    ('rel_tx', np.float64),
+    ('rel_rx', np.float64),
+    ('rel_idle', np.float64),
+    ('rel_others', np.float64),
+])
+
+# decoded with timebase='tsf': ktime, ktime_start & ktime_stop are taken from the hardware TSF
+# and the register read duration of each sample is added (usec, lower TSF read back after the
+# registers minus lower 32 bit of the TSF read before)
+REGMON_TSF_DTYPE = np.dtype(REGMON_DTYPE.descr + [('read_duration', np.float64)])
+# a TSF step deviating from the ktime step by more than this (ns) is taken as TSF jump (reset,
+# sync), the TSF timeline is then re-anchored to the host ktime
+TSF_MAX_DEVIATION_NS = 10 ** 7
+_TSF_LOW_MASK = np.uint64(0xffffffff)
+
+# ASCII code -> digit value, 0xff for anything which is not a (hex) digit
+_DIGIT_LUT = np.full(256, 0xff, dtype=np.uint8)
+_DIGIT_LUT[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+_DIGIT_LUT[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+_DIGIT_LUT[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+# lines parsed at once by _parse_fixed_width_lines, bounds the temporary memory
+_PARSE_BLOCK_LINES = 1 << 15
+
+# ASCII whitespace characters separating the fields of a line
+_WHITESPACE_LUT = np.zeros(256, dtype=bool)
+_WHITESPACE_LUT[np.frombuffer(b' \t\r\n', dtype=np.uint8)] = True
+
+def _digits_to_int(digits, base):
+    # integers from the digit values (see _DIGIT_LUT) along the last axis; computed as
+    # product with the place values, which is faster than a Horner scheme per digit
+    if np.any(digits >= base):
+        raise ValueError('Malformed trace data: invalid base %d literal' % base)
+    place = np.uint64(base) ** np.arange(digits.shape[-1] - 1, -1, -1, dtype=np.uint64)
+    return digits.astype(np.uint64) @ place
+
+def _parse_fixed_width_lines(dat, num_fields, bases, columns=None):
+    # fast path for the usual case of all lines sharing the same layout, i.e. equal
+    # field widths: the joined lines are viewed as a (num_lines, line_length) char
+    # matrix and each field is parsed from its column range; returns None otherwise.
+    # With columns only these fields are parsed (in that order), the others are
+    # only checked for valid digits.
+    line_len = len(dat[0])
+    if len(set(map(len, dat))) != 1:
+        return None
+    try:
+        buf = ''.join(dat).encode('ascii')
+    except UnicodeEncodeError:
+        return None
+    chars = np.frombuffer(buf, dtype=np.uint8).reshape(len(dat), line_len)
+
+    # all lines need to have their whitespace at the same positions
+    space = _WHITESPACE_LUT[chars[0]]
+    is_start = ~space & np.concatenate(([True], space[:-1]))
+    is_end = ~space & np.concatenate((space[1:], [True]))
+    starts = np.flatnonzero(is_start)
+    ends = np.flatnonzero(is_end) + 1
+    if columns is None:
+        columns = range(num_fields)
+
+    ret = np.empty((len(dat), len(columns)), dtype=np.uint64)
+    # lookups per block of lines: take is much faster than indexing with the uint8 chars but
+    # converts them to intp first
+    for start in range(0, len(dat), _PARSE_BLOCK_LINES):
+        block = chars[start:start + _PARSE_BLOCK_LINES]
+        if np.any(_WHITESPACE_LUT.take(block) != space):
+            return None
+        if starts.size < num_fields:
+            raise ValueError('Malformed trace data: expected %d fields per line' % num_fields)
+        digits = _DIGIT_LUT.take(block)
+        for col in set(range(num_fields)) - set(columns):
+            if np.any(digits[:, starts[col]:ends[col]] >= bases[col]):
+                raise ValueError('Malformed trace data: invalid base %d literal' % bases[col])
+        for i, col in enumerate(columns):
+            ret[start:start + block.shape[0], i] = _digits_to_int(digits[:, starts[col]:ends[col]], bases[col])
+    return ret
+
+def _parse_int_array(tokens, base):
+    # converts an array of ASCII byte strings into uint64 integers, column by column
+    # over the characters (Horner scheme); strings are NUL padded up to the itemsize
+    tokens = np.ascontiguousarray(tokens)
+    width = tokens.dtype.itemsize
+    chars = tokens.view(np.uint8).reshape(tokens.shape + (width,))
+    if np.any(chars[..., 0] == 0):
+        raise ValueError('Malformed trace data: empty field')
+
+    ret = np.zeros(tokens.shape, dtype=np.uint64)
+    for pos in range(width):
+        char = chars[..., pos]
+        present = char != 0
+        digit = _DIGIT_LUT[char]
+        if np.any(present & (digit >= base)):
+            raise ValueError('Malformed trace data: invalid base %d literal' % base)
+        np.copyto(ret, ret * np.uint64(base) + digit, where=present)
+    return ret
+
+### Uniform resampling ###
+# counters of a decoded RegMon array, resampled as cumulative sums
+RESAMPLE_REGMON_COUNTERS = ('d_mac', 'd_tx', 'd_rx', 'd_idle', 'd_others', 'd_fack')
+RESAMPLE_REGMON_REL = {'rel_tx': 'd_tx', 'rel_rx': 'd_rx', 'rel_idle': 'd_idle', 'rel_others': 'd_others'}
+# samples longer than this multiple of the median sample duration are gaps (default of max_gap_ms)
+RESAMPLE_GAP_FACTOR = 10
+
+def resample_regmon(regmon_dat, res_ms, max_gap_ms=None):
+    # resamples a decoded RegMon array (e.g. decoded with timebase='tsf') onto a strictly uniform
+    # grid of res_ms long bins starting at the first ktime_start. The counter deltas are spread
+    # linearly over their samples, i.e. the cumulative counters are interpolated at the bin
+    # edges and differenced, which keeps the totals; rel_* are recomputed from the resampled
+    # deltas. Bins overlapping a sample longer than max_gap_ms (recording gap) are nan.
+    # Returns a REGMON_DTYPE array, ktime of bin i is ktime_start[0] + (i + 1) * res_ms.
+    res_ns = int(round(res_ms * 1e6))
+    if res_ns <= 0:
+        raise ValueError('Invalid resampling resolution: %s ms' % res_ms)
+    ret = np.zeros(0, dtype=REGMON_DTYPE)
+    if len(regmon_dat) == 0:
+        return ret
+
+    ktime_base = int(regmon_dat['ktime_start'][0])
+    t_start = (regmon_dat['ktime_start'] - np.uint64(ktime_base)).astype(np.int64)
+    t_stop = (regmon_dat['ktime_stop'] - np.uint64(ktime_base)).astype(np.int64)
+    num_bins = int(t_stop[-1] // res_ns)
+    ret = np.empty(num_bins, dtype=REGMON_DTYPE)
+    if num_bins == 0:
+        return ret
+    edges = np.arange(num_bins + 1, dtype=np.int64) * res_ns
+
+    # knots of the cumulative counters: start & stop of each sample, i.e. a gap between two
+    # samples (if any) contributes nothing
+    knots = np.empty(2 * t_start.size, dtype=np.int64)
+    knots[0::2] = t_start
+    knots[1::2] = t_stop
+    # a re-anchored TSF timeline may step back slightly, np.interp needs increasing knots
+    knots = np.maximum.accumulate(knots)
+    for name in RESAMPLE_REGMON_COUNTERS:
+        cum = np.empty(knots.size)
+        cum[1::2] = np.cumsum(regmon_dat[name], dtype=np.float64)
+        cum[0] = 0.0
+        cum[2::2] = cum[1:-1:2]
+        ret[name] = np.diff(np.interp(edges, knots, cum))
+
+    # bins touching a gap, i.e. a too long sample or space between two samples; gaps are at
+    # least one bin long
+    duration = t_stop - t_start
+    if max_gap_ms is None:
+        max_gap_ns = max(RESAMPLE_GAP_FACTOR * float(np.median(duration)), res_ns)
+    else:
+        max_gap_ns = max_gap_ms * 1e6
+    long_sample = duration > max_gap_ns
+    space = t_start[1:] > t_stop[:-1]
+    gap_start = np.concatenate((t_start[long_sample], t_stop[:-1][space]))
+    gap_stop = np.concatenate((t_stop[long_sample], t_start[1:][space]))
+    invalid = np.zeros(num_bins + 1, dtype=np.int64)
+    np.add.at(invalid, np.minimum(gap_start // res_ns, num_bins), 1)
+    np.add.at(invalid, np.minimum(-(-gap_stop // res_ns), num_bins), -1)
+    invalid = np.cumsum(invalid[:-1]) > 0
+    for name in RESAMPLE_REGMON_COUNTERS:
+        ret[name][invalid] = np.nan
+
+    ret['ktime_start'] = np.uint64(ktime_base) + edges[:-1].astype(np.uint64)
+    ret['ktime_stop'] = np.uint64(ktime_base) + edges[1:].astype(np.uint64)
+    ret['ktime'] = ret['ktime_stop']
+    d_mac = ret['d_mac']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for name, counter in RESAMPLE_REGMON_REL.items():
+            ret[name] = np.where(d_mac > 0, ret[counter] / d_mac * 100, np.nan)
+    return ret
+
+### Plotting ###
+# MAC state colors of the RegMon plot
+REGMON_PLOT_COLORS = {
+    'grafana1': (0.20, 0.20, 0.20),
+    'grafana2': (0.31, 0.29, 0.29),
+    'regmon_tx': (240 / 256, 83 / 256, 84 / 256),
+    'regmon_rx': (55 / 256, 168 / 256, 251 / 256),
+    'regmon_idle': (243 / 256, 214 / 256, 127 / 256),
+    'regmon_others': (212 / 256, 118 / 256, 239 / 256),
+    'regmon_fack': (183 / 256, 16 / 256, 16 / 256),
+}
+
+def decimate_minmax(ktime, columns, num_bins):
+    # aggregates time series into num_bins equally long time bins between the first & last
+    # sample, e.g. one per pixel column of a plot. Returns the bin centers (same clock as
+    # ktime, float64) & for each column a dict of the per bin 'min', 'max' & 'mean'; nan
+    # values are ignored, bins without valid samples are nan.
+    ktime = np.asarray(ktime)
+    num_bins = max(int(num_bins), 1)
+    t_min = int(np.min(ktime))
+    t = (ktime - ktime.dtype.type(t_min)).astype(np.float64)
+    span = float(np.max(t)) if t.size else 0.0
+    x = t_min + (np.arange(num_bins) + 0.5) * (span / num_bins)
+
+    bins = np.minimum((t * (num_bins / span)).astype(np.int64), num_bins - 1) if span > 0 else \
+        np.zeros(t.size, dtype=np.int64)
+    order = None
+    if bins.size > 1 and np.any(bins[1:] < bins[:-1]):
+        order = np.argsort(bins, kind='stable')
+        bins = bins[order]
+    # first sample of each non-empty bin
+    starts = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1]))) if bins.size else \
+        np.zeros(0, dtype=np.int64)
+    used = bins[starts]
+
+    series = {}
+    for name, col in columns.items():
+        val = np.asarray(col, dtype=np.float64)
+        if order is not None:
+            val = val[order]
+        valid = ~np.isnan(val)
+        res = {key: np.full(num_bins, np.nan) for key in ('min', 'max', 'mean')}
+        if starts.size:
+            with np.errstate(invalid='ignore'):
+                res['min'][used] = np.fmin.reduceat(val, starts)
+                res['max'][used] = np.fmax.reduceat(val, starts)
+                count = np.add.reduceat(valid, starts)
+                res['mean'][used] = np.add.reduceat(np.where(valid, val, 0.0), starts) / np.where(count > 0, count,
+                                                                                                   np.nan)
+        series[name] = res
+    return x, series
+
 class RegMon():
-    def __init__(self):
+    def __init__(self, cache=None, timer=None, timebase='ktime'):
         super().__init__()
+        # sample timestamps from the host kernel time ('ktime') or the hardware TSF ('tsf'),
+        # see get_tsf_time
+        if timebase not in ('ktime', 'tsf'):
+            raise ValueError('Unknown RegMon timebase: %s' % timebase)
+        self.timebase = timebase
+        # last TSF anchor (ktime, TSF) of get_tsf_time, continued by the next block
+        self.tsf_anchor = None
+        # optional TraceCache for decoded data
+        self.cache = cache
+        # wall time per stage, see profiling.StageTimer
+        self.timer = timer if timer is not None else StageTimer()
+        # data quality counters of the decoder: empty lines dropped, MIB resets, TX/RX/ED
+        # deltas clamped because they exceeded d_mac, rows without MAC delta (rel_* nan)
+        self.stats = {'samples': 0, 'empty_lines': 0, 'mib_resets': 0, 'clamped_tx': 0, 'clamped_rx': 0,
+                      'clamped_ed': 0, 'nan_rows': 0}
 
     def load_data(self, fn):
         data = []
+        with self.timer.stage('regmon_load'):
+            with gzip.open(fn, 'rb') as fo:
+                while True:
+                    try:
+                        data_part = pickle.load(fo)
+                        data.extend(data_part)
+                    except EOFError:
+                        break
+        return data
+
+    def load_decoded(self, fn):
+        # load_data & decode_regmon_data in one step, served from the cache if possible
+        if self.cache is None:
+            return self.decode_regmon_data(self.load_data(fn))
+        return self.cache.get_or_decode(fn, self.get_decoder_version(),
+                                        lambda fn: self.decode_regmon_data(self.load_data(fn)), self.stats)
+
+    def get_decoder_version(self):
+        # cache version of the decoded data, depends on the timebase
+        if self.timebase == 'tsf':
+            return REGMON_DECODER_VERSION + '-tsf'
+        return REGMON_DECODER_VERSION
+
+    def load_compact(self, fn, streaming=False):
+        # decoded data as CompactRegMon; with streaming=True the trace is decoded chunk by
+        # chunk and never held as decoded array as a whole (the cache is not used then)
+        if streaming:
+            return CompactRegMon.from_blocks(self.decode_regmon_data_iter(self.load_data_iter(fn)))
+        return CompactRegMon.from_array(self.load_decoded(fn))
+
+    def load_resampled(self, fn, res_ms, max_gap_ms=None):
+        # decoded data resampled onto a uniform grid, see resample_regmon
+        return resample_regmon(self.load_decoded(fn), res_ms, max_gap_ms)
+
+    def load_data_iter(self, fn):
+        # generator variant of load_data, yields one pickled chunk of lines at a time
         with gzip.open(fn, 'rb') as fo:
             while True:
                 try:
-                    data_part = pickle.load(fo)
-                    data.extend(data_part)
+                    with self.timer.stage('regmon_load'):
+                        chunk = pickle.load(fo)
                 except EOFError:
                     break
-        return data
+                yield chunk
 
     def get_regmon_fields(self, line):
         # data format:
@@ -129,119 +553,265 @@ class RegMon():
         reg11 = int(fields[11], 16)
         return (ktime, ftsf, mac, tx, rx, ed, ltsf, reg7, reg8, reg9, reg10, reg11)
 
+    def get_regmon_fields_array(self, dat, columns=None):
+        # bulk version of get_regmon_fields: converts all lines at once into a
+        # (num_lines, 12) uint64 matrix with the same column order; with columns only
+        # these fields, e.g. columns=(0, 2) for ktime & MAC counter, all lines are validated
+        if len(dat) > 0:
+            # kernel timestamp is decimal, all other fields hex
+            bases = (10,) + (16,) * (REGMON_NUM_FIELDS - 1)
+            fields = _parse_fixed_width_lines(dat, REGMON_NUM_FIELDS, bases, columns)
+            if fields is not None:
+                return fields
+
+        # generic path for lines of varying layout
+        try:
+            tokens = np.array([line.split()[:REGMON_NUM_FIELDS] for line in dat], dtype=np.bytes_)
+        except (ValueError, UnicodeEncodeError) as ex:
+            raise ValueError('Malformed RegMon data: %s' % str(ex))
+        if len(dat) == 0:
+            return np.zeros((0, REGMON_NUM_FIELDS if columns is None else len(columns)), dtype=np.uint64)
+        if tokens.ndim != 2 or tokens.shape[1] != REGMON_NUM_FIELDS:
+            raise ValueError('Malformed RegMon data: expected %d fields per line' % REGMON_NUM_FIELDS)
+
+        fields = np.empty(tokens.shape, dtype=np.uint64)
+        fields[:, 0] = _parse_int_array(tokens[:, 0], 10) # kernel timestamp is decimal
+        fields[:, 1:] = _parse_int_array(tokens[:, 1:], 16)
+        return fields if columns is None else fields[:, list(columns)]
+
+    def decode_regmon_fields(self, fields, debug=False):
+        # vectorized decoding of a field matrix as returned by get_regmon_fields_array;
+        # the first row only serves as previous state for the second one
+        num_samples = max(fields.shape[0] - 1, 0)
+        ret = np.empty(num_samples, dtype=REGMON_TSF_DTYPE if self.timebase == 'tsf' else REGMON_DTYPE)
+        if num_samples == 0:
+            return ret
+
+        if self.timebase == 'tsf':
+            ktime = self.get_tsf_time(fields)
+            # lower TSF after minus before reading the registers, modulo 32 bit
+            ret['read_duration'] = (fields[1:, 6] - (fields[1:, 1] & _TSF_LOW_MASK)) & _TSF_LOW_MASK
+        else:
+            ktime = fields[:, 0]
+        # MAC, TX, RX & ED busy counters
+        cnt = fields[:, 2:6].astype(np.int64)
+        cnt_old = cnt[:-1]
+        cnt_now = cnt[1:]
+
+        # MIB reset: counters restarted from zero, i.e. take them as they are
+        mib_reset = cnt_now[:, 0] <= cnt_old[:, 0]
+        delta = cnt_now - cnt_old
+        delta[mib_reset] = cnt_now[mib_reset]
+        d_mac, d_tx, d_rx, d_ed = delta.T.copy()
+
+        # TX, RX & ED deltas exceeding the MAC delta are invalid (not done after MIB reset)
+        no_reset = ~mib_reset
+        clamp_tx = no_reset & (d_tx > d_mac)
+        clamp_rx = no_reset & (d_rx > d_mac)
+        clamp_ed = no_reset & (d_ed > d_mac)
+        d_tx[clamp_tx] = 0
+        d_rx[clamp_rx] = 0
+        d_ed[clamp_ed] = 0
+
+        # channel idle states & busy states triggered from other sources but rx & tx
+        d_idle = np.maximum(d_mac - d_ed, 0)
+        d_others = np.maximum(d_ed - d_tx - d_rx, 0)
+
+        ret['ktime'] = ktime[1:]
+        ret['ktime_start'] = ktime[:-1]
+        ret['ktime_stop'] = ktime[1:]
+        ret['d_mac'] = d_mac
+        ret['d_tx'] = d_tx
+        ret['d_rx'] = d_rx
+        ret['d_idle'] = d_idle
+        ret['d_others'] = d_others
+        ret['d_fack'] = fields[1:, 7] # ACK failures
+
+        # relative dwell times; undefined for empty MAC deltas (only possible after MIB reset)
+        valid = d_mac > 0
+
+        self.stats['samples'] += num_samples
+        self.stats['mib_resets'] += int(np.count_nonzero(mib_reset))
+        self.stats['clamped_tx'] += int(np.count_nonzero(clamp_tx))
+        self.stats['clamped_rx'] += int(np.count_nonzero(clamp_rx))
+        self.stats['clamped_ed'] += int(np.count_nonzero(clamp_ed))
+        self.stats['nan_rows'] += num_samples - int(np.count_nonzero(valid))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ret['rel_tx'] = np.where(valid, d_tx / d_mac * 100, np.nan)
+            ret['rel_rx'] = np.where(valid, d_rx / d_mac * 100, np.nan)
+            ret['rel_idle'] = np.where(valid, d_idle / d_mac * 100, np.nan)
+            ret['rel_others'] = np.where(valid, d_others / d_mac * 100, np.nan)
+
+        if debug:
+            for row in ret:
+                print('%d\t%d\t%d\t%d\t%d\t%.2f%%\t%.2f%%\t%.2f%%\t%.2f%%\t[TX,RX,IDLE,OTHERS]' % (
+                    row['ktime'], row['d_tx'], row['d_rx'], row['d_idle'], row['d_others'],
+                    row['rel_tx'], row['rel_rx'], row['rel_idle'], row['rel_others']))
+
+        return ret
+
+    def get_tsf_time(self, fields):
+        # sample times (ns) of a field matrix from the 64 bit TSF (usec) instead of the host ktime,
+        # which jitters with kernel scheduling. The TSF timeline is anchored to the ktime of the
+        # first line and re-anchored where the TSF jumps, i.e. runs backwards or deviates from the
+        # ktime step by more than TSF_MAX_DEVIATION_NS; the anchor carries over to the next block.
+        ktime = fields[:, 0].astype(np.int64)
+        tsf = fields[:, 1].astype(np.int64) * 1000
+        d_tsf = np.diff(tsf)
+        jump = np.concatenate(([True], (d_tsf <= 0) | (np.abs(d_tsf - np.diff(ktime)) > TSF_MAX_DEVIATION_NS)))
+        anchor = np.maximum.accumulate(np.where(jump, np.arange(ktime.size), 0))
+        anchor_ktime = ktime[anchor]
+        anchor_tsf = tsf[anchor]
+        if self.tsf_anchor is not None:
+            # continue the anchor of the previous block if its TSF still fits
+            prev_ktime, prev_tsf = self.tsf_anchor
+            if tsf[0] > prev_tsf and abs((tsf[0] - prev_tsf) - (ktime[0] - prev_ktime)) <= TSF_MAX_DEVIATION_NS:
+                first = anchor == 0
+                anchor_ktime[first] = prev_ktime
+                anchor_tsf[first] = prev_tsf
+        self.tsf_anchor = (int(anchor_ktime[-1]), int(anchor_tsf[-1]))
+        return (anchor_ktime + tsf - anchor_tsf).astype(np.uint64)
+
     def decode_regmon_data(self, dat, debug=False):
 
+        with self.timer.stage('regmon_decode'):
+            # remove empty lines first
+            num_lines = len(dat)
+            dat = list(filter(None, dat))
+            self.stats['empty_lines'] += num_lines - len(dat)
+            logger.info('Decoding %d RegMon samples...' % len(dat))
+
+            self.tsf_anchor = None
+            fields = self.get_regmon_fields_array(dat)
+            return self.decode_regmon_fields(fields, debug=debug)
+
+    def decode_regmon_data_iter(self, chunks, debug=False):
+        # streaming variant of decode_regmon_data: decodes the chunks as yielded by
+        # load_data_iter one after another and yields a decoded block per chunk;
+        # the last line of a chunk is the previous sample of the next chunk
+        prev_fields = None
+        self.tsf_anchor = None
+        for chunk in chunks:
+            with self.timer.stage('regmon_decode'):
+                # remove empty lines first
+                num_lines = len(chunk)
+                chunk = list(filter(None, chunk))
+                self.stats['empty_lines'] += num_lines - len(chunk)
+                if len(chunk) == 0:
+                    continue
+
+                fields = self.get_regmon_fields_array(chunk)
+                if prev_fields is not None:
+                    fields = np.concatenate((prev_fields, fields))
+                prev_fields = fields[-1:].copy()
+
+                block = self.decode_regmon_fields(fields, debug=debug)
+            if block.size > 0:
+                yield block
+
+    def decode_regmon_sample(self, fields_old, fields_now):
+        # decodes a single sample from the fields (see get_regmon_fields) of two consecutive lines
+        (ktime_old, ftsf, mac_old, tx_old, rx_old, ed_old, ltsf, reg7_old, reg8_old, reg9_old, reg10_old,
+         reg11_old) = fields_old
+        (ktime, ftsf, mac_now, tx_now, rx_now, ed_now, ltsf, reg7_now, reg8_now, reg9_now, reg10_now,
+         reg11_now) = fields_now
+        # read_duration = ltsf - (ftsf & 0x00000000FFFFFFFF) # usec
+
+        if (mac_now > mac_old):
+
+            # mac busy delta
+            d_mac = mac_now - mac_old  # in mac clock ticks
+
+            # tx delta
+            d_tx = tx_now - tx_old  # TX busy, in mac clock ticks
+            if (d_tx <= d_mac):
+                rel_tx = d_tx / d_mac * 100
+            else:
+                d_tx = 0
+                rel_tx = 0
+
+            # rx delta
+            d_rx = rx_now - rx_old  # TX busy, in mac clock ticks
+            if (d_rx <= d_mac):
+                rel_rx = d_rx / d_mac * 100
+            else:
+                d_rx = 0
+                rel_rx = 0
+
+            # full busy delta
+            d_ed = ed_now - ed_old  # TX busy, in mac clock ticks
+            if (d_ed <= d_mac):
+                rel_ed = d_ed / d_mac * 100
+            else:
+                d_ed = 0
+                rel_ed = 0
+
+            # ACK failures
+            d_fack = reg7_now
+
+            # calculate channel idle states, in mac clock ticks
+            d_idle = d_mac - d_ed
+            if (d_idle > 0):
+                rel_idle = d_idle / d_mac * 100
+            else:
+                d_idle = 0
+                rel_idle = 0
+
+            # calculate busy states that are triggered from other sources but rx & tx
+            d_others = d_ed - d_tx - d_rx
+            if (d_others > 0):
+                rel_others = d_others / d_mac * 100
+            else:
+                d_others = 0
+                rel_others = 0
+
+        else:  # MIB reset
+            (ktime, ftsf, d_mac, d_tx, d_rx, d_ed, ltsf, reg7, reg8, reg9, reg10, reg11) = fields_now
+
+            # validate input data in case of a reset
+            if (d_mac - d_ed > 0):
+                d_idle = d_mac - d_ed
+            else:
+                d_idle = 0
+
+            if (d_ed - (d_tx + d_rx) > 0):
+                d_others = d_ed - (d_tx + d_rx)
+            else:
+                d_others = 0
+
+            d_fack = reg7_now
+
+            if (d_mac > 0):
+                rel_tx = d_tx / d_mac * 100
+                rel_rx = d_rx / d_mac * 100
+                rel_ed = d_ed / d_mac * 100
+                rel_idle = d_idle / d_mac * 100
+                rel_others = d_others / d_mac * 100
+            else:
+                rel_tx = np.nan
+                rel_rx = np.nan
+                rel_ed = np.nan
+                rel_idle = np.nan
+                rel_others = np.nan
+
+        return (ktime, ktime_old, d_mac, d_tx, d_rx, d_idle, d_others, d_fack, rel_tx, rel_rx, rel_idle, rel_others)
+
+    def decode_regmon_data_loop(self, dat, debug=False):
+        # reference implementation decoding line by line, kept to cross-check decode_regmon_data
+
         # remove empty lines first
         dat = list(filter(None, dat))
-        print('Decoding %d RegMon samples...' % len(dat))
+        logger.info('Decoding %d RegMon samples...' % len(dat))
 
-        # init result matrix
-        ret_dtype = np.dtype([
-            ('ktime', np.uint64),
-            ('ktime_start', np.uint64),
-            ('ktime_stop', np.uint64),
-            ('d_mac', np.float64),
-            ('d_tx', np.float64),
-            ('d_rx', np.float64),
-            ('d_idle', np.float64),
-            ('d_others', np.float64),
-            ('d_fack', np.float64),
-            ('rel_tx', np.float64),
-            ('rel_rx', np.float64),
-            ('rel_idle', np.float64),
-            ('rel_others', np.float64),
-        ])
-        ret = np.full((len(dat) - 1), np.nan, dtype=ret_dtype)
+        # init result matrix, every row is set below
+        ret = np.empty(max(len(dat) - 1, 0), dtype=REGMON_DTYPE)
 
+        fields_old = None
         for line_cnt, line in enumerate(dat):
-            if (line_cnt == 0):
-
-                (ktime_old, ftsf, mac_old, tx_old, rx_old, ed_old, ltsf, reg7_old, reg8_old, reg9_old, reg10_old,
-                 reg11_old) = self.get_regmon_fields(line)
-
-            elif (line_cnt > 0):
-
-                (ktime, ftsf, mac_now, tx_now, rx_now, ed_now, ltsf, reg7_now, reg8_now, reg9_now, reg10_now,
-                 reg11_now) = self.get_regmon_fields(line)
-                # read_duration = ltsf - (ftsf & 0x00000000FFFFFFFF) # usec
-
-                if (mac_now > mac_old):
-
-                    # mac busy delta
-                    d_mac = mac_now - mac_old  # in mac clock ticks
-
-                    # tx delta
-                    d_tx = tx_now - tx_old  # TX busy, in mac clock ticks
-                    if (d_tx <= d_mac):
-                        rel_tx = d_tx / d_mac * 100
-                    else:
-                        d_tx = 0
-                        rel_tx = 0
-
-                    # rx delta
-                    d_rx = rx_now - rx_old  # TX busy, in mac clock ticks
-                    if (d_rx <= d_mac):
-                        rel_rx = d_rx / d_mac * 100
-                    else:
-                        d_rx = 0
-                        rel_rx = 0
-
-                    # full busy delta
-                    d_ed = ed_now - ed_old  # TX busy, in mac clock ticks
-                    if (d_ed <= d_mac):
-                        rel_ed = d_ed / d_mac * 100
-                    else:
-                        d_ed = 0
-                        rel_ed = 0
-
-                    # ACK failures
-                    d_fack = reg7_now
-
-                    # calculate channel idle states, in mac clock ticks
-                    d_idle = d_mac - d_ed
-                    if (d_idle > 0):
-                        rel_idle = d_idle / d_mac * 100
-                    else:
-                        d_idle = 0
-                        rel_idle = 0
-
-                    # calculate busy states that are triggered from other sources but rx & tx
-                    d_others = d_ed - d_tx - d_rx
-                    if (d_others > 0):
-                        rel_others = d_others / d_mac * 100
-                    else:
-                        d_others = 0
-                        rel_others = 0
-
-                else:  # MIB reset
-                    (ktime, ftsf, d_mac, d_tx, d_rx, d_ed, ltsf, reg7, reg8, reg9, reg10, reg11) = self.get_regmon_fields(
-                        line)
-
-                    # validate input data in case of a reset
-                    if (d_mac - d_ed > 0):
-                        d_idle = d_mac - d_ed
-                    else:
-                        d_idle = 0
-
-                    if (d_ed - (d_tx + d_rx) > 0):
-                        d_others = d_ed - (d_tx + d_rx)
-                    else:
-                        d_others = 0
-
-                    d_fack = reg7_now
-
-                    if (d_mac > 0):
-                        rel_tx = d_tx / d_mac * 100
-                        rel_rx = d_rx / d_mac * 100
-                        rel_ed = d_ed / d_mac * 100
-                        rel_idle = d_idle / d_mac * 100
-                        rel_others = d_others / d_mac * 100
-                    else:
-                        rel_tx = np.nan
-                        rel_rx = np.nan
-                        rel_ed = np.nan
-                        rel_idle = np.nan
-                        rel_others = np.nan
+            fields_now = self.get_regmon_fields(line)
+            if (line_cnt > 0):
+                (ktime, ktime_old, d_mac, d_tx, d_rx, d_idle, d_others, d_fack, rel_tx, rel_rx, rel_idle,
+                 rel_others) = self.decode_regmon_sample(fields_old, fields_now)
 
                 if debug:
                     print('%d\t%d\t%d\t%d\t%d\t%.2f%%\t%.2f%%\t%.2f%%\t%.2f%%\t[TX,RX,IDLE,OTHERS]' % (
@@ -261,116 +831,94 @@ class RegMon():
                 ret[line_cnt - 1]['rel_idle'] = rel_idle
                 ret[line_cnt - 1]['rel_others'] = rel_others
 
-                ktime_old = ktime
-                mac_old = mac_now
-                tx_old = tx_now
-                rx_old = rx_now
-                ed_old = ed_now
+            fields_old = fields_now
 
         return ret
 
     def show_timing_info(self, regmon_dat):
-        # RegMon timing data
-        regmon_ts = regmon_dat['ktime']
-        regmon_t_res = np.mean(np.ediff1d(regmon_ts)) # ns
-        regmon_t_start = np.nanmin(regmon_ts)
-        regmon_t_end = np.nanmax(regmon_ts)
-        regmon_t_range = (regmon_t_end - regmon_t_start) / 1e9 # s
-        print('RegMon start:      %d' % regmon_t_start)
-        print('RegMon end:        %d' % regmon_t_end)
-        print('RegMon resolution: %d nsec' % regmon_t_res)
-        print('RegMon duration:   %f sec' % regmon_t_range)
-        print('')
-
-    def plot_data(self, regmon_edat):
-
-        print('Plotting results...')
-        # color definitions
-        c0 = (0, 0, 0, 100)
-        c1 = (240, 83, 84, 100)
-        c2 = (55, 168, 251, 100)
-        c3 = (243, 214, 127, 100)
-        c4 = (212, 118, 239, 100)
-        c5 = (183, 16, 16, 100)
-
-        matplotlib.colors.ColorConverter.colors['grafana1'] = (0.20, 0.20, 0.20)
-        matplotlib.colors.ColorConverter.colors['grafana2'] = (0.31, 0.29, 0.29)
-        matplotlib.colors.ColorConverter.colors['regmon_tx'] = tuple(np.array(c1[0:3]) / 256)
-        matplotlib.colors.ColorConverter.colors['regmon_rx'] = tuple(np.array(c2[0:3]) / 256)
-        matplotlib.colors.ColorConverter.colors['regmon_idle'] = tuple(np.array(c3[0:3]) / 256)
-        matplotlib.colors.ColorConverter.colors['regmon_others'] = tuple(np.array(c4[0:3]) / 256)
-        matplotlib.colors.ColorConverter.colors['regmon_fack'] = tuple(np.array(c5[0:3]) / 256)
-
-        x_regemon = regmon_edat['ktime'] if np.any(regmon_edat['ktime']) else [np.nan]
-
-        x_min_glob = np.uint64(np.nanmin([x_regemon[0]]))
-        x_max_glob = np.uint64(np.nanmax([x_regemon[-1]]))
-
-        fig = plt.figure(figsize=(20, 4))
-        ax1 = plt.subplot(111, axisbg=(0.1843, 0.3098, 0.3098))
-        # fig.patch.set_facecolor('grafana1')
+        # RegMon timing data; regmon_dat is either a decoded array (or CompactRegMon) or
+        # an iterable of decoded blocks as yielded by decode_regmon_data_iter
+        timing = TimingStats('RegMon')
+        if isinstance(regmon_dat, (np.ndarray, CompactRegMon)):
+            timing.update(regmon_dat)
+        else:
+            for block in regmon_dat:
+                timing.update(block)
+        timing.show()
+
+    def plot_data(self, regmon_edat, fn=None, width_px=2000, height_px=400, dpi=100, title=None):
+        # stacked MAC state distribution over time. The samples are aggregated into one bin per
+        # pixel column (see decimate_minmax), so the drawing cost does not depend on the trace
+        # length. With fn the figure is rendered headless (Agg, format by extension, e.g.
+        # .png or .svg) & written to fn, otherwise it is shown interactively.
+        logger.info('Plotting results...')
+        # matplotlib is only needed for plotting
+        from matplotlib.figure import Figure
+
+        ktime = regmon_edat['ktime']
+        if ktime.size == 0:
+            raise ValueError('No RegMon samples to plot')
+
+        # ACK failures are shown with the TX share of the sample they occurred in
+        fack_tx = np.where(regmon_edat['d_fack'] > 0, regmon_edat['rel_tx'], 0.0)
+        x, series = decimate_minmax(ktime, {
+            'rel_tx': regmon_edat['rel_tx'],
+            'rel_rx': regmon_edat['rel_rx'],
+            'rel_idle': regmon_edat['rel_idle'],
+            'rel_others': regmon_edat['rel_others'],
+            'fack_tx': fack_tx,
+        }, width_px)
+        # s since the first sample
+        x = (x - float(np.min(ktime))) / 1e9
+
+        logger.info('Calculating RegMon results...')
+        regmon_estats = {'rel_tx': {}, 'rel_rx': {}, 'rel_idle': {}, 'rel_others': {}, 'd_fack': {}}
+        for name in ('rel_tx', 'rel_rx', 'rel_idle', 'rel_others', 'd_fack'):
+            regmon_estats[name]['avg'] = np.nanmean(regmon_edat[name])
+
+        logger.info('Mean TX dwell time: %.2f%%' % regmon_estats['rel_tx']['avg'])
+        logger.info('Mean RX dwell time: %.2f%%' % regmon_estats['rel_rx']['avg'])
+        logger.info('Mean IDLE dwell time: %.2f%%' % regmon_estats['rel_idle']['avg'])
+        logger.info('Mean OTHERS dwell time: %.2f%%' % regmon_estats['rel_others']['avg'])
+        logger.info('Mean d_fack: %.2f%%' % regmon_estats['d_fack']['avg'])
+
+        if fn is not None:
+            # headless, no pyplot state: safe in worker processes & without a display
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
+            FigureCanvasAgg(fig)
+        else:
+            import matplotlib.pyplot as plt
+            fig = plt.figure(figsize=(width_px / dpi, height_px / dpi), dpi=dpi)
         # RegMon
         ###############################################################################################
-        ax = ax1
-        ax.set_title('Atheros MAC State Distribution - RegMon')
+        ax = fig.add_subplot(111, facecolor=(0.1843, 0.3098, 0.3098))
+        ax.set_title(title or 'Atheros MAC State Distribution - RegMon')
         ax.set_ylabel('Relative Dwell Time [%]')
-
-        max_samples = -1
-        x = regmon_edat['ktime'][0:max_samples] - x_min_glob
-
-        yl = np.zeros(len(x))
-        y1 = regmon_edat['rel_tx'][0:max_samples]  # tx
-        y2 = regmon_edat['rel_rx'][0:max_samples]  # rx
-        y3 = regmon_edat['rel_idle'][0:max_samples]  # idle
-        y4 = regmon_edat['rel_others'][0:max_samples]  # others
-        y5 = regmon_edat['d_fack'][0:max_samples]  # ACK failures
-        y5[y5 > 0] = y1[y5 > 0]
-
-        print('Calculating RegMon results...')
-        regmon_estats = {'rel_tx': {}, 'rel_rx': {}, 'rel_idle': {}, 'rel_others': {}, 'd_fack': {}}
-        regmon_estats['rel_tx']['avg'] = np.nanmean(regmon_edat['rel_tx'])
-        regmon_estats['rel_rx']['avg'] = np.nanmean(regmon_edat['rel_rx'])
-        regmon_estats['rel_idle']['avg'] = np.nanmean(regmon_edat['rel_idle'])
-        regmon_estats['rel_others']['avg'] = np.nanmean(regmon_edat['rel_others'])
-
-        regmon_estats['d_fack']['avg'] = np.nanmean(regmon_edat['d_fack'])
-
-        print('Mean TX dwell time: %.2f%%' % regmon_estats['rel_tx']['avg'])
-        print('Mean RX dwell time: %.2f%%' % regmon_estats['rel_rx']['avg'])
-        print('Mean IDLE dwell time: %.2f%%' % regmon_estats['rel_idle']['avg'])
-        print('Mean OTHERS dwell time: %.2f%%' % regmon_estats['rel_others']['avg'])
-        print('Mean d_fack: %.2f%%' % regmon_estats['d_fack']['avg'])
-
-        regmon_Ts = 10 * 1e6
-        width = regmon_Ts
-        # ax.bar(x - width, y1, width, bottom=yl, color='regmon_tx', edgecolor='none', label='TX')
-        # ax.bar(x - width, y2, width, bottom=yl+y1, color='regmon_rx', edgecolor='none', label='RX')
-        # ax.bar(x - width, y3, width, bottom=yl+y1+y2, color='regmon_idle', edgecolor='none', label='IDLE')
-        # ax.bar(x - width, y4, width, bottom=yl+y1+y2+y3, color='regmon_others', edgecolor='none', label='OTHERS')
-        # ax.bar(x - width, y5, width, bottom=yl, color='regmon_fack', edgecolor='none', label='TX ACK FAIL')
-
-        ax.bar(x, y1, width, bottom=yl, color='regmon_tx', edgecolor='none', label='TX')
-        ax.bar(x, y2, width, bottom=yl + y1, color='regmon_rx', edgecolor='none', label='RX')
-        ax.bar(x, y3, width, bottom=yl + y1 + y2, color='regmon_idle', edgecolor='none', label='IDLE')
-        ax.bar(x, y4, width, bottom=yl + y1 + y2 + y3, color='regmon_others', edgecolor='none', label='OTHERS')
-        ax.bar(x, y5, width, bottom=yl, color='regmon_fack', edgecolor='none', label='TX ACK FAIL')
+        ax.set_xlabel('Time [s]')
+
+        # mean of each bin stacked; bins without samples (gaps) stay empty
+        bottom = np.zeros(x.size)
+        for name, color, label in (('rel_tx', 'regmon_tx', 'TX'), ('rel_rx', 'regmon_rx', 'RX'),
+                                   ('rel_idle', 'regmon_idle', 'IDLE'), ('rel_others', 'regmon_others', 'OTHERS')):
+            top = bottom + series[name]['mean']
+            ax.fill_between(x, bottom, top, color=REGMON_PLOT_COLORS[color], linewidth=0, label=label)
+            bottom = top
+        ax.fill_between(x, 0, series['fack_tx']['mean'], color=REGMON_PLOT_COLORS['regmon_fack'], linewidth=0,
+                        label='TX ACK FAIL')
+        # peak interference within each bin, lost in the mean for bursty interferers
+        ax.plot(x, 100 - series['rel_others']['max'], color=REGMON_PLOT_COLORS['grafana1'], linewidth=0.5,
+                label='OTHERS MAX')
         ax.xaxis.grid()
         ax.yaxis.grid()
 
-        ####
-        # ax.set_xlim(0, x_max_glob - x_min_glob)
-        ax.set_ylim(0, max_samples / 2)
-
-        xticklabels = (np.array(ax.get_xticks().tolist()) / 1e6).astype(np.uint64)
-        ax.set_xticklabels(xticklabels)
+        ax.set_xlim(x[0], x[-1])
         ax.set_ylim(0, 100)
         # text box
-        ax_xmin, ax_xmax = ax.get_xlim()
-        ax_ymin, ax_ymax = ax.get_ylim()
         stat_str = "TX Avg:           %05.2f%%\nRX Avg:           %05.2f%%\nIDLE Avg:        %05.2f%%\nOTHERS Avg:  %05.2f%%" % \
                    (regmon_estats['rel_tx']['avg'], regmon_estats['rel_rx']['avg'], regmon_estats['rel_idle']['avg'],
                     regmon_estats['rel_others']['avg'])
-        ax.text(ax_xmax * 1.005, ax_ymax * 0.840, stat_str, size=12, rotation=0.0,
+        ax.text(1.005, 0.840, stat_str, size=12, rotation=0.0, transform=ax.transAxes,
                 ha="left", va="center",
                 bbox=dict(boxstyle="round",
                           ec=(1., 0.5, 0.5),
@@ -378,7 +926,7 @@ class RegMon():
                           )
                 )
         # legend
-        objs1, labels1 = ax1.get_legend_handles_labels()
+        objs1, labels1 = ax.get_legend_handles_labels()
         fig.legend(objs1[::-1], labels1[::-1],
                    prop={'size': 12},
                    loc='upper center',
@@ -386,7 +934,280 @@ class RegMon():
                    shadow=True,
                    ncol=6)
 
-        plt.show()
+        if fn is None:
+            plt.show()
+            return None
+        # room for the legend above & the text box right of the axes
+        fig.subplots_adjust(left=0.05, right=0.86, top=0.8)
+        fig.savefig(fn)
+        logger.info('Plot written to %s' % fn)
+        return fn
+
+### CompactRegMon: decoded RegMon data with a small memory footprint ###
+# the tick deltas are stored as 32 bit integers, the RegMon counter deltas as signed 32 bit
+# integers: d_tx & d_rx may be negative (counter spikes, MIB resets not detected as such) and
+# columns exceeding the int32 range are kept as int64
+COMPACT_REGMON_COUNTERS = ('d_mac', 'd_tx', 'd_rx', 'd_idle', 'd_others', 'd_fack')
+COMPACT_REGMON_REL = {'rel_tx': 'd_tx', 'rel_rx': 'd_rx', 'rel_idle': 'd_idle', 'rel_others': 'd_others'}
+
+class CompactRegMon():
+    # holds the same samples as a REGMON_DTYPE array: the counter deltas as int32 columns
+    # and the time as ktime_start of the first sample plus uint32 (uint64 if needed)
+    # increments, i.e. 28 instead of 104 bytes per sample. Fields are accessed as on the
+    # structured array, e.g. dat['d_others'] (float64 as before); ktime, ktime_start,
+    # ktime_stop & rel_* are derived on first access and cached, see drop_cache().
+    dtype = REGMON_DTYPE
+
+    def __init__(self, ktime_base, ktime_delta, counters):
+        # ktime_base: ktime_start of the first sample; ktime_delta: ktime minus ktime_start of
+        # each sample; counters: dict of int32 (int64) columns, see COMPACT_REGMON_COUNTERS
+        self.ktime_base = int(ktime_base)
+        self.ktime_delta = ktime_delta
+        self.counters = counters
+        self.size = ktime_delta.size
+        self.shape = (self.size,)
+        self._cache = {}
+
+    @classmethod
+    def from_array(cls, regmon_dat):
+        # from a decoded REGMON_DTYPE array; consecutive samples have to be contiguous, i.e.
+        # ktime_start of each sample is the ktime of the previous one
+        ktime = regmon_dat['ktime']
+        ktime_start = regmon_dat['ktime_start']
+        if regmon_dat.size > 1 and not np.array_equal(ktime_start[1:], ktime[:-1]):
+            raise ValueError('RegMon samples are not contiguous')
+        ktime_base = int(ktime_start[0]) if regmon_dat.size else 0
+        ktime_delta = ktime - ktime_start
+        if ktime_delta.size == 0 or ktime_delta.max() <= np.iinfo(np.uint32).max:
+            ktime_delta = ktime_delta.astype(np.uint32)
+
+        counters = {}
+        for name in COMPACT_REGMON_COUNTERS:
+            col = regmon_dat[name]
+            int32 = np.iinfo(np.int32)
+            fits = col.size == 0 or (col.min() >= int32.min and col.max() <= int32.max)
+            counters[name] = col.astype(np.int32 if fits else np.int64)
+        return cls(ktime_base, ktime_delta, counters)
+
+    @classmethod
+    def from_blocks(cls, blocks):
+        # from an iterable of contiguous decoded blocks, e.g. as yielded by
+        # RegMon.decode_regmon_data_iter
+        parts = [cls.from_array(block) for block in blocks if block.size > 0]
+        if not parts:
+            return cls.from_array(np.zeros(0, dtype=REGMON_DTYPE))
+        return cls.concatenate(parts)
+
+    @classmethod
+    def concatenate(cls, parts):
+        # joins contiguous CompactRegMon objects
+        for prev, part in zip(parts[:-1], parts[1:]):
+            if prev.size and part.size and prev.get_ktime_end() != part.ktime_base:
+                raise ValueError('RegMon samples are not contiguous')
+        ktime_delta = np.concatenate([part.ktime_delta for part in parts])
+        counters = {name: np.concatenate([part.counters[name] for part in parts])
+                    for name in COMPACT_REGMON_COUNTERS}
+        return cls(parts[0].ktime_base, ktime_delta, counters)
+
+    def get_ktime_end(self):
+        # ktime of the last sample
+        return self.ktime_base + int(np.sum(self.ktime_delta, dtype=np.uint64))
+
+    def get_raw(self, name):
+        # stored int32 (int64) column of a counter
+        return self.counters[name]
+
+    def get_field(self, name):
+        if name in self.counters:
+            # float64 as in the decoded array, computations like d_tx + d_rx must not wrap
+            return self.counters[name].astype(np.float64)
+        if name in self._cache:
+            return self._cache[name]
+
+        if name in ('ktime', 'ktime_stop'):
+            val = np.uint64(self.ktime_base) + np.cumsum(self.ktime_delta, dtype=np.uint64)
+            self._cache['ktime'] = self._cache['ktime_stop'] = val
+        elif name == 'ktime_start':
+            ktime = self.get_field('ktime')
+            val = np.concatenate(([np.uint64(self.ktime_base)], ktime[:-1])) if self.size else ktime
+            self._cache[name] = val
+        elif name in COMPACT_REGMON_REL:
+            d_mac = self.counters['d_mac']
+            valid = d_mac > 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                val = np.where(valid, self.counters[COMPACT_REGMON_REL[name]] / d_mac * 100, np.nan)
+            self._cache[name] = val
+        else:
+            raise ValueError('no field of name %s' % name)
+        return val
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.get_field(key)
+        # rows, e.g. a slice: returned as decoded array
+        return self.to_array()[key]
+
+    def __len__(self):
+        return self.size
+
+    def to_array(self):
+        # as REGMON_DTYPE array
+        ret = np.empty(self.size, dtype=REGMON_DTYPE)
+        for name in REGMON_DTYPE.names:
+            ret[name] = self.get_field(name)
+        return ret
+
+    def drop_cache(self):
+        # frees the derived fields
+        self._cache = {}
+
+    @property
+    def nbytes(self):
+        # memory of the stored columns, without the cache
+        return self.ktime_delta.nbytes + sum(col.nbytes for col in self.counters.values())
+
+### IOMeter data: network interface statistics of the WiFi AP (/sys/class/net/<iface>/statistics) ###
+# field layout of the recorded lines: kernel timestamp (nsec) followed by the interface counters,
+# all decimal; other layouts can be passed to IOMeter()
+IOMETER_FIELDS = ('ktime', 'rx_bytes', 'rx_packets', 'tx_bytes', 'tx_packets')
+
+# bump whenever the output of decode_iometer_data changes, invalidates cached data
+IOMETER_DECODER_VERSION = 'iometer-1'
+
+class IOMeter():
+    def __init__(self, cache=None, fields=IOMETER_FIELDS, timer=None):
+        # optional TraceCache for decoded data
+        self.cache = cache
+        # wall time per stage, see profiling.StageTimer
+        self.timer = timer if timer is not None else StageTimer()
+        # data quality counters of the decoder
+        self.stats = {'samples': 0, 'counter_resets': 0}
+        if fields[0] != 'ktime':
+            raise ValueError('IOMeter fields have to start with ktime')
+        self.fields = tuple(fields)
+        self.counters = self.fields[1:]
+
+        # decoded IOMeter samples, one row per pair of consecutive samples: the counter
+        # increments and for the byte counters the throughput in Mbps
+        self.dtype = np.dtype([('ktime', np.uint64), ('ktime_start', np.uint64)] +
+                              [('d_' + c, np.float64) for c in self.counters] +
+                              [(c[:-len('_bytes')] + '_thrpt', np.float64)
+                               for c in self.counters if c.endswith('_bytes')])
+
+    def load_data(self, fn):
+        data = []
+        with self.timer.stage('iometer_load'):
+            with gzip.open(fn, 'rb') as fo:
+                while True:
+                    try:
+                        data_part = pickle.load(fo)
+                        data.extend(data_part)
+                    except EOFError:
+                        break
+        return data
+
+    def load_data_iter(self, fn):
+        # generator variant of load_data, yields one pickled chunk of samples at a time
+        with gzip.open(fn, 'rb') as fo:
+            while True:
+                try:
+                    yield pickle.load(fo)
+                except EOFError:
+                    break
+
+    def load_decoded(self, fn):
+        # load_data & decode_iometer_data in one step, served from the cache if possible
+        if self.cache is None:
+            return self.decode_iometer_data(self.load_data(fn))
+        version = '%s|%s' % (IOMETER_DECODER_VERSION, ','.join(self.fields))
+        return self.cache.get_or_decode(fn, version, lambda fn: self.decode_iometer_data(self.load_data(fn)),
+                                        self.stats)
+
+    def get_iometer_fields_array(self, dat):
+        # converts all samples at once into a (num_samples, num_fields) uint64 matrix; a sample
+        # is either a line of whitespace separated decimals (str or bytes), a dict keyed by
+        # the field names or a sequence of numbers
+        num_fields = len(self.fields)
+        if len(dat) == 0:
+            return np.zeros((0, num_fields), dtype=np.uint64)
+
+        first = dat[0]
+        if isinstance(first, dict):
+            try:
+                return np.array([[sample[f] for sample in dat] for f in self.fields], dtype=np.uint64).T
+            except KeyError as ex:
+                raise ValueError('Malformed IOMeter data: missing field %s' % str(ex))
+        if not isinstance(first, (str, bytes)):
+            fields = np.array(dat, dtype=np.uint64)
+            if fields.ndim != 2 or fields.shape[1] < num_fields:
+                raise ValueError('Malformed IOMeter data: expected %d fields per sample' % num_fields)
+            return fields[:, :num_fields]
+
+        if isinstance(first, bytes):
+            dat = [line.decode('ascii') for line in dat]
+        bases = (10,) * num_fields
+        fields = _parse_fixed_width_lines(dat, num_fields, bases)
+        if fields is not None:
+            return fields
+
+        # generic path for lines of varying layout
+        tokens = np.array([line.split()[:num_fields] for line in dat], dtype=np.bytes_)
+        if tokens.ndim != 2 or tokens.shape[1] != num_fields:
+            raise ValueError('Malformed IOMeter data: expected %d fields per line' % num_fields)
+        return _parse_int_array(tokens, 10)
+
+    def decode_iometer_fields(self, fields, debug=False):
+        # vectorized decoding of a field matrix as returned by get_iometer_fields_array;
+        # the first row only serves as previous state for the second one
+        num_samples = max(fields.shape[0] - 1, 0)
+        ret = np.empty(num_samples, dtype=self.dtype)
+        if num_samples == 0:
+            return ret
+
+        ktime_old = fields[:-1, 0]
+        ktime_now = fields[1:, 0]
+        ret['ktime'] = ktime_now
+        ret['ktime_start'] = ktime_old
+        d_time = (ktime_now.astype(np.int64) - ktime_old.astype(np.int64)) / 1e9 # sec
+        self.stats['samples'] += num_samples
+
+        for col, name in enumerate(self.counters, 1):
+            cnt_old = fields[:-1, col]
+            cnt_now = fields[1:, col]
+            # counter reset (interface restart) or wrap around: count from zero
+            reset = cnt_now < cnt_old
+            self.stats['counter_resets'] += int(np.count_nonzero(reset))
+            if debug and np.any(reset):
+                print('IOMeter counter %s reset in %d samples' % (name, np.count_nonzero(reset)))
+            ret['d_' + name] = np.where(reset, cnt_now, cnt_now - np.where(reset, 0, cnt_old))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name in self.counters:
+                if name.endswith('_bytes'):
+                    ret[name[:-len('_bytes')] + '_thrpt'] = ret['d_' + name] * 8 / d_time / 1e6 # Mbps
+        return ret
+
+    def decode_iometer_data(self, dat, debug=False):
+
+        with self.timer.stage('iometer_decode'):
+            # remove empty samples first
+            dat = [sample for sample in dat if len(sample) > 0]
+            logger.info('Decoding %d IOMeter samples...' % len(dat))
+
+            fields = self.get_iometer_fields_array(dat)
+            return self.decode_iometer_fields(fields, debug=debug)
+
+    def show_timing_info(self, iometer_dat):
+        # timing data
+        timing = TimingStats('IOMeter')
+        timing.update(iometer_dat)
+        timing.show()
+
+        for name in iometer_dat.dtype.names:
+            if name.endswith('_thrpt'):
+                print('Mean %s throughput: %.2f Mbps' % (name[:-len('_thrpt')].upper(),
+                                                         np.nanmean(iometer_dat[name])))
+        print('')
 
 ### Config: meta data of experiment ###
 class Config():
@@ -436,8 +1257,56 @@ class Config():
 
         return meta_dict
 
+    def get_run_params(self, config_data):
+        # typed run parameters from the config & the measurement name, None if not available
+        meta_data = self.get_meta_data_from_fname(config_data['common']['meas_name'])
+
+        def match(key, pattern, conv):
+            for item in meta_data.get(key, []):
+                re_match = re.match(pattern, item)
+                if re_match:
+                    return conv(re_match.group(1))
+            return None
+
+        params = {
+            'campaign': os.path.basename(os.path.normpath(config_data['common'].get('data_dir', ''))) or None,
+            'meas_name': config_data['common']['meas_name'],
+            'runtime': config_data['common'].get('runtime'),
+            # LTE-U
+            'lteu_modulation': match('lteu', r'^(\d+qam|qpsk|bpsk)$', str),
+            'lteu_duty_cycle': match('lteu', r'^duty(\d+(?:\.\d+)?)$', lambda v: float(v) / 100.0),
+            'lteu_on_ms': match('lteu', r'^on(\d+(?:\.\d+)?)ms$', float),
+            'lteu_off_ms': match('lteu', r'^off(\d+(?:\.\d+)?)ms$', float),
+            'lteu_tx_pwr': match('lteu', r'^(-?\d+)dbm$', int), # dBm
+            # WiFi
+            'wifi_std': match('wifi', r'^(11[a-z]+)$', str),
+            'wifi_freq': match('wifi', r'^(\d+)mhz$', int), # MHz
+            'wifi_tx_pwr': match('wifi', r'^(-?\d+)dbm$', int), # dBm
+            # RegMon resolution, ms
+            'regmon_res': match('RMres', r'^(\d+(?:\.\d+)?)$', float),
+        }
+
+        params['wifi_channel'] = None
+        freq = params['wifi_freq']
+        if freq is not None:
+            if freq == 2484:
+                params['wifi_channel'] = 14
+            elif freq < 5000:
+                params['wifi_channel'] = (freq - 2407) // 5
+            else:
+                params['wifi_channel'] = (freq - 5000) // 5
+
+        if params['runtime'] is None:
+            params['runtime'] = match('runt', r'^(\d+)$', int)
+        return params
+
     def print(self, config_data):
+        import pprint
         pp = pprint.PrettyPrinter(indent=4)
         pp.pprint(config_data)
 
+def format_run_param(value, fmt='%s'):
+    # a run parameter (see Config.get_run_params) for printing, '-' if it is not available
+    return fmt % value if value is not None else '-'
+
 
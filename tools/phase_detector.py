@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+This is a detector estimating the timing of the LTE-U ON and OFF phases, i.e.
+the CSAT period, the ON duration, the duty cycle and the phase offset of each ON
+burst, from the MAC state energy-detection without packet reception.
+
+The interference ratio d_others / d_mac is put on a uniform time grid, the CSAT
+period is taken from the FFT based autocorrelation and refined from the detected
+rising edges of the ON bursts.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import numpy as np
+
+def to_uniform_grid(ktime, values, res_ns, t0=None):
+    # averages values (stamped with ktime in ns) into bins of res_ns starting at t0 (default:
+    # the earliest sample); empty bins take the value of the previous non-empty bin. ktime
+    # doesn't need to be monotonic, samples stepping back in time go into their own bin.
+    if t0 is None:
+        t0 = int(np.min(ktime)) if len(ktime) else 0
+    idx = ((ktime.astype(np.int64) - np.int64(t0)) // np.int64(res_ns)).astype(np.int64)
+    valid = idx >= 0
+    idx = idx[valid]
+    values = values[valid]
+    num_bins = int(np.max(idx)) + 1 if idx.size else 0
+
+    cnt = np.bincount(idx, minlength=num_bins)
+    sums = np.bincount(idx, weights=values, minlength=num_bins)
+    filled = cnt > 0
+    grid = np.zeros(num_bins)
+    grid[filled] = sums[filled] / cnt[filled]
+    # forward fill gaps
+    last = np.maximum.accumulate(np.where(filled, np.arange(num_bins), 0))
+    return grid[last], t0
+
+def get_runs(x):
+    # run-length encoding of a boolean array: start index, length & value of each run
+    if x.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), x[:0]
+    change = np.flatnonzero(x[1:] != x[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [x.size])))
+    return starts, lengths, x[starts]
+
+def debounce(x, min_on, min_off):
+    # closes OFF gaps shorter than min_off bins between ON runs and drops ON runs
+    # shorter than min_on bins
+    if x.size == 0:
+        return x
+    starts, lengths, vals = get_runs(x)
+    inner = np.zeros(vals.size, dtype=bool)
+    inner[1:-1] = True
+    vals = vals.copy()
+    vals[~vals & inner & (lengths < min_off)] = True
+    x = np.repeat(vals, lengths)
+    starts, lengths, vals = get_runs(x)
+    vals = vals.copy()
+    vals[vals & (lengths < min_on)] = False
+    return np.repeat(vals, lengths)
+
+def autocorrelation(x):
+    # normalized autocorrelation via FFT, O(n log n)
+    x = x - np.mean(x)
+    n = x.size
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    spec = np.fft.rfft(x, nfft)
+    ac = np.fft.irfft(spec * np.conj(spec), nfft)[:n]
+    if ac[0] <= 0:
+        return np.zeros(n)
+    # unbiased: correct for the decreasing overlap
+    return ac / ac[0] * n / (n - np.arange(n))
+
+### LteuPhaseDetector ###
+class LteuPhaseDetector():
+    def __init__(self, threshold=0.1, res_ms=0.5, min_period_ms=10.0, max_period_ms=400.0,
+                 min_on_ms=1.0, min_off_ms=2.0):
+        # threshold: same semantics as EdDetector, a bin with d_others / d_mac above
+        # threshold is considered as LTE-U ON
+        self.threshold = threshold
+        self.res_ms = res_ms
+        self.min_period_ms = min_period_ms
+        self.max_period_ms = max_period_ms
+        self.min_on_ms = min_on_ms
+        self.min_off_ms = min_off_ms
+
+    def get_intf_ratio(self, regmon_dat):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            intf_ratio = regmon_dat['d_others'] / regmon_dat['d_mac']
+        # empty MAC deltas: inf counts as interfered, nan as not
+        return np.nan_to_num(intf_ratio, nan=0.0, posinf=1.0)
+
+    def get_on_signal(self, ktime, intf_ratio, t0=None):
+        # debounced LTE-U ON/OFF signal on the uniform grid starting at t0 (default: first sample)
+        grid, t0 = to_uniform_grid(ktime, intf_ratio, self.res_ms * 1e6, t0)
+        x = debounce(grid > self.threshold, int(round(self.min_on_ms / self.res_ms)),
+                     int(round(self.min_off_ms / self.res_ms)))
+        return x, t0
+
+    def estimate_period(self, x):
+        # CSAT period in bins from the autocorrelation of the ON/OFF signal; the smallest
+        # lag with a peak close to the global maximum wins to avoid picking a multiple
+        ac = autocorrelation(x.astype(np.float64))
+        lag_min = max(int(self.min_period_ms / self.res_ms), 2)
+        lag_max = min(int(self.max_period_ms / self.res_ms), ac.size // 2)
+        if lag_max <= lag_min:
+            return np.nan
+        seg = ac[lag_min:lag_max + 1]
+        # local maxima only
+        is_peak = np.zeros(seg.size, dtype=bool)
+        is_peak[1:-1] = (seg[1:-1] >= seg[:-2]) & (seg[1:-1] > seg[2:])
+        peaks = np.flatnonzero(is_peak)
+        if peaks.size == 0 or seg[peaks].max() <= 0:
+            return np.nan
+        best = peaks[np.argmax(seg[peaks])]
+        peak = peaks[seg[peaks] >= 0.9 * seg[best]][0]
+
+        # sub-bin refinement by parabolic interpolation
+        y0, y1, y2 = seg[peak - 1], seg[peak], seg[peak + 1]
+        denom = y0 - 2 * y1 + y2
+        shift = 0.5 * (y0 - y2) / denom if denom != 0 else 0.0
+        return lag_min + peak + shift
+
+    def estimate(self, regmon_dat, t_ref=None):
+        # returns a dict with period, ON/OFF duration (ms), duty cycle, phase (ms, relative
+        # to t_ref, default is the first sample) and the start time (ns) & phase (ms) of
+        # each detected ON burst
+        ret = {'period_ms': np.nan, 'on_ms': np.nan, 'off_ms': np.nan, 'duty_cycle': np.nan,
+               'phase_ms': np.nan, 't_ref': None, 'burst_start': np.zeros(0, dtype=np.uint64),
+               'burst_on_ms': np.zeros(0), 'burst_phase_ms': np.zeros(0)}
+        if regmon_dat.size < 2:
+            return ret
+
+        res_ns = self.res_ms * 1e6
+        x, t0 = self.get_on_signal(regmon_dat['ktime'], self.get_intf_ratio(regmon_dat))
+        if t_ref is None:
+            t_ref = t0
+        ret['t_ref'] = t_ref
+        ret['duty_cycle'] = np.mean(x)
+
+        period = self.estimate_period(x)
+        if np.isnan(period):
+            return ret
+
+        # ON bursts: pair each rising edge with the next falling edge
+        rises = np.flatnonzero(~x[:-1] & x[1:]) + 1
+        falls = np.flatnonzero(x[:-1] & ~x[1:]) + 1
+        if rises.size > 0:
+            falls = falls[falls > rises[0]]
+        num_bursts = min(rises.size, falls.size)
+        rises = rises[:num_bursts]
+        on_len = falls[:num_bursts] - rises
+
+        # refine the period by a least squares fit of the burst starts over their cycle index
+        if num_bursts >= 3:
+            cycle = np.round((rises - rises[0]) / period)
+            if np.unique(cycle).size >= 2:
+                slope = np.polyfit(cycle, rises, 1)[0]
+                if abs(slope - period) < 0.1 * period:
+                    period = slope
+
+        period_ms = period * self.res_ms
+        ret['period_ms'] = period_ms
+        if num_bursts > 0:
+            ret['on_ms'] = np.median(on_len) * self.res_ms
+        else:
+            ret['on_ms'] = ret['duty_cycle'] * period_ms
+        ret['off_ms'] = period_ms - ret['on_ms']
+
+        burst_phase = np.mod((t0 - t_ref) / 1e6 + rises * self.res_ms, period_ms)
+        ret['burst_start'] = (t0 + rises * res_ns).astype(np.uint64)
+        ret['burst_on_ms'] = on_len * self.res_ms
+        ret['burst_phase_ms'] = burst_phase
+        if num_bursts > 0:
+            # circular mean of the burst phases
+            angle = 2 * np.pi * burst_phase / period_ms
+            mean_angle = np.arctan2(np.mean(np.sin(angle)), np.mean(np.cos(angle)))
+            ret['phase_ms'] = np.mod(mean_angle, 2 * np.pi) / (2 * np.pi) * period_ms
+        return ret
+
+### StreamingLteuPhaseDetector ###
+class StreamingLteuPhaseDetector():
+    def __init__(self, detector=None, window_s=5.0, refresh_s=0.5):
+        # estimates over the last window_s seconds, refreshed every refresh_s seconds of data
+        self.detector = detector if detector is not None else LteuPhaseDetector()
+        self.window_ns = int(window_s * 1e9)
+        self.refresh_ns = int(refresh_s * 1e9)
+        self.ktime = np.zeros(0, dtype=np.uint64)
+        self.intf_ratio = np.zeros(0)
+        self.last_estimate_ktime = None
+        # phases are reported relative to the first sample ever seen
+        self.t_ref = None
+        self.estimate = None
+
+    def update(self, regmon_block):
+        # consume one decoded block, returns the refreshed estimate or None
+        if regmon_block.size == 0:
+            return None
+        self.ktime = np.concatenate((self.ktime, regmon_block['ktime']))
+        self.intf_ratio = np.concatenate((self.intf_ratio, self.detector.get_intf_ratio(regmon_block)))
+
+        # drop samples which left the window; ktime may step backwards, the window is searched
+        # in its running maximum
+        ktime_max = np.maximum.accumulate(self.ktime)
+        t_end = int(ktime_max[-1])
+        first = np.searchsorted(ktime_max, np.uint64(max(t_end - self.window_ns, 0)))
+        self.ktime = self.ktime[first:]
+        self.intf_ratio = self.intf_ratio[first:]
+
+        if self.last_estimate_ktime is None:
+            self.last_estimate_ktime = int(self.ktime[0])
+            self.t_ref = int(self.ktime[0])
+        if t_end - self.last_estimate_ktime < self.refresh_ns:
+            return None
+        self.last_estimate_ktime = t_end
+
+        # the detector only needs ktime, d_others & d_mac
+        dat = np.zeros(self.ktime.size, dtype=[('ktime', np.uint64), ('d_others', np.float64),
+                                                ('d_mac', np.float64)])
+        dat['ktime'] = self.ktime
+        dat['d_others'] = self.intf_ratio
+        dat['d_mac'] = 1.0
+        self.estimate = self.detector.estimate(dat, t_ref=self.t_ref)
+        return self.estimate
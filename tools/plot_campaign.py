@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+This is a batch export of the RegMon MAC state plots (see RegMon.plot_data) of
+all measurement folders of one or more campaigns. The plots are rendered
+headless in parallel worker processes, one PNG or SVG file per run into a
+separate output folder; the measurement folders are never written to.
+
+Usage:
+    python3 plot_campaign.py ../traces/wiplus_dl_lte-fb_20161223/
+    python3 plot_campaign.py ../traces --out-dir plots --format svg -j 4
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import argparse
+import functools
+
+from lteu_wifi.parser import RegMon, Config
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+
+def plot_run(directory, out_dir, fmt='png', width_px=2000, height_px=400, use_cache=True):
+    # renders the RegMon plot of a single measurement folder to <out_dir>/<folder name>.<fmt>
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    regmon = RegMon(cache=TraceCache(enabled=use_cache))
+    regmon_dat = regmon.load_decoded(os.path.join(directory, config_data['regmon']['result_file']))
+
+    fn = os.path.join(out_dir, os.path.basename(os.path.normpath(directory)) + '.' + fmt)
+    regmon.plot_data(regmon_dat, fn=fn, width_px=width_px, height_px=height_px,
+                     title='RegMon MAC State Distribution - %s' % config_data['common']['meas_name'])
+    return {'directory': directory, 'plot_file': fn, 'num_samples': regmon_dat.size}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Export of the RegMon plots of whole campaigns')
+    arg_parser.add_argument('roots', nargs='+', help='campaign folders')
+    arg_parser.add_argument('--out-dir', default='plots', help='one plot file per run')
+    arg_parser.add_argument('--format', default='png', choices=['png', 'svg', 'pdf'])
+    arg_parser.add_argument('--width', type=int, default=2000, help='plot width, pixels (= time bins)')
+    arg_parser.add_argument('--height', type=int, default=400, help='plot height, pixels')
+    arg_parser.add_argument('--no-cache', action='store_true', help='do not use the decoded trace cache')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default: all cores')
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    worker = functools.partial(plot_run, out_dir=args.out_dir, fmt=args.format, width_px=args.width,
+                               height_px=args.height, use_cache=not args.no_cache)
+    results, failures = run_campaign(args.roots, worker, processes=args.processes)
+    print_failures(failures)
+    for res in results:
+        print('%s (%d samples)' % (res['plot_file'], res['num_samples']))
+    print('%d plots written, %d failed' % (len(results), len(failures)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+This is the instrumentation of the analysis pipeline: per stage wall times of a
+run (config parse, gunzip+unpickle, decode, detect, ...), a JSON/CSV report of
+the per run timings, data quality counters & failures of a campaign and an
+optional cProfile dump per run.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import csv
+import json
+import time
+import cProfile
+import contextlib
+
+class StageTimer():
+    # accumulates the wall time per stage name; stages may be nested and entered several
+    # times, e.g. once per chunk when streaming
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        t_start = time.perf_counter()
+        try:
+            yield
+        except Exception as ex:
+            # innermost stage an error came from, see campaign._run_worker
+            if not hasattr(ex, 'stage'):
+                try:
+                    ex.stage = name
+                except AttributeError:
+                    pass
+            raise
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - t_start
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def reset(self):
+        self.timings = {}
+        self.counts = {}
+
+class ProfiledWorker():
+    # wraps a campaign worker, each run is executed under cProfile and the stats are written to
+    # <profile_dir>/<folder name>.prof (view e.g. with python3 -m pstats or snakeviz)
+    def __init__(self, worker, profile_dir):
+        self.worker = worker
+        self.profile_dir = profile_dir
+
+    def __call__(self, directory):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(self.worker, directory)
+        finally:
+            name = os.path.basename(os.path.normpath(directory))
+            profiler.dump_stats(os.path.join(self.profile_dir, name + '.prof'))
+
+def _flatten(record, prefix=''):
+    # nested dicts to a flat dict with dotted keys
+    ret = {}
+    for key, val in record.items():
+        if isinstance(val, dict):
+            ret.update(_flatten(val, prefix + key + '.'))
+        else:
+            ret[prefix + key] = val
+    return ret
+
+def get_report(results, failures):
+    # one record per run: the worker results (status ok) & failures (status failed)
+    report = [dict(res, status='ok') for res in results]
+    report += [dict(failure, status='failed') for failure in failures]
+    return sorted(report, key=lambda rec: rec.get('directory', ''))
+
+def write_report(fn, results, failures):
+    # JSON or CSV (by file extension) report of a campaign run; in CSV nested dicts like the
+    # timings become columns (timings.decode, ...) and the tracebacks are left out
+    report = get_report(results, failures)
+    if fn.endswith('.csv'):
+        rows = [_flatten(rec) for rec in report]
+        for row in rows:
+            row.pop('traceback', None)
+        columns = []
+        for row in rows:
+            columns += [col for col in row if col not in columns]
+        with open(fn, 'w', newline='') as fo:
+            writer = csv.DictWriter(fo, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(fn, 'w') as fo:
+            json.dump(report, fo, indent=4, default=float)
+    print('Report written to %s (%d runs, %d failed)' % (fn, len(results), len(failures)))
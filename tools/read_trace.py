@@ -4,67 +4,69 @@ This example script reads recorded data.
 
 @author: Olbrich, Zubow (TU Berlin)
 """
-import re
-import json
-import gzip
-import pickle
 import os
-import numpy as np
-import pickle
-import pprint
-import matplotlib
-import matplotlib.pyplot as plt
-from parser import Iperf3, RegMon, Config
+import sys
+import logging
+from lteu_wifi.parser import Iperf3, RegMon, Config, format_run_param
+from lteu_wifi.trace_cache import TraceCache, sum_stats
+from lteu_wifi.campaign import run_campaign, print_failures
 
-# base folder
+# base folder, can be overridden by the command line
 base_dir = '../traces/wiplus_dl_lte-fb_20161223/'
+# keep decoded traces in the on-disk cache
+USE_CACHE = True
+# number of worker processes; the output of parallel workers is interleaved
+NUM_PROCESSES = 1
 
-# walk through all trace files
-for x in os.walk(base_dir):
-    # strep through each measurement
-    directory = x[0]
+def read_run(directory):
+    # step through one measurement
     print('Parsing folder %s' % directory)
+    cache = TraceCache(enabled=USE_CACHE)
 
-    try:
-        # Config
-        print('Loading RegMon data...')
-        fname = os.path.join(directory, 'config.json')
-        cfg = Config()
-        config_data = cfg.load_config(fname)
-        meta_data = cfg.get_meta_data_from_fname(config_data['common']['meas_name'])
-        cfg.print(config_data)
-        cfg.print(meta_data)
+    # Config
+    print('Loading RegMon data...')
+    fname = os.path.join(directory, 'config.json')
+    cfg = Config()
+    config_data = cfg.load_config(fname)
+    meta_data = cfg.get_meta_data_from_fname(config_data['common']['meas_name'])
+    cfg.print(config_data)
+    cfg.print(meta_data)
 
-        lte_u_dc = None
-        lte_u_tx_pwr = None
-        for item in meta_data['lteu']:
-            if item.startswith('duty'):
-                re_match = re.search(r'[^a-z][\d]',item)
-                lte_u_dc = float(re_match.group()) / 100.0
-            if item.endswith('dbm'):
-                lte_u_tx_pwr = int(re.search(r'-?[\d]*',item).group())
+    run_params = cfg.get_run_params(config_data)
+    lte_u_dc = run_params['lteu_duty_cycle']
+    lte_u_tx_pwr = run_params['lteu_tx_pwr']
 
-        print('Configured LTE-U duty cycle: %f' % lte_u_dc)
+    print('Configured LTE-U duty cycle: %s' % format_run_param(lte_u_dc, '%f'))
 
-        # RegMon
-        print('Loading RegMon data...')
-        fname = os.path.join(directory, config_data['regmon']['result_file'])
-        regmon = RegMon()
-        regmon_rawdat = regmon.load_data(fname)
-        regmon_dat = regmon.decode_regmon_data(regmon_rawdat)
-        regmon.show_timing_info(regmon_dat)
-        #regmon.plot_data(regmon_dat)
+    # RegMon
+    print('Loading RegMon data...')
+    fname = os.path.join(directory, config_data['regmon']['result_file'])
+    regmon = RegMon(cache=cache)
+    regmon_dat = regmon.load_decoded(fname)
+    regmon.show_timing_info(regmon_dat)
+    #regmon.plot_data(regmon_dat)
 
-        # Iperf
-        print('Loading iperf data...')
-        fname = os.path.join(directory, config_data['iperf3']['result_file'])
-        iperf = Iperf3()
-        iperf_rawdat = iperf.load_data(fname)
-        iperf3_dat = iperf.decode_iperf3_data(iperf_rawdat)
-        iperf.show_timing_info(iperf3_dat)
-        norm_tx_thr = iperf.get_normalized_tx_thr(iperf3_dat, 29.0)
-        real_airtime = norm_tx_thr
+    # Iperf
+    print('Loading iperf data...')
+    fname = os.path.join(directory, config_data['iperf3']['result_file'])
+    iperf = Iperf3(cache=cache)
+    iperf3_dat = iperf.load_decoded(fname)
+    iperf.show_timing_info(iperf3_dat)
+    norm_tx_thr = iperf.get_normalized_tx_thr(iperf3_dat, 29.0)
+    real_airtime = norm_tx_thr
 
-    except Exception as ex:
-        print('Failed to parse %s, %s' % (directory, str(ex)))
-        pass
+    return cache.stats
+
+def main():
+    # show the progress messages of the decoders
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    base_dirs = sys.argv[1:] if len(sys.argv) > 1 else base_dir
+
+    # walk through all trace files
+    results, failures = run_campaign(base_dirs, read_run, processes=NUM_PROCESSES)
+    print_failures(failures)
+
+    print('Trace cache: %s' % sum_stats(results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+# -*- coding: utf-8 -*-
+"""
+This is a replay of recorded measurement folders as live feeds. The RegMon lines
+of a folder (and optionally its iperf3 intervals) are written to a local UNIX
+stream socket, a UDP socket, a pipe or stdout following the original ktime
+spacing, in real time, accelerated (e.g. 10x, 100x) or as fast as possible.
+
+Many folders (and copies of them) are replayed concurrently, one stream per
+simulated AP, by a single scheduler loop. A stream is never blocked by a slow
+consumer: unsent data is kept per AP and no further lines are read for it until
+it is sent, i.e. the AP falls behind its schedule. Copies of a folder share its
+loaded lines and run at most MAX_CHUNKS_AHEAD chunks ahead of the slowest copy.
+Achieved rate & lag behind the schedule are reported per AP, which shows how far
+a consumer scales.
+
+Targets (the AP name replaces {ap}, e.g. unix:/tmp/regmon_{ap}.sock):
+    unix:PATH         connect to a UNIX stream socket, e.g. online_ed_detector.py --unix
+    udp:HOST:PORT     one datagram per batch of lines
+    pipe:PATH         write to a named pipe or file
+    -                 stdout
+    null              discard, i.e. measure the replay itself
+
+Usage:
+    python3 replay.py ../traces/wiplus_dl_lte-fb_20161223/<run> --target unix:/tmp/regmon.sock
+    python3 replay.py ../traces --target udp:127.0.0.1:9000 --tag --copies 10 --speedup 10
+    python3 replay.py ../traces --target null --speedup max --report replay.json
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sys
+import time
+import errno
+import socket
+import argparse
+import numpy as np
+
+from lteu_wifi.parser import RegMon, Iperf3, Config
+from lteu_wifi.campaign import find_measurement_dirs
+from lteu_wifi.profiling import write_report
+
+# lines sent per AP and scheduler round when replaying as fast as possible
+MAX_BATCH_LINES = 1024
+# max. payload of a UDP datagram, batches are split into datagrams of complete lines
+MAX_DATAGRAM = 60000
+# scheduler round if nothing is due earlier, s
+TICK_S = 0.001
+# lag of a stream (s) above which it counts as behind schedule in the progress report
+BEHIND_LAG_S = 0.1
+# chunks of a trace kept loaded for its copies, i.e. how far the fastest copy may run ahead of
+# the slowest one; a copy at the limit waits, so a stalled consumer eventually holds back the
+# other copies of its trace (but not other traces)
+MAX_CHUNKS_AHEAD = 16
+
+### targets ###
+class StreamTarget():
+    # non-blocking UNIX stream socket or file descriptor (pipe, file, stdout)
+    def __init__(self, sock=None, fd=None):
+        self.sock = sock
+        self.fd = fd
+        if sock is not None:
+            sock.setblocking(False)
+        elif not os.isatty(fd):
+            os.set_blocking(fd, False)
+        self.dropped = 0
+        # the consumer went away, nothing is written anymore
+        self.closed = False
+
+    def write(self, data):
+        # bytes of data written, the rest has to be written again later
+        try:
+            if self.sock is not None:
+                return self.sock.send(data)
+            return os.write(self.fd, data)
+        except (BlockingIOError, InterruptedError):
+            return 0
+        except (BrokenPipeError, ConnectionResetError):
+            self.closed = True
+            self.dropped += data.count(b'\n')
+            return len(data)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        elif self.fd > 2:
+            os.close(self.fd)
+
+class UdpTarget():
+    # datagrams of complete lines; datagrams the socket can't take are dropped & counted
+    def __init__(self, host, port):
+        self.addr = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.dropped = 0
+        self.closed = False
+
+    def write(self, data):
+        start = 0
+        while start < len(data):
+            end = len(data) if len(data) - start <= MAX_DATAGRAM else data.rfind(b'\n', start, start + MAX_DATAGRAM) + 1
+            if end <= start:
+                end = start + MAX_DATAGRAM
+            try:
+                self.sock.sendto(data[start:end], self.addr)
+            except (BlockingIOError, InterruptedError):
+                self.dropped += data.count(b'\n', start, end)
+            except OSError as ex:
+                # e.g. no receiver bound to the port yet
+                if ex.errno != errno.ECONNREFUSED:
+                    raise
+                self.dropped += data.count(b'\n', start, end)
+            start = end
+        return len(data)
+
+    def close(self):
+        self.sock.close()
+
+class NullTarget():
+    def __init__(self):
+        self.dropped = 0
+        self.closed = False
+
+    def write(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+def open_target(spec, ap_name):
+    # target of a stream from its spec (see module docstring), {ap} is replaced by the AP name
+    spec = spec.replace('{ap}', ap_name)
+    if spec == 'null':
+        return NullTarget()
+    if spec == '-':
+        return StreamTarget(fd=sys.stdout.fileno())
+    kind, sep, addr = spec.partition(':')
+    if kind == 'unix' and addr:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(addr)
+        return StreamTarget(sock=sock)
+    if kind == 'udp' and addr:
+        host, sep, port = addr.rpartition(':')
+        return UdpTarget(host or '127.0.0.1', int(port))
+    if kind == 'pipe' and addr:
+        return StreamTarget(fd=os.open(addr, os.O_WRONLY | os.O_CREAT | os.O_APPEND))
+    raise ValueError('Unknown replay target: %s' % spec)
+
+### TraceChunks ###
+class TraceChunks():
+    # chunks of one trace with the ktime of their lines relative to ktime_base, ns; loaded once
+    # and shared by the num_readers copies of the trace, a chunk is dropped once all took it or
+    # stopped reading (see release); at most MAX_CHUNKS_AHEAD chunks are loaded at a time
+    def __init__(self, chunks, get_ktime, ktime_base, num_readers=1):
+        self.chunks = chunks
+        self.get_ktime = get_ktime
+        self.ktime_base = ktime_base
+        self.num_readers = num_readers
+        self.loaded = {}
+        self.num_loaded = 0
+        self.end = False
+
+    def _load_next(self):
+        for chunk in self.chunks:
+            chunk = [line for line in chunk if line]
+            if not chunk:
+                continue
+            ktime = self.get_ktime(chunk).astype(np.int64) - self.ktime_base
+            # encoded lines & their offsets in the buffer
+            buf = ('\n'.join(chunk) + '\n').encode('ascii')
+            offsets = np.concatenate(([0], np.cumsum(np.fromiter(map(len, chunk), dtype=np.int64,
+                                                                count=len(chunk)) + 1)))
+            self.loaded[self.num_loaded] = [chunk, ktime, buf, offsets, self.num_readers]
+            self.num_loaded += 1
+            return
+        self.end = True
+
+    def is_available(self, index):
+        # False while the index-th chunk can't be loaded before slower readers took older ones
+        return index < self.num_loaded or self.end or len(self.loaded) < MAX_CHUNKS_AHEAD
+
+    def get(self, index):
+        # (lines, ktime, buffer, offsets) of the index-th non-empty chunk, None at the end
+        if index >= self.num_loaded and not self.end:
+            self._load_next()
+        if index >= self.num_loaded:
+            return None
+        entry = self.loaded[index]
+        entry[4] -= 1
+        if entry[4] == 0:
+            del self.loaded[index]
+        return entry[:4]
+
+    def release(self, index):
+        # a reader that took the chunks before index stops reading, drops its share of the rest
+        self.num_readers -= 1
+        for i in [i for i in self.loaded if i >= index]:
+            self.loaded[i][4] -= 1
+            if self.loaded[i][4] == 0:
+                del self.loaded[i]
+
+### ReplayStream ###
+class ReplayStream():
+    # lines of one trace (see TraceChunks) with their scheduled send time (s after the start
+    # of the replay), optionally prefixed, e.g. by the AP name
+    def __init__(self, name, trace, speedup, target, prefix=b''):
+        self.name = name
+        self.trace = trace
+        self.speedup = speedup
+        self.target = target
+        self.prefix = prefix
+        # current chunk as one encoded buffer, the offsets of its lines & their schedule
+        self.chunk_index = 0
+        self.buf = b''
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.sched = np.zeros(0)
+        self.pos = 0
+        self.pending = b''
+        self.done = False
+        self.released = False
+        # stats: lines & bytes sent, lag behind the schedule of the sent batches, s
+        self.num_lines = 0
+        self.num_bytes = 0
+        self.lags = []
+        self.lag_max = 0.0
+        self.t_first = None
+        self.t_last = None
+
+    def _next_chunk(self):
+        # takes the next chunk of the trace, returns False at the end of the trace
+        entry = self.trace.get(self.chunk_index)
+        if entry is None:
+            return False
+        self.chunk_index += 1
+        lines, ktime, self.buf, self.offsets = entry
+        if self.prefix:
+            prefix = self.prefix.decode('ascii')
+            self.buf = (prefix + ('\n' + prefix).join(lines) + '\n').encode('ascii')
+            self.offsets = self.offsets + np.arange(self.offsets.size) * len(prefix)
+        # lines stepping back in ktime are sent right after their predecessor
+        self.sched = np.maximum.accumulate(np.maximum(ktime, 0)) / 1e9 / self.speedup
+        self.pos = 0
+        return True
+
+    def get_next_time(self):
+        # scheduled time of the next unsent line, None at the end of the trace & inf while the
+        # next chunk isn't available yet
+        if self.pos >= self.sched.size and not self.done:
+            if not self.trace.is_available(self.chunk_index):
+                return np.inf
+            self.done = not self._next_chunk()
+        if self.done:
+            return None
+        return self.sched[self.pos]
+
+    def step(self, now, max_lines=None):
+        # sends the lines due at now (at most max_lines), returns the number of lines taken
+        if self.pending:
+            self._write(now)
+            if self.pending:
+                # the consumer didn't take the last batch yet
+                return 0
+        t_next = self.get_next_time()
+        if t_next is None or t_next > now:
+            return 0
+        end = int(np.searchsorted(self.sched, now, side='right'))
+        if max_lines is not None:
+            end = min(end, self.pos + max_lines)
+        data = self.buf[self.offsets[self.pos]:self.offsets[end]]
+        num = end - self.pos
+        if np.isfinite(self.speedup):
+            lag = now - t_next
+            self.lags.append(lag)
+            self.lag_max = max(self.lag_max, lag)
+        self.pos = end
+        self.num_lines += num
+        self.pending += data
+        self._write(now)
+        return num
+
+    def _write(self, now):
+        sent = self.target.write(self.pending)
+        if sent:
+            if self.t_first is None:
+                self.t_first = now
+            self.t_last = now
+            self.num_bytes += sent
+            self.pending = self.pending[sent:]
+
+    def is_finished(self):
+        return self.target.closed or (self.get_next_time() is None and not self.pending)
+
+    def release(self):
+        # stops reading the trace, e.g. when the consumer went away
+        if not self.released:
+            self.released = True
+            self.trace.release(self.chunk_index)
+
+    def get_lag(self):
+        # lag of the most recent batch, s
+        return self.lags[-1] if self.lags else np.nan
+
+    def get_stats(self, elapsed):
+        lags = np.array(self.lags) if self.lags else np.full(1, np.nan)
+        return {
+            'ap': self.name,
+            'lines': self.num_lines,
+            'bytes': self.num_bytes,
+            'dropped': self.target.dropped,
+            'rate': self.num_lines / elapsed if elapsed > 0 else np.nan,
+            'lag_mean': float(np.mean(lags)),
+            'lag_p99': float(np.percentile(lags, 99)),
+            'lag_max': self.lag_max if self.lags else np.nan,
+        }
+
+### ReplayScheduler ###
+class ReplayScheduler():
+    # replays several streams concurrently in a single loop; speedup=inf sends as fast as possible
+    def __init__(self, streams, speedup=1.0, report_interval=1.0, out=sys.stderr):
+        self.streams = streams
+        self.speedup = speedup
+        self.report_interval = report_interval
+        self.out = out
+        self.elapsed = 0.0
+
+    def run(self):
+        # the first chunks are loaded before the clock starts
+        for stream in self.streams:
+            stream.get_next_time()
+        t_start = time.perf_counter()
+        active = list(self.streams)
+        t_report = self.report_interval
+        num_reported = 0
+        try:
+            while active:
+                now = time.perf_counter() - t_start
+                max_lines = None if np.isfinite(self.speedup) else MAX_BATCH_LINES
+                num_sent = sum(stream.step(now, max_lines) for stream in active)
+                for stream in active:
+                    if stream.is_finished():
+                        stream.release()
+                active = [stream for stream in active if not stream.released]
+
+                if self.report_interval and now >= t_report:
+                    num_lines = sum(stream.num_lines for stream in self.streams)
+                    self.print_progress(now, (num_lines - num_reported) / (now - t_report + self.report_interval))
+                    num_reported = num_lines
+                    t_report = now + self.report_interval
+
+                if np.isfinite(self.speedup) and active:
+                    # sleep until the next line is due
+                    t_next = min((t for t in (s.get_next_time() for s in active) if t is not None), default=now)
+                    if any(stream.pending for stream in active) or not np.isfinite(t_next):
+                        t_next = min(t_next, now + TICK_S)
+                    delay = t_next - (time.perf_counter() - t_start)
+                    if delay > 0:
+                        time.sleep(min(delay, self.report_interval or delay))
+                elif num_sent == 0 and active:
+                    # all streams wait for their consumer
+                    time.sleep(TICK_S)
+        finally:
+            self.elapsed = time.perf_counter() - t_start
+            for stream in self.streams:
+                stream.release()
+                stream.target.close()
+        return self.get_stats()
+
+    def print_progress(self, now, rate):
+        lags = np.array([stream.get_lag() for stream in self.streams])
+        lags = lags[~np.isnan(lags)]
+        if lags.size:
+            lag = 'lag mean %.1f ms, max %.1f ms, %d/%d APs behind' % (
+                np.mean(lags) * 1e3, np.max(lags) * 1e3, np.count_nonzero(lags > BEHIND_LAG_S), len(self.streams))
+        else:
+            lag = '%d APs' % len(self.streams)
+        print('%.1f s: %.0f lines/s, %s' % (now, rate, lag), file=self.out)
+        self.out.flush()
+
+    def get_stats(self):
+        return [stream.get_stats(self.elapsed) for stream in self.streams]
+
+### replay of measurement folders ###
+def get_ktime_start(regmon, fn):
+    # ktime of the first RegMon line of a trace
+    for chunk in regmon.load_data_iter(fn):
+        chunk = [line for line in chunk if line]
+        if chunk:
+            return int(regmon.get_regmon_fields_array(chunk[:1], columns=(0,))[0, 0])
+    raise ValueError('No RegMon data in %s' % fn)
+
+def create_streams(directory, target, speedup, copies=1, iperf_target=None, tag=False):
+    # replay streams (RegMon & optionally iperf3) of the copies of one measurement folder
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    regmon = RegMon()
+    regmon_fn = os.path.join(directory, config_data['regmon']['result_file'])
+    ktime_base = get_ktime_start(regmon, regmon_fn)
+    get_ktime = lambda chunk: regmon.get_regmon_fields_array(chunk, columns=(0,))[:, 0]
+    regmon_trace = TraceChunks(regmon.load_data_iter(regmon_fn), get_ktime, ktime_base, copies)
+
+    iperf_trace = None
+    if iperf_target is not None:
+        iperf3_dat = Iperf3().load_decoded(os.path.join(directory, config_data['iperf3']['result_file']))
+        # one line per interval: ktime, rx & tx throughput (Mbps)
+        iperf_lines = ['%d %f %f' % row for row in iperf3_dat[['ktime', 'rx_thrpt', 'tx_thrpt']].tolist()]
+        iperf_trace = TraceChunks(iter([iperf_lines]), lambda chunk: iperf3_dat['ktime'], ktime_base, copies)
+
+    streams = []
+    base_name = os.path.basename(os.path.normpath(directory))
+    for copy in range(copies):
+        name = base_name if copies == 1 else '%s#%d' % (base_name, copy)
+        prefix = (name + ' ').encode('ascii') if tag else b''
+        streams.append(ReplayStream(name, regmon_trace, speedup, open_target(target, name), prefix))
+        if iperf_trace is not None:
+            streams.append(ReplayStream(name + '/iperf3', iperf_trace, speedup, open_target(iperf_target, name),
+                                        prefix))
+    return streams
+
+def parse_speedup(value):
+    # speed-up factor, 'max' replays as fast as possible
+    if value == 'max':
+        return np.inf
+    speedup = float(value)
+    if not speedup > 0:
+        raise argparse.ArgumentTypeError('speed-up must be > 0 or max')
+    return speedup
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Replay of recorded RegMon traces as live feeds')
+    arg_parser.add_argument('roots', nargs='+', help='measurement or campaign folders')
+    arg_parser.add_argument('--target', default='-', help='RegMon target, see above; default: stdout')
+    arg_parser.add_argument('--iperf-target', help='also replay the iperf3 intervals to this target')
+    arg_parser.add_argument('--speedup', type=parse_speedup, default=1.0, help='e.g. 1, 10, 100 or max')
+    arg_parser.add_argument('--copies', type=int, default=1, help='simulated APs per measurement folder')
+    arg_parser.add_argument('--tag', action='store_true', help='prefix each line with the AP name, e.g. for UDP')
+    arg_parser.add_argument('--report-interval', type=float, default=1.0, help='progress report interval, s')
+    arg_parser.add_argument('--report', help='per AP rate & lag as .json or .csv')
+    args = arg_parser.parse_args()
+
+    dirs = find_measurement_dirs(args.roots)
+    if not dirs:
+        print('No measurement folders found')
+        return
+    streams = []
+    for directory in dirs:
+        streams += create_streams(directory, args.target, args.speedup, args.copies, args.iperf_target, args.tag)
+    # progress reports go to stderr, stdout may be the target
+    print('Replaying %d streams of %d folders at %sx' % (len(streams), len(dirs), args.speedup), file=sys.stderr)
+
+    scheduler = ReplayScheduler(streams, args.speedup, args.report_interval)
+    try:
+        stats = scheduler.run()
+    except KeyboardInterrupt:
+        stats = scheduler.get_stats()
+    if args.report:
+        write_report(args.report, stats, [])
+
+    num_lines = sum(s['lines'] for s in stats)
+    lag_max = np.nanmax([s['lag_max'] for s in stats]) if np.isfinite(args.speedup) else np.nan
+    print('Sent %d lines in %.2f s (%.0f lines/s), %d dropped, max. lag %.1f ms' % (
+        num_lines, scheduler.elapsed, num_lines / max(scheduler.elapsed, 1e-9),
+        sum(s['dropped'] for s in stats), lag_max * 1e3), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
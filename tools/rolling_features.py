@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+This is a rolling window feature engine for RegMon series. Mean, variance,
+min/max and the fraction of samples above a threshold of rel_others, rel_idle,
+rel_tx, rel_rx and d_fack are computed for many window sizes at once, time based
+(e.g. 1 ms to 1 s) and sample based, and written into one float32 matrix.
+
+Sums come from prefix sums and min/max from a sparse table, i.e. after one pass
+per series each window size costs O(n). Time windows contain the samples stamped
+within the last window length, sample windows are cut at gaps in the trace; the
+coverage column of each window tells how much of it is covered by samples. A
+backward step of ktime cuts both kinds of windows.
+
+Usage:
+    python3 rolling_features.py ../traces/wiplus_dl_lte-fb_20161223/ --out-dir features
+    python3 rolling_features.py ../traces --windows-ms 1 10 100 1000 --windows-samples 8 64 --step 20 -j 4
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import argparse
+import functools
+import numpy as np
+
+from lteu_wifi.parser import RegMon, Config
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+
+# series & statistics computed by default
+ROLLING_SERIES = ('rel_others', 'rel_idle', 'rel_tx', 'rel_rx', 'd_fack')
+ROLLING_STATS = ('mean', 'var', 'min', 'max', 'frac')
+# frac: fraction of the samples above this value; rel_* in %, e.g. 10% is the default ED threshold
+ROLLING_THRESHOLDS = {'rel_others': 10.0, 'rel_idle': 50.0, 'rel_tx': 50.0, 'rel_rx': 50.0, 'd_fack': 0.0}
+DEFAULT_WINDOWS_MS = (1.0, 10.0, 100.0, 1000.0)
+
+def _prefix_sum(x):
+    return np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+
+def get_segment_starts(ktime, gap_factor=3.0):
+    # index of the first sample of the gap free segment each sample belongs to; a segment ends
+    # at a gap, i.e. a step in ktime of more than gap_factor times the median step, and at a
+    # backward step (gap_factor=inf: only there)
+    n = ktime.size
+    if n < 2:
+        return np.zeros(n, dtype=np.int64)
+    dt = np.diff(ktime.astype(np.int64))
+    brk = dt < 0
+    if np.isfinite(gap_factor):
+        brk |= dt > gap_factor * np.median(dt)
+    gap = np.concatenate(([True], brk))
+    return np.maximum.accumulate(np.where(gap, np.arange(n), 0))
+
+def get_monotonic_ktime(ktime):
+    # ktime (int64) with each backward step turned into a zero step by shifting the samples
+    # after it, i.e. sorted & with the original spacing within the monotonic segments
+    dt = np.diff(ktime.astype(np.int64))
+    return ktime.astype(np.int64) + np.concatenate(([0], np.cumsum(np.maximum(-dt, 0))))
+
+def _sparse_table(x, max_len, op):
+    # levels[j][i] = op over x[i:i + 2 ** j], for 2 ** j <= max_len
+    levels = [x]
+    k = 1
+    while 2 * k <= max_len:
+        prev = levels[-1]
+        levels.append(op(prev[:-k], prev[k:]))
+        k *= 2
+    return levels
+
+def _range_reduce(levels, lo, hi, op):
+    # op over x[lo:hi + 1] for each pair of indices (hi >= lo) in O(1), as the overlap of the
+    # two power of two ranges starting at lo & ending at hi
+    level = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+    if lo.size == 0:
+        return np.zeros(0, dtype=levels[0].dtype)
+    j_min, j_max = int(level.min()), int(level.max())
+    if j_min == j_max:
+        # e.g. all windows of the same length
+        return op(levels[j_min][lo], levels[j_min][hi - (1 << j_min) + 1])
+    ret = np.empty(lo.size, dtype=levels[0].dtype)
+    for j in range(j_min, j_max + 1):
+        sel = level == j
+        ret[sel] = op(levels[j][lo[sel]], levels[j][hi[sel] - (1 << j) + 1])
+    return ret
+
+### RollingFeatureEngine ###
+class RollingFeatureEngine():
+    def __init__(self, windows_ms=DEFAULT_WINDOWS_MS, windows_samples=(), series=ROLLING_SERIES,
+                 stats=ROLLING_STATS, thresholds=None, step=1, gap_factor=3.0, chunk_size=1 << 20,
+                 dtype=np.float32):
+        # windows_ms: time based windows, ms; windows_samples: sample based windows; features
+        # are evaluated for the windows ending at every step-th sample. chunk_size bounds the
+        # number of samples the min/max tables are built over at once.
+        self.windows = [('ms', float(w)) for w in windows_ms] + [('samples', int(w)) for w in windows_samples]
+        if not self.windows:
+            raise ValueError('No rolling windows given')
+        self.series = tuple(series)
+        self.stats = tuple(stats)
+        self.thresholds = dict(ROLLING_THRESHOLDS, **(thresholds or {}))
+        self.step = max(int(step), 1)
+        self.gap_factor = gap_factor
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+
+    def get_window_name(self, window):
+        kind, length = window
+        return '%gms' % length if kind == 'ms' else '%dsmp' % length
+
+    def get_columns(self):
+        # one coverage column per window, followed by its <series>_<stat> columns
+        columns = []
+        for window in self.windows:
+            name = self.get_window_name(window)
+            columns.append('coverage_' + name)
+            columns += ['%s_%s_%s' % (series, stat, name) for series in self.series for stat in self.stats]
+        return columns
+
+    def get_window_bounds(self, window, ktime, seg_start, ends, res_ns):
+        # first sample (inclusive) of the windows ending at the samples ends & their coverage;
+        # ktime as of get_monotonic_ktime, seg_start a pair: starts of the gap free & the
+        # monotonic segments (see get_segment_starts)
+        kind, length = window
+        seg_start, mono_start = seg_start
+        if kind == 'ms':
+            t_len = length * 1e6
+            lo = np.searchsorted(ktime, ktime[ends] - np.int64(t_len), side='right')
+            # the first sample of a trace has no predecessor within the window & windows don't
+            # reach back across a backward step
+            lo = np.minimum(np.maximum(lo, mono_start[ends]), ends)
+            coverage = np.minimum((ends - lo + 1) * res_ns / t_len, 1.0)
+        else:
+            lo = np.maximum(ends - length + 1, seg_start[ends])
+            coverage = (ends - lo + 1) / length
+        return lo, coverage
+
+    def compute(self, regmon_dat):
+        # returns ktime of the evaluated samples, the (num_evaluated, num_columns) feature matrix
+        # and the column names, see get_columns()
+        columns = self.get_columns()
+        ktime = np.asarray(regmon_dat['ktime'], dtype=np.uint64)
+        n = ktime.size
+        ends = np.arange(min(self.step, n) - 1, n, self.step) if n else np.zeros(0, dtype=np.int64)
+        # column major, the features are written column by column
+        out = np.full((ends.size, len(columns)), np.nan, dtype=self.dtype, order='F')
+        if n == 0:
+            return ktime[ends], out, columns
+
+        seg_start = get_segment_starts(ktime, self.gap_factor), get_segment_starts(ktime, np.inf)
+        res_ns = float(np.median(np.diff(ktime.astype(np.int64)))) if n > 1 else 0.0
+        ktime_mono = get_monotonic_ktime(ktime)
+        bounds = [self.get_window_bounds(window, ktime_mono, seg_start, ends, res_ns) for window in self.windows]
+        num_stats = len(self.series) * len(self.stats)
+        for w, (lo, coverage) in enumerate(bounds):
+            out[:, w * (num_stats + 1)] = coverage
+
+        for s, name in enumerate(self.series):
+            x = np.asarray(regmon_dat[name], dtype=np.float64)
+            valid = ~np.isnan(x)
+            # shifted by the mean for a numerically stable variance from the prefix sums
+            shift = np.mean(x[valid]) if np.any(valid) else 0.0
+            xs = np.where(valid, x - shift, 0.0)
+            cum_cnt = _prefix_sum(valid)
+            cum_x = _prefix_sum(xs)
+            cum_x2 = _prefix_sum(xs ** 2)
+            cum_above = _prefix_sum(valid & (x > self.thresholds.get(name, 0.0)))
+            x_min = np.where(valid, x, np.inf)
+            x_max = np.where(valid, x, -np.inf)
+
+            for w, (lo, coverage) in enumerate(bounds):
+                base = w * (num_stats + 1) + 1 + s * len(self.stats)
+                hi = ends + 1
+                cnt = cum_cnt[hi] - cum_cnt[lo]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    mean = (cum_x[hi] - cum_x[lo]) / cnt
+                    feats = {
+                        'mean': mean + shift,
+                        'var': np.maximum((cum_x2[hi] - cum_x2[lo]) / cnt - mean ** 2, 0.0),
+                        'frac': (cum_above[hi] - cum_above[lo]) / cnt,
+                    }
+                for i, stat in enumerate(self.stats):
+                    if stat in feats:
+                        out[:, base + i] = feats[stat]
+
+            if 'min' in self.stats or 'max' in self.stats:
+                self._fill_min_max(out, bounds, ends, x_min, x_max, s, num_stats)
+        return ktime[ends], out, columns
+
+    def _fill_min_max(self, out, bounds, ends, x_min, x_max, s, num_stats):
+        # the sparse tables are built chunk by chunk over the samples covered by the windows
+        # ending in the chunk, up to the longest window within the chunk
+        for c_start in range(0, ends.size, max(self.chunk_size // self.step, 1)):
+            c_end = min(c_start + max(self.chunk_size // self.step, 1), ends.size)
+            first = min(int(lo[c_start]) for lo, coverage in bounds)
+            last = int(ends[c_end - 1])
+            max_len = max(int(np.max(ends[c_start:c_end] - lo[c_start:c_end])) + 1 for lo, coverage in bounds)
+            tables = {}
+            if 'min' in self.stats:
+                tables['min'] = (_sparse_table(x_min[first:last + 1], max_len, np.minimum), np.minimum)
+            if 'max' in self.stats:
+                tables['max'] = (_sparse_table(x_max[first:last + 1], max_len, np.maximum), np.maximum)
+            for w, (lo, coverage) in enumerate(bounds):
+                base = w * (num_stats + 1) + 1 + s * len(self.stats)
+                for stat, (levels, op) in tables.items():
+                    res = _range_reduce(levels, lo[c_start:c_end] - first, ends[c_start:c_end] - first, op)
+                    # windows without valid samples
+                    res[np.isinf(res)] = np.nan
+                    out[c_start:c_end, base + self.stats.index(stat)] = res
+
+### rolling features of whole campaigns ###
+def features_run(directory, out_dir, engine, use_cache=True):
+    # writes the rolling features of a single measurement folder to <out_dir>/<folder name>.npz
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    regmon = RegMon(cache=TraceCache(enabled=use_cache))
+    regmon_dat = regmon.load_decoded(os.path.join(directory, config_data['regmon']['result_file']))
+    ktime, features, columns = engine.compute(regmon_dat)
+
+    fn = os.path.join(out_dir, os.path.basename(os.path.normpath(directory)) + '.npz')
+    np.savez(fn, ktime=ktime, features=features, columns=np.array(columns))
+    return {'directory': directory, 'feature_file': fn, 'num_rows': features.shape[0],
+            'num_columns': features.shape[1]}
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Rolling window features of RegMon series')
+    arg_parser.add_argument('roots', nargs='+', help='campaign folders')
+    arg_parser.add_argument('--out-dir', default='features', help='one .npz file per run')
+    arg_parser.add_argument('--windows-ms', type=float, nargs='*', default=list(DEFAULT_WINDOWS_MS),
+                            help='time based windows, ms')
+    arg_parser.add_argument('--windows-samples', type=int, nargs='*', default=[], help='sample based windows')
+    arg_parser.add_argument('--step', type=int, default=1, help='evaluate the windows ending at every step-th sample')
+    arg_parser.add_argument('--no-cache', action='store_true', help='do not use the decoded trace cache')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default: all cores')
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    engine = RollingFeatureEngine(args.windows_ms, args.windows_samples, step=args.step)
+    worker = functools.partial(features_run, out_dir=args.out_dir, engine=engine, use_cache=not args.no_cache)
+    results, failures = run_campaign(args.roots, worker, processes=args.processes)
+    print_failures(failures)
+    for res in results:
+        print('%s (%d x %d)' % (res['feature_file'], res['num_rows'], res['num_columns']))
+
+if __name__ == '__main__':
+    main()
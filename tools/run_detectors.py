@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+This example script runs all registered detectors (see detectors.py) on one or
+more campaigns in a single pass per run and shows their estimates of the eff.
+available airtime side by side with the one measured by iperf, plus the error
+of each detector over all runs.
+
+Usage:
+    python3 run_detectors.py ../traces/wiplus_dl_lte-fb_20161223/
+    python3 run_detectors.py ../traces --detectors ed ed_time phase --streaming -j 4 --report detectors.csv
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import time
+import argparse
+import functools
+import numpy as np
+
+from lteu_wifi.parser import Iperf3, RegMon, Config, format_run_param
+from lteu_wifi.detectors import DETECTORS, DetectorBank
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+from lteu_wifi.profiling import StageTimer, write_report
+
+# max. WiFi throughput (Mbps) without interference, see run_ed_detector.py
+MAX_TX_THROUGHPUT = 29.0
+
+def analyze_run(directory, names=None, max_tx_throughput=MAX_TX_THROUGHPUT, streaming=False, use_cache=True):
+    # estimates of all detectors & the real eff. airtime of a single measurement folder
+    cache = TraceCache(enabled=use_cache)
+    timer = StageTimer()
+    t_start = time.perf_counter()
+    with timer.stage('config'):
+        cfg = Config()
+        config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+        run_params = cfg.get_run_params(config_data)
+
+    fname = os.path.join(directory, config_data['regmon']['result_file'])
+    regmon = RegMon(cache=cache, timer=timer)
+    bank = DetectorBank(names, timer=timer)
+    if streaming:
+        for regmon_block in regmon.decode_regmon_data_iter(regmon.load_data_iter(fname)):
+            bank.update(regmon_block)
+        est_airtime = bank.get_results()
+    else:
+        est_airtime = bank.estimate(regmon.load_decoded(fname))
+
+    iperf = Iperf3(cache=cache, timer=timer)
+    iperf3_dat = iperf.load_decoded(os.path.join(directory, config_data['iperf3']['result_file']))
+    real_airtime = iperf.get_normalized_tx_thr(iperf3_dat, max_tx_throughput)
+    timer.timings['total'] = time.perf_counter() - t_start
+
+    return {
+        'directory': directory,
+        'lte_u_dc': run_params['lteu_duty_cycle'],
+        'lte_u_tx_pwr': run_params['lteu_tx_pwr'],
+        'real_airtime': float(real_airtime),
+        'est_airtime': est_airtime,
+        'timings': timer.timings,
+        'quality': dict(regmon.stats, **iperf.stats),
+    }
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='All registered airtime detectors side by side')
+    arg_parser.add_argument('roots', nargs='+', help='campaign folders')
+    arg_parser.add_argument('--detectors', nargs='+', choices=sorted(DETECTORS), help='default: all')
+    arg_parser.add_argument('--max-thr', type=float, default=MAX_TX_THROUGHPUT,
+                            help='max. WiFi throughput in Mbps for normalization')
+    arg_parser.add_argument('--streaming', action='store_true', help='decode & detect chunk by chunk')
+    arg_parser.add_argument('--no-cache', action='store_true', help='do not use the decoded trace cache')
+    arg_parser.add_argument('--report', help='per run results, timings & failures as .json or .csv')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default: all cores')
+    args = arg_parser.parse_args()
+
+    names = args.detectors or list(DETECTORS)
+    worker = functools.partial(analyze_run, names=names, max_tx_throughput=args.max_thr,
+                               streaming=args.streaming, use_cache=not args.no_cache)
+    results, failures = run_campaign(args.roots, worker, processes=args.processes)
+    print_failures(failures)
+    if args.report:
+        write_report(args.report, results, failures)
+
+    print('LTE-U duty cycle | tx pwr | real eff. airtime | %s' % ' | '.join(names))
+    for res in results:
+        print('%s | %s dBm | %.4f | %s' % (
+            format_run_param(res['lte_u_dc'], '%.2f'), format_run_param(res['lte_u_tx_pwr'], '%d'), res['real_airtime'],
+            ' | '.join('%.4f' % res['est_airtime'][name] for name in names)))
+
+    # runs without valid iperf data can't be compared
+    results = [res for res in results if not np.isnan(res['real_airtime'])]
+    if not results:
+        return
+    real_airtime = np.array([res['real_airtime'] for res in results])
+    print('Errors over %d runs ...' % len(results))
+    print('detector | MAE | RMSE | bias')
+    for name in names:
+        err = np.array([res['est_airtime'][name] for res in results]) - real_airtime
+        print('%s | %.4f | %.4f | %+.4f' % (name, np.nanmean(np.abs(err)), np.sqrt(np.nanmean(err ** 2)),
+                                           np.nanmean(err)))
+
+if __name__ == '__main__':
+    main()
@@ -4,95 +4,170 @@ This example script runs the simple ED detector..
 
 @author: Olbrich, Zubow (TU Berlin)
 """
-import re
-import json
-import gzip
-import pickle
 import os
+import sys
+import time
+import logging
 import numpy as np
-import pickle
-import pprint
-import matplotlib
-import matplotlib.pyplot as plt
 
-from parser import Iperf3, RegMon, Config
-from ed_detector import EdDetector
+from lteu_wifi.parser import Iperf3, RegMon, Config, format_run_param, TimingStats
+from lteu_wifi.ed_detector import EdDetector
+from lteu_wifi.trace_cache import TraceCache, sum_stats
+from lteu_wifi.campaign import run_campaign, print_failures
+from lteu_wifi.profiling import StageTimer, ProfiledWorker, write_report
+from lteu_wifi.bootstrap import get_airtime_intervals, get_period_ms
+from lteu_wifi.validate import load_quarantine
 
 DEBUG = False
-# base folder
+# keep decoded traces in the on-disk cache
+USE_CACHE = True
+# decode RegMon data chunk by chunk instead of loading the whole trace into memory
+STREAMING = False
+# number of worker processes, None: one per core
+NUM_PROCESSES = None
+# progress messages of the decoders & the detector
+VERBOSE = False
+# per run timings, data quality counters & failures as .json or .csv, None: no report
+REPORT_FILE = None
+# folder for a cProfile dump per run, None: no profiling
+PROFILE_DIR = None
+# list of folders to skip as written by validate.py, None: all folders
+QUARANTINE_FILE = None
+# ED detector threshold, see EdDetector
+THRESHOLD = 0.1
+# max. WiFi throughput (Mbps) without interference, used to normalize the iperf throughput
+MAX_TX_THROUGHPUT = 29.0
+# moving-block bootstrap replicates for the confidence intervals of both airtimes, 0: none
+BOOTSTRAP_REPLICATES = 1000
+# base folder, can be overridden by the command line
 base_dir = '../traces/wiplus_dl_lte-fb_20161223/'
 
-print('Running the ED detector ... start')
-
-all_res = []
-pp = pprint.PrettyPrinter(indent=4)
-
-for x in os.walk(base_dir):
-    # strep through each measurement
-    directory = x[0]
+def analyze_run(directory, threshold=THRESHOLD, max_tx_throughput=MAX_TX_THROUGHPUT):
+    # runs the ED detector on a single measurement folder; executed in a worker process
     print('Parsing folder %s' % directory)
+    cache = TraceCache(enabled=USE_CACHE)
+    timer = StageTimer()
+    t_start = time.perf_counter()
 
-    try:
-	##
-        # Config
+    ##
+    # Config
+    if DEBUG:
         print('Loading config data...')
+    with timer.stage('config'):
         fname = os.path.join(directory, 'config.json')
         cfg = Config()
         config_data = cfg.load_config(fname)
-        meta_data = cfg.get_meta_data_from_fname(config_data['common']['meas_name'])
-
-        lte_u_dc = None
-        lte_u_tx_pwr = None
-        for item in meta_data['lteu']:
-            if item.startswith('duty'):
-                re_match = re.search(r'[^a-z][\d]',item)
-                lte_u_dc = float(re_match.group()) / 100.0
-            if item.endswith('dbm'):
-                lte_u_tx_pwr = int(re.search(r'-?[\d]*',item).group())
-
+        run_params = cfg.get_run_params(config_data)
+    lte_u_dc = run_params['lteu_duty_cycle']
+    lte_u_tx_pwr = run_params['lteu_tx_pwr']
+
+    if DEBUG:
+        print('Configured LTE-U duty cycle: %s' % format_run_param(lte_u_dc, '%f'))
+
+    ##
+    # RegMon
+    if DEBUG:
+        print('Loading RegMon data...')
+    fname = os.path.join(directory, config_data['regmon']['result_file'])
+    regmon = RegMon(cache=cache, timer=timer)
+    ed_detector = EdDetector(threshold)
+    # per bin interference flags for the bootstrap
+    in_intf = []
+    if STREAMING:
+        regmon_timing = TimingStats('RegMon')
+        for regmon_block in regmon.decode_regmon_data_iter(regmon.load_data_iter(fname)):
+            with timer.stage('detect'):
+                ed_detector.update(regmon_block)
+                if BOOTSTRAP_REPLICATES:
+                    in_intf.append(ed_detector.get_intf_ratio(regmon_block) > threshold)
+            regmon_timing.update(regmon_block)
         if DEBUG:
-            print('Configured LTE-U duty cycle: %f' % lte_u_dc)
-
-	##
-        # RegMon
-        if DEBUG:
-            print('Loading RegMon data...')
-        fname = os.path.join(directory, config_data['regmon']['result_file'])
-        regmon = RegMon()
-        regmon_rawdat = regmon.load_data(fname)
-        regmon_dat = regmon.decode_regmon_data(regmon_rawdat)
+            regmon_timing.show()
+    else:
+        regmon_dat = regmon.load_decoded(fname)
         if DEBUG:
             regmon.show_timing_info(regmon_dat)
         #regmon.plot_data(regmon_dat)
 
-	##
-        # Iperf
-        if DEBUG:
-            print('Loading iperf data...')
-        fname = os.path.join(directory, config_data['iperf3']['result_file'])
-        iperf = Iperf3()
-        iperf_rawdat = iperf.load_data(fname)
-        iperf3_dat = iperf.decode_iperf3_data(iperf_rawdat)
-        if DEBUG:
-            iperf.show_timing_info(iperf3_dat)
-        norm_tx_thr = iperf.get_normalized_tx_thr(iperf3_dat, 29.0)
-        real_airtime = norm_tx_thr
-
-	##
-        # Simple ED detector
-        ed_detector = EdDetector()
-        est_airtime = ed_detector.estimate_eff_available_airtime_wifi(regmon_dat)
-
-        print('RESULT: LTE-U tx pwr %d, Real vs. estimated airtime (ED detector): %f | %f' % (lte_u_tx_pwr, real_airtime, est_airtime))
-        all_res.append([lte_u_tx_pwr, real_airtime, est_airtime])
-
-    except Exception as ex:
-        print('Failed to parse %s, %s' % (directory, str(ex)))
-        pass
-
-print('Running the ED detector ... stop')
-
-print('Final results for ED detector ...')
-print('LTE-U TX power | real eff. airtime | estimated eff. airtime')
-pp.pprint(all_res)
-
+    ##
+    # Iperf
+    if DEBUG:
+        print('Loading iperf data...')
+    fname = os.path.join(directory, config_data['iperf3']['result_file'])
+    iperf = Iperf3(cache=cache, timer=timer)
+    iperf3_dat = iperf.load_decoded(fname)
+    if DEBUG:
+        iperf.show_timing_info(iperf3_dat)
+    norm_tx_thr = iperf.get_normalized_tx_thr(iperf3_dat, max_tx_throughput)
+    real_airtime = norm_tx_thr
+
+    ##
+    # Simple ED detector
+    with timer.stage('detect'):
+        if STREAMING:
+            est_airtime = ed_detector.get_eff_available_airtime_wifi()
+        else:
+            est_airtime = ed_detector.estimate_eff_available_airtime_wifi(regmon_dat)
+            if BOOTSTRAP_REPLICATES:
+                in_intf.append(ed_detector.get_intf_ratio(regmon_dat) > threshold)
+
+    ##
+    # Confidence intervals
+    est_airtime_ci = real_airtime_ci = (np.nan, np.nan)
+    if BOOTSTRAP_REPLICATES:
+        with timer.stage('bootstrap'):
+            est_airtime_ci, real_airtime_ci = get_airtime_intervals(
+                np.concatenate(in_intf), iperf3_dat['tx_thrpt'] / (1.0 * max_tx_throughput), get_period_ms(run_params),
+                regmon_res_ms=config_data['regmon'].get('sampling_interval', 0.5),
+                iperf_res_ms=config_data['iperf3'].get('sampling_interval', 100.0), num_replicates=BOOTSTRAP_REPLICATES)
+    timer.timings['total'] = time.perf_counter() - t_start
+
+    print('RESULT: LTE-U tx pwr %s, Real vs. estimated airtime (ED detector): %f [%f, %f] | %f [%f, %f]' % (
+        format_run_param(lte_u_tx_pwr, '%d'), real_airtime, real_airtime_ci[0], real_airtime_ci[1], est_airtime,
+        est_airtime_ci[0], est_airtime_ci[1]))
+
+    # only small results are sent back to the main process
+    return {
+        'directory': directory,
+        'lte_u_dc': lte_u_dc,
+        'lte_u_tx_pwr': lte_u_tx_pwr,
+        'real_airtime': float(real_airtime),
+        'est_airtime': float(est_airtime),
+        # confidence intervals (lower, upper), see bootstrap.py
+        'real_airtime_ci': [float(v) for v in real_airtime_ci],
+        'est_airtime_ci': [float(v) for v in est_airtime_ci],
+        'cache_stats': cache.stats,
+        # stage timings in s; load & decode only show up when not served from the cache
+        'timings': timer.timings,
+        'quality': dict(regmon.stats, **iperf.stats),
+    }
+
+def main():
+    import pprint
+
+    logging.basicConfig(level=logging.INFO if VERBOSE else logging.WARNING, format='%(message)s')
+    print('Running the ED detector ... start')
+
+    pp = pprint.PrettyPrinter(indent=4)
+    base_dirs = sys.argv[1:] if len(sys.argv) > 1 else base_dir
+
+    worker = ProfiledWorker(analyze_run, PROFILE_DIR) if PROFILE_DIR else analyze_run
+    skip = load_quarantine(QUARANTINE_FILE) if QUARANTINE_FILE else None
+    results, failures = run_campaign(base_dirs, worker, processes=NUM_PROCESSES, skip=skip)
+
+    print('Running the ED detector ... stop')
+    print_failures(failures)
+    if REPORT_FILE:
+        write_report(REPORT_FILE, results, failures)
+
+    print('Trace cache: %s' % sum_stats([res['cache_stats'] for res in results]))
+
+    all_res = [[res['lte_u_tx_pwr'], res['real_airtime'], res['est_airtime'], res['real_airtime_ci'],
+                res['est_airtime_ci']] for res in results]
+
+    print('Final results for ED detector ...')
+    print('LTE-U TX power | real eff. airtime | estimated eff. airtime | real CI | estimated CI')
+    pp.pprint(all_res)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+This example script runs the LTE-U phase timing detector on all runs of both
+campaigns and compares the estimated CSAT period, ON duration and duty cycle with
+the values configured in the measurement name.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import sys
+import numpy as np
+
+from lteu_wifi.parser import RegMon, Config, format_run_param
+from lteu_wifi.phase_detector import LteuPhaseDetector
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+
+# keep decoded traces in the on-disk cache
+USE_CACHE = True
+# number of worker processes, None: one per core
+NUM_PROCESSES = None
+# campaign folders
+base_dirs = ['../traces/wiplus_dl_lte-fb_20161223/', '../traces/wiplus_dl_lte-vb-rnd9_2016122/']
+
+def analyze_run(directory):
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    run_params = cfg.get_run_params(config_data)
+
+    regmon = RegMon(cache=TraceCache(enabled=USE_CACHE))
+    regmon_dat = regmon.load_decoded(os.path.join(directory, config_data['regmon']['result_file']))
+    est = LteuPhaseDetector().estimate(regmon_dat)
+    on_ms, off_ms = run_params['lteu_on_ms'], run_params['lteu_off_ms']
+
+    return {
+        'directory': directory,
+        'campaign': os.path.basename(os.path.dirname(directory)),
+        'lte_u_tx_pwr': run_params['lteu_tx_pwr'],
+        'cfg_period_ms': on_ms + off_ms if on_ms is not None and off_ms is not None else None,
+        'cfg_on_ms': on_ms,
+        'cfg_duty_cycle': run_params['lteu_duty_cycle'],
+        'est_period_ms': float(est['period_ms']),
+        'est_on_ms': float(est['on_ms']),
+        'est_duty_cycle': float(est['duty_cycle']),
+        'est_phase_ms': float(est['phase_ms']),
+        'num_bursts': int(est['burst_start'].size),
+    }
+
+def main():
+    dirs = sys.argv[1:] if len(sys.argv) > 1 else base_dirs
+
+    print('Running the LTE-U phase detector ... start')
+    results, failures = run_campaign(dirs, analyze_run, processes=NUM_PROCESSES)
+    print('Running the LTE-U phase detector ... stop')
+    print_failures(failures)
+
+    print('Campaign | LTE-U tx pwr | period cfg/est [ms] | ON cfg/est [ms] | duty cfg/est')
+    for res in results:
+        print('%s | %s dBm | %s / %.2f | %s / %.2f | %s / %.2f' % (
+            res['campaign'], format_run_param(res['lte_u_tx_pwr'], '%d'),
+            format_run_param(res['cfg_period_ms'], '%.1f'), res['est_period_ms'],
+            format_run_param(res['cfg_on_ms'], '%.1f'), res['est_on_ms'],
+            format_run_param(res['cfg_duty_cycle'], '%.2f'), res['est_duty_cycle']))
+
+    # error summary per campaign; the period is considered as detected within 1 ms
+    for campaign in sorted(set(res['campaign'] for res in results)):
+        sel = [res for res in results if res['campaign'] == campaign]
+        # configured values missing in the folder name (None) give nan errors
+        names = ('period_ms', 'on_ms', 'duty_cycle')
+        cfg = np.array([[res['cfg_' + name] for name in names] for res in sel], dtype=np.float64)
+        est = np.array([[res['est_' + name] for name in names] for res in sel])
+        period_err, on_err, duty_err = (est - cfg).T
+        print('%s: %d runs, period detected in %d, median abs. error period %.2f ms, ON %.2f ms, duty cycle %.3f' % (
+            campaign, len(sel), np.sum(np.abs(period_err) < 1.0), np.nanmedian(np.abs(period_err)),
+            np.nanmedian(np.abs(on_err)), np.nanmedian(np.abs(duty_err))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+This is a trace-driven simulator of interference-aware WiFi scheduling. The
+interference timeline of a run (d_others / d_mac per RegMon bin on a uniform
+grid) is replayed against WiFi frames sent under several policies:
+
+    baseline        transmit whenever there is data
+    off_only        transmit only in the measured LTE-U OFF phases (oracle)
+    predicted_<e>   transmit only in the OFF phases predicted from the CSAT
+                    period, ON duration & phase estimated by LteuPhaseDetector on
+                    the last train_s seconds, re-estimated every refresh_s, with
+                    a random phase error of standard deviation e ms per cycle and
+                    a guard time
+
+A frame occupies frame_ms of airtime and collides if any of its bins is
+interfered, after a collision the station waits penalty_ms. Frames are placed
+back to back into the runs of bins a policy allows (saturated traffic: throughput
+& collision fraction), event by event from one interfered bin to the next, packets
+of a Poisson load are served FIFO by these frame slots with retransmission until
+success (latency), on whole arrays.
+
+The normalized iperf throughput of the run is reported as reference for the
+simulated baseline.
+
+Usage:
+    python3 sched_sim.py ../traces/wiplus_dl_lte-fb_20161223/
+    python3 sched_sim.py ../traces --pred-error-ms 0 1 5 --guard-ms 0.5 --load 0.3 -j 4 --report sim.csv
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import argparse
+import functools
+import numpy as np
+
+from lteu_wifi.parser import Iperf3, RegMon, Config, format_run_param
+from lteu_wifi.phase_detector import LteuPhaseDetector, to_uniform_grid, get_runs, debounce
+from lteu_wifi.trace_cache import TraceCache
+from lteu_wifi.campaign import run_campaign, print_failures
+from lteu_wifi.profiling import write_report
+
+# max. WiFi throughput (Mbps) without interference, see run_ed_detector.py
+MAX_TX_THROUGHPUT = 29.0
+# airtime of a frame incl. overhead, ms
+FRAME_MS = 1.0
+# time a station waits after a collided frame (ACK timeout & backoff), ms
+PENALTY_MS = 1.0
+# offered load of the latency simulation relative to the frame rate of a free channel
+LOAD = 0.3
+# seconds of samples the phases are estimated on, the first TRAIN_S of a run are not evaluated
+TRAIN_S = 5.0
+# the predicted phases are re-estimated every REFRESH_S seconds
+REFRESH_S = 1.0
+# standard deviations of the phase prediction error, ms
+PRED_ERRORS_MS = (0.0, 1.0, 5.0)
+# predicted ON phases are extended by this time on both sides, ms
+GUARD_MS = 0.5
+LATENCY_PERCENTILES = (50, 95, 99)
+
+### policies: bins a policy allows to transmit in ###
+def predict_timing(regmon_dat, detector, t0, num_bins, first_bin, window_s=TRAIN_S, refresh_s=REFRESH_S):
+    # CSAT timing of the blocks of refresh_s from first_bin on, each estimated by the phase
+    # detector on the window_s seconds before the block as a station would do it online (see
+    # StreamingLteuPhaseDetector); returns the first bin of each block & its period, ON
+    # duration & phase (ms, relative to t0)
+    res_ms = detector.res_ms
+    block_start = np.arange(first_bin, num_bins, max(int(refresh_s * 1000 / res_ms), 1))
+    # ktime may step backwards, the windows are searched in its running maximum
+    ktime = np.maximum.accumulate(regmon_dat['ktime'])
+    timing = np.full((block_start.size, 3), np.nan)
+    for i, start in enumerate(block_start.tolist()):
+        t_end = t0 + start * res_ms * 1e6
+        lo, hi = np.searchsorted(ktime, np.array([max(t_end - window_s * 1e9, t0), t_end], dtype=np.uint64))
+        est = detector.estimate(regmon_dat[lo:hi], t_ref=t0)
+        timing[i] = est['period_ms'], est['on_ms'], est['phase_ms']
+    return block_start, timing
+
+def get_predicted_on(num_bins, res_ms, block_start, timing, error_ms=0.0, guard_ms=0.0, rng=None):
+    # predicted LTE-U ON bins from block_start[0] on (see predict_timing), extended by guard_ms on
+    # both sides; each predicted cycle is shifted by a normally distributed error. Blocks without
+    # a valid estimate predict no ON phase.
+    if block_start.size == 0:
+        return np.zeros(0, dtype=bool)
+    lengths = np.diff(np.concatenate((block_start, [num_bins])))
+    period, on_ms, phase = (np.repeat(timing[:, i], lengths) for i in range(3))
+    valid = (period > 0) & (on_ms > 0)
+    period = np.where(valid, period, 1.0)
+    t = np.arange(block_start[0], num_bins) * res_ms - np.where(valid, phase, 0.0) + guard_ms
+    if error_ms > 0:
+        # one error per cycle & block
+        cycle = np.floor(t / period)
+        new = np.ones(t.size, dtype=bool)
+        new[1:] = cycle[1:] != cycle[:-1]
+        new[np.cumsum(lengths)[:-1]] = True
+        rng = rng if rng is not None else np.random.default_rng()
+        idx = np.cumsum(new) - 1
+        t = t - rng.normal(0.0, error_ms, idx[-1] + 1)[idx]
+    return valid & (np.mod(t, period) < np.where(valid, on_ms, 0.0) + 2 * guard_ms)
+
+### frames & packets ###
+def get_frame_slots(allowed, busy, frame_bins, penalty_bins=0):
+    # first bin & collision flag of the frames a station sends back to back within each run of
+    # allowed bins; after a collided frame it waits penalty_bins (ACK timeout & backoff). Event
+    # driven: each step places all frames up to the next interfered bin at once.
+    n = busy.size
+    # index of the next interfered bin at or after each bin, n if there is none
+    next_busy = np.full(n + 1, n, dtype=np.int64)
+    next_busy[:n] = np.minimum.accumulate(np.where(busy, np.arange(n), n)[::-1])[::-1]
+
+    seg_start, seg_num, collided = [], [], []
+    starts, lengths, vals = get_runs(allowed)
+    for a, b in zip(starts[vals].tolist(), (starts + lengths)[vals].tolist()):
+        p = a
+        while p + frame_bins <= b:
+            # clean frames up to the next interfered bin
+            k = min((int(next_busy[p]) - p) // frame_bins, (b - p) // frame_bins)
+            if k > 0:
+                seg_start.append(p)
+                seg_num.append(k)
+                p += k * frame_bins
+            if p + frame_bins > b:
+                break
+            collided.append(p)
+            p += frame_bins + penalty_bins
+
+    seg_num = np.array(seg_num, dtype=np.int64)
+    offsets = np.arange(np.sum(seg_num)) - np.repeat(np.cumsum(seg_num) - seg_num, seg_num)
+    clean = np.repeat(np.array(seg_start, dtype=np.int64), seg_num) + offsets * frame_bins
+    frames = np.concatenate((clean, np.array(collided, dtype=np.int64)))
+    is_collided = np.concatenate((np.zeros(clean.size, dtype=bool), np.ones(len(collided), dtype=bool)))
+    order = np.argsort(frames, kind='stable')
+    return frames[order], is_collided[order]
+
+def serve_packets(arrivals, slot_start, slot_end, success):
+    # FIFO service of packets arriving at arrivals (ms) by the frame slots, each packet is sent
+    # in consecutive slots until one succeeds; returns the latency (ms, nan if not delivered
+    # within the trace) & the number of transmissions per packet
+    succ_idx = np.flatnonzero(success)
+    num = arrivals.size
+    # first slot after the arrival & the successful slot it would end in if the queue was empty
+    first = np.searchsorted(slot_start, arrivals, side='left')
+    rank_min = np.searchsorted(succ_idx, first, side='left')
+    # FIFO: packet k ends in the successful slot max(rank of packet k - 1 + 1, rank_min)
+    k = np.arange(num)
+    rank = k + np.maximum.accumulate(rank_min - k) if num else rank_min
+    delivered = rank < succ_idx.size
+    if succ_idx.size:
+        end_slot = succ_idx[np.minimum(rank, succ_idx.size - 1)]
+    else:
+        end_slot = np.zeros(num, dtype=np.int64)
+    # transmissions start in the first slot after arrival or after the previous packet
+    start_slot = np.maximum(first, np.concatenate(([0], end_slot[:-1] + 1)))
+    latency = np.where(delivered, slot_end[end_slot] - arrivals if slot_end.size else np.nan, np.nan)
+    attempts = np.where(delivered, end_slot - start_slot + 1, 0)
+    return latency, attempts
+
+def simulate_policy(allowed, busy, res_ms, frame_ms=FRAME_MS, penalty_ms=PENALTY_MS, load=LOAD, rng=None):
+    # throughput (share of the airtime used by successful frames) & collision fraction with
+    # saturated traffic, latency percentiles (ms) & delivered share of a Poisson load
+    num_bins = busy.size
+    frame_bins = max(int(round(frame_ms / res_ms)), 1)
+    starts, collided = get_frame_slots(allowed, busy, frame_bins, int(round(penalty_ms / res_ms)))
+    ret = {
+        'throughput': np.count_nonzero(~collided) * frame_bins / num_bins if num_bins else np.nan,
+        'collisions': float(np.mean(collided)) if starts.size else np.nan,
+        'airtime_used': starts.size * frame_bins / num_bins if num_bins else np.nan,
+    }
+
+    # Poisson arrivals at load times the frame rate of a free channel
+    rng = rng if rng is not None else np.random.default_rng()
+    duration_ms = num_bins * res_ms
+    num = rng.poisson(load * duration_ms / frame_ms)
+    arrivals = np.sort(rng.uniform(0.0, duration_ms, num))
+    latency, attempts = serve_packets(arrivals, starts * res_ms, (starts + frame_bins) * res_ms, ~collided)
+    delivered = ~np.isnan(latency)
+    ret['delivered'] = float(np.mean(delivered)) if num else np.nan
+    ret['load_collisions'] = float(1 - np.sum(delivered) / np.sum(attempts)) if np.sum(attempts) else np.nan
+    for q in LATENCY_PERCENTILES:
+        ret['latency_p%d_ms' % q] = float(np.percentile(latency[delivered], q)) if np.any(delivered) else np.nan
+    return ret
+
+### simulation of a run ###
+def simulate_run(directory, frame_ms=FRAME_MS, penalty_ms=PENALTY_MS, load=LOAD, train_s=TRAIN_S,
+                 refresh_s=REFRESH_S, pred_errors_ms=PRED_ERRORS_MS, guard_ms=GUARD_MS, threshold=0.1,
+                 max_tx_throughput=MAX_TX_THROUGHPUT, seed=0, use_cache=True):
+    cache = TraceCache(enabled=use_cache)
+    cfg = Config()
+    config_data = cfg.load_config(os.path.join(directory, 'config.json'))
+    run_params = cfg.get_run_params(config_data)
+    regmon_dat = RegMon(cache=cache).load_decoded(os.path.join(directory, config_data['regmon']['result_file']))
+    iperf = Iperf3(cache=cache)
+    iperf3_dat = iperf.load_decoded(os.path.join(directory, config_data['iperf3']['result_file']))
+
+    # interference timeline: interfered bins & the debounced ON/OFF phases as seen by the detector
+    detector = LteuPhaseDetector(threshold)
+    res_ms = detector.res_ms
+    grid, t0 = to_uniform_grid(regmon_dat['ktime'], detector.get_intf_ratio(regmon_dat), res_ms * 1e6)
+    busy = grid > threshold
+    on = debounce(busy, int(round(detector.min_on_ms / res_ms)), int(round(detector.min_off_ms / res_ms)))
+
+    # phases predicted after the training part, all policies are evaluated on the rest
+    num_train = min(int(train_s * 1000 / res_ms), busy.size)
+    if num_train == busy.size:
+        raise ValueError('Run shorter than the training part: %.1f s of %g s' % (busy.size * res_ms / 1000, train_s))
+    block_start, timing = predict_timing(regmon_dat, detector, t0, busy.size, num_train, train_s, refresh_s)
+    busy, on = busy[num_train:], on[num_train:]
+
+    allowed = {'baseline': np.ones(busy.size, dtype=bool), 'off_only': ~on}
+    rng = np.random.default_rng(seed)
+    for error_ms in pred_errors_ms:
+        pred_on = get_predicted_on(num_train + busy.size, res_ms, block_start, timing, error_ms, guard_ms, rng)
+        allowed['predicted_%g' % error_ms] = ~pred_on
+
+    policies = {}
+    for name, mask in allowed.items():
+        policies[name] = simulate_policy(mask, busy, res_ms, frame_ms, penalty_ms, load, np.random.default_rng(seed))
+    return {
+        'directory': directory,
+        'lte_u_dc': run_params['lteu_duty_cycle'],
+        'lte_u_tx_pwr': run_params['lteu_tx_pwr'],
+        'real_airtime': float(iperf.get_normalized_tx_thr(iperf3_dat, max_tx_throughput)),
+        'est_period_ms': float(np.nanmedian(timing[:, 0])) if np.any(timing[:, 0] > 0) else np.nan,
+        'est_on_ms': float(np.nanmedian(timing[:, 1])) if np.any(timing[:, 1] > 0) else np.nan,
+        'duration_s': busy.size * res_ms / 1000,
+        'policies': policies,
+    }
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Trace-driven simulation of interference-aware WiFi scheduling')
+    arg_parser.add_argument('roots', nargs='+', help='campaign folders')
+    arg_parser.add_argument('--frame-ms', type=float, default=FRAME_MS, help='airtime of a frame, ms')
+    arg_parser.add_argument('--penalty-ms', type=float, default=PENALTY_MS, help='wait after a collision, ms')
+    arg_parser.add_argument('--load', type=float, default=LOAD, help='offered load of the latency simulation')
+    arg_parser.add_argument('--train-s', type=float, default=TRAIN_S, help='training part for the phase estimate, s')
+    arg_parser.add_argument('--refresh-s', type=float, default=REFRESH_S, help='phase re-estimation interval, s')
+    arg_parser.add_argument('--pred-error-ms', type=float, nargs='+', default=list(PRED_ERRORS_MS),
+                            help='std. deviations of the phase prediction error, ms')
+    arg_parser.add_argument('--guard-ms', type=float, default=GUARD_MS, help='guard time around predicted ON, ms')
+    arg_parser.add_argument('--threshold', type=float, default=0.1)
+    arg_parser.add_argument('--max-thr', type=float, default=MAX_TX_THROUGHPUT,
+                            help='max. WiFi throughput in Mbps for normalization')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--no-cache', action='store_true', help='do not use the decoded trace cache')
+    arg_parser.add_argument('--report', help='per run results & failures as .json or .csv')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default: all cores')
+    args = arg_parser.parse_args()
+
+    worker = functools.partial(simulate_run, frame_ms=args.frame_ms, penalty_ms=args.penalty_ms, load=args.load,
+                               train_s=args.train_s, refresh_s=args.refresh_s, pred_errors_ms=args.pred_error_ms,
+                               guard_ms=args.guard_ms, threshold=args.threshold, max_tx_throughput=args.max_thr,
+                               seed=args.seed, use_cache=not args.no_cache)
+    results, failures = run_campaign(args.roots, worker, processes=args.processes)
+    print_failures(failures)
+    if args.report:
+        write_report(args.report, results, failures)
+    if not results:
+        return
+
+    names = list(results[0]['policies'])
+    print('LTE-U duty cycle | tx pwr | real eff. airtime | throughput: %s' % ' | '.join(names))
+    for res in results:
+        print('%s | %s dBm | %.4f | %s' % (
+            format_run_param(res['lte_u_dc'], '%.2f'), format_run_param(res['lte_u_tx_pwr'], '%d'), res['real_airtime'],
+            ' | '.join('%.4f' % res['policies'][name]['throughput'] for name in names)))
+
+    print('Means over %d runs ...' % len(results))
+    print('policy | throughput | collisions | delivered | latency p50/p95/p99 [ms]')
+    for name in names:
+        mean = lambda key: np.nanmean([res['policies'][name][key] for res in results])
+        print('%s | %.4f | %.4f | %.4f | %.2f / %.2f / %.2f' % (
+            name, mean('throughput'), mean('collisions'), mean('delivered'), mean('latency_p50_ms'),
+            mean('latency_p95_ms'), mean('latency_p99_ms')))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+This is a generator of synthetic traces in the recorded formats: regmon.pklz
+(gzip'ed stream of pickled chunks of RegMon hex lines), iperf3.pklz and a
+config.json, i.e. a measurement folder which can be read by parser.py. The LTE-U
+interference follows a CSAT ON/OFF pattern given by duty cycle & period.
+
+Usage:
+    python3 synth_trace.py /tmp/synth --duration 600 --duty 0.33 --period 160
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import json
+import gzip
+import pickle
+import argparse
+import numpy as np
+
+# MAC clock ticks per usec (5 GHz, 20 MHz)
+MAC_CLOCK_MHZ = 40
+# RegMon counters are 32 bit
+COUNTER_MASK = 0xffffffff
+
+_HEX_LUT = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_DEC_LUT = np.frombuffer(b'0123456789', dtype=np.uint8)
+
+def _format_columns(columns, widths, bases):
+    # formats integer columns as zero padded digits separated by a space into a
+    # (num_lines, line_length) uint8 char matrix
+    num_lines = columns[0].size
+    parts = []
+    for col, width, base in zip(columns, widths, bases):
+        lut = _HEX_LUT if base == 16 else _DEC_LUT
+        chars = np.empty((num_lines, width), dtype=np.uint8)
+        val = col.astype(np.uint64)
+        for pos in range(width - 1, -1, -1):
+            chars[:, pos] = lut[val % np.uint64(base)]
+            val = val // np.uint64(base)
+        parts.append(chars)
+        parts.append(np.full((num_lines, 1), ord(' '), dtype=np.uint8))
+    return np.hstack(parts[:-1])
+
+def generate_regmon_counters(duration_s, duty_cycle=0.33, period_ms=80.0, phase_ms=0.0, intf_level=0.9,
+                             wifi_load=0.4, res_ms=0.5, jitter=0.05, reset_rate=0.0, seed=0,
+                             ktime_start=1482495000000000000, ktime_jitter_us=0.0, read_us=0.0):
+    # RegMon register values of duration_s / res_ms samples as (num_samples, 12) uint64 matrix:
+    # during LTE-U ON the channel is busy from other sources for intf_level of the time, WiFi
+    # transmits during wifi_load of the OFF time. MIB resets are injected with probability
+    # reset_rate per sample and happen anyway when the MAC counter would overflow. The host ktime
+    # lags the TSF by an exponentially distributed scheduling delay of mean ktime_jitter_us, the
+    # register reads take read_us on average.
+    rng = np.random.default_rng(seed)
+    num_samples = int(duration_s * 1000 / res_ms)
+    # sampling times, ms
+    t = np.cumsum(np.maximum(rng.normal(res_ms, res_ms * jitter, num_samples), res_ms / 10))
+    on = np.mod(t - phase_ms, period_ms) < duty_cycle * period_ms
+
+    d_mac = (np.diff(np.concatenate(([0.0], t))) * 1000 * MAC_CLOCK_MHZ).astype(np.int64)
+    d_tx = (d_mac * np.where(on, 0.1 * wifi_load, wifi_load) * rng.random(num_samples)).astype(np.int64)
+    d_rx = (d_mac * 0.05 * rng.random(num_samples)).astype(np.int64)
+    d_others = (d_mac * np.where(on, intf_level, 0.01) * rng.uniform(0.8, 1.0, num_samples)).astype(np.int64)
+    d_ed = np.minimum(d_tx + d_rx + d_others, d_mac)
+    d_fack = rng.poisson(0.05, num_samples)
+
+    # cumulative counters restarting after each MIB reset; a reset sample holds its delta
+    deltas = np.stack((d_mac, d_tx, d_rx, d_ed), axis=1)
+    cum = np.cumsum(deltas, axis=0)
+    reset = rng.random(num_samples) < reset_rate
+    reset[0] = True
+    # overflow resets: the cumulative MAC counter is monotonic, so the first sample exceeding
+    # 32 bit after each reset is found by bisection
+    mac = cum[:, 0]
+    seg_ends = np.append(np.flatnonzero(reset)[1:], num_samples)
+    for seg_start, seg_end in zip(np.flatnonzero(reset), seg_ends):
+        base = mac[seg_start - 1] if seg_start > 0 else 0
+        while True:
+            pos = np.searchsorted(mac, base + COUNTER_MASK, side='right')
+            if pos >= seg_end:
+                break
+            reset[pos] = True
+            base = mac[pos - 1]
+
+    seg_start = np.maximum.accumulate(np.where(reset, np.arange(num_samples), 0))
+    base = np.where(seg_start[:, np.newaxis] > 0, cum[seg_start - 1], 0)
+    counters = cum - base
+
+    fields = np.zeros((num_samples, 12), dtype=np.uint64)
+    tsf = (t * 1000).astype(np.uint64) # usec
+    ktime = t * 1e6
+    if ktime_jitter_us > 0:
+        ktime = np.maximum.accumulate(ktime + rng.exponential(ktime_jitter_us * 1000, num_samples))
+    ltsf = tsf
+    if read_us > 0:
+        ltsf = tsf + rng.poisson(read_us, num_samples).astype(np.uint64)
+    fields[:, 0] = np.uint64(ktime_start) + ktime.astype(np.uint64)
+    fields[:, 1] = tsf
+    fields[:, 2:6] = counters
+    fields[:, 6] = ltsf & np.uint64(COUNTER_MASK)
+    fields[:, 7] = d_fack
+    return fields
+
+def format_regmon_lines(fields, fixed_width=True):
+    # RegMon text lines of a field matrix: decimal ktime, hex registers; with fixed_width
+    # the registers are zero padded (TSF to 16, others to 8 digits)
+    if not fixed_width:
+        return ['%d %x %x %x %x %x %x %x %x %x %x %x' % tuple(row) for row in fields.tolist()]
+    widths = (19, 16) + (8,) * 10
+    bases = (10,) + (16,) * 11
+    chars = _format_columns([fields[:, i] for i in range(12)], widths, bases)
+    line_len = chars.shape[1]
+    buf = chars.tobytes().decode('ascii')
+    return [buf[i:i + line_len] for i in range(0, len(buf), line_len)]
+
+def generate_regmon_lines(duration_s, fixed_width=True, **kwargs):
+    # see generate_regmon_counters for the parameters
+    return format_regmon_lines(generate_regmon_counters(duration_s, **kwargs), fixed_width)
+
+def write_regmon_pklz(fn, lines, chunk_size=1000, compresslevel=9):
+    # same layout as recorded: a gzip'ed stream of pickled lists of lines
+    with gzip.open(fn, 'wb', compresslevel=compresslevel) as fo:
+        for i in range(0, len(lines), chunk_size):
+            pickle.dump(lines[i:i + chunk_size], fo)
+
+def write_regmon_fields_pklz(fn, fields, chunk_size=1000, fixed_width=True, block_size=100000, compresslevel=9):
+    # as write_regmon_pklz for a field matrix; the lines are formatted block by block so that
+    # hour long traces never exist as a whole list of lines. Lower compression levels are
+    # much faster to write and read back at about the same speed.
+    block_size = max(block_size // chunk_size, 1) * chunk_size
+    with gzip.open(fn, 'wb', compresslevel=compresslevel) as fo:
+        for start in range(0, fields.shape[0], block_size):
+            lines = format_regmon_lines(fields[start:start + block_size], fixed_width)
+            for i in range(0, len(lines), chunk_size):
+                pickle.dump(lines[i:i + chunk_size], fo)
+
+def generate_iperf3_doc(duration_s, interval_s=0.1, duty_cycle=0.33, max_thrpt_mbps=29.0, seed=0,
+                        cookie_sec=1482495000, cookie_usec=0):
+    # iperf3 json output (bytes, incl. the -nan iperf writes for undefined values) of a UDP
+    # test whose throughput is reduced by the LTE-U duty cycle
+    rng = np.random.default_rng(seed)
+    num_intervals = int(round(duration_s / interval_s))
+    bps = max_thrpt_mbps * 1e6 * (1 - duty_cycle) * rng.uniform(0.9, 1.1, num_intervals)
+    intervals = []
+    for i in range(num_intervals):
+        summary = {'start': i * interval_s, 'end': (i + 1) * interval_s, 'seconds': interval_s,
+                   'bytes': int(bps[i] * interval_s / 8), 'bits_per_second': bps[i],
+                   'jitter_ms': 0.1, 'lost_packets': 0, 'packets': int(bps[i] * interval_s / 8 / 1470),
+                   'lost_percent': 0.0, 'omitted': False}
+        intervals.append({'streams': [dict(summary, socket=5)], 'sum': summary})
+    doc = {
+        'start': {'cookie': 'synth.%d.%06d.000000' % (cookie_sec, cookie_usec),
+                  'test_start': {'protocol': 'UDP', 'num_streams': 1, 'reverse': 0}},
+        'intervals': intervals,
+        'end': {'sum': {'jitter_ms': 0.1, 'lost_percent': 'NAN'}},
+    }
+    return json.dumps(doc).replace('"NAN"', '-nan').encode('utf-8')
+
+def write_iperf3_pklz(fn, doc, compresslevel=9):
+    with gzip.open(fn, 'wb', compresslevel=compresslevel) as fo:
+        pickle.dump(doc, fo)
+
+def write_measurement(out_dir, duration_s, duty_cycle=0.33, period_ms=80.0, lteu_tx_pwr=-10, chunk_size=1000,
+                      seed=0, compresslevel=9, **kwargs):
+    # writes a complete measurement folder (config.json, regmon.pklz, iperf3.pklz) below out_dir
+    # named like the recorded ones, returns its path
+    on_ms = duty_cycle * period_ms
+    meas_name = ('wifi=11a-5240mhz-15dbm-noani-siso_L2Probe=False_ICMPProbe=False_IPerf=udp-90M-dl=True_'
+                 'lteu=64qam_duty%d-on%gms-off%gms-%ddbm_RMres=0.50_runt=%d' % (
+                     round(duty_cycle * 100), on_ms, period_ms - on_ms, lteu_tx_pwr, duration_s))
+    directory = os.path.join(out_dir, meas_name)
+    os.makedirs(directory, exist_ok=True)
+
+    config_data = {
+        'common': {'data_dir': out_dir, 'meas_name': meas_name, 'runtime': duration_s, 'update_interval': 1000.0},
+        'regmon': {'result_file': 'regmon.pklz', 'iface': 'ath0', 'sampling_interval': 0.5, 'cpu_use': 1},
+        'iperf3': {'result_file': 'iperf3.pklz', 'sampling_interval': 100.0, 'bandwidth': '90M', 'downlink': True,
+                   'server': '192.168.2.2', 'enable': True, 'cpu_use': 2},
+        'iometer': {'result_file': 'iometer.pklz', 'iface': 'ath0', 'sampling_interval': 100.0, 'cpu_use': 0},
+    }
+    with open(os.path.join(directory, 'config.json'), 'w') as fo:
+        json.dump(config_data, fo, indent=4)
+
+    fields = generate_regmon_counters(duration_s, duty_cycle=duty_cycle, period_ms=period_ms, seed=seed, **kwargs)
+    write_regmon_fields_pklz(os.path.join(directory, 'regmon.pklz'), fields, chunk_size,
+                             compresslevel=compresslevel)
+    # iperf & RegMon share the clock
+    ktime_start = int(fields[0, 0])
+    write_iperf3_pklz(os.path.join(directory, 'iperf3.pklz'),
+                      generate_iperf3_doc(duration_s, duty_cycle=duty_cycle, seed=seed,
+                                          cookie_sec=ktime_start // 10 ** 9, cookie_usec=ktime_start % 10 ** 9 // 1000),
+                      compresslevel=compresslevel)
+    return directory
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Synthetic RegMon & iperf traces')
+    arg_parser.add_argument('out_dir', help='campaign folder, the measurement folder is created below')
+    arg_parser.add_argument('--duration', type=float, default=30, help='s')
+    arg_parser.add_argument('--duty', type=float, default=0.33, help='LTE-U duty cycle, 0..1')
+    arg_parser.add_argument('--period', type=float, default=80, help='CSAT period, ms')
+    arg_parser.add_argument('--phase', type=float, default=0, help='start of the first ON phase, ms')
+    arg_parser.add_argument('--intf', type=float, default=0.9, help='interference level during ON, 0..1')
+    arg_parser.add_argument('--pwr', type=int, default=-10, help='LTE-U tx power, dBm (name only)')
+    arg_parser.add_argument('--resets', type=float, default=0.0, help='MIB reset probability per sample')
+    arg_parser.add_argument('--ktime-jitter', type=float, default=0.0, help='mean host timestamp delay, usec')
+    arg_parser.add_argument('--read', type=float, default=0.0, help='mean register read duration, usec')
+    arg_parser.add_argument('--chunk', type=int, default=1000, help='lines per pickled chunk')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    directory = write_measurement(args.out_dir, args.duration, args.duty, args.period, args.pwr, args.chunk,
+                                  args.seed, phase_ms=args.phase, intf_level=args.intf, reset_rate=args.resets,
+                                  ktime_jitter_us=args.ktime_jitter, read_us=args.read)
+    print('Written %s' % directory)
+
+if __name__ == '__main__':
+    main()
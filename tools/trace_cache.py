@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+This is a persistent on-disk cache for decoded traces (RegMon & iperf). Decoded
+structured arrays are stored as .npy files and memory mapped on later runs, so
+the gunzip, unpickle & decode steps are only done once per trace file. The data
+quality counters of the decoder are kept next to them in a .json file.
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'lteu_wifi')
+DEFAULT_MAX_SIZE = 4 * 1024 ** 3 # bytes
+
+def file_sha1(fn):
+    # content hash of a file, read block by block
+    h = hashlib.sha1()
+    with open(fn, 'rb') as fo:
+        for block in iter(lambda: fo.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class TraceCache():
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_SIZE, enabled=True, content_hash=False):
+        if cache_dir is None:
+            cache_dir = os.environ.get('LTEU_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.enabled = enabled
+        # key by the file content instead of its size & modification time
+        self.content_hash = content_hash
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get_key(self, fn, decoder_version):
+        fn = os.path.abspath(fn)
+        st = os.stat(fn)
+        if self.content_hash:
+            file_id = file_sha1(fn)
+        else:
+            file_id = '%d' % st.st_mtime_ns
+        key = '%s|%d|%s|%s' % (fn, st.st_size, file_id, decoder_version)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get_fname(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def get_counts_fname(self, cache_fn):
+        return cache_fn[:-len('.npy')] + '.json'
+
+    def load(self, fn, decoder_version, with_counts=False):
+        # returns the cached array (read-only memory map) or None; with_counts=True returns
+        # (array, decoder counters) or None, entries stored without counters are misses then
+        if not self.enabled:
+            return None
+        cache_fn = self.get_fname(self.get_key(fn, decoder_version))
+        try:
+            dat = np.load(cache_fn, mmap_mode='r')
+            if with_counts:
+                with open(self.get_counts_fname(cache_fn)) as fo:
+                    dat = (dat, json.load(fo))
+        except (OSError, ValueError):
+            self.stats['misses'] += 1
+            return None
+        # mark as recently used for the eviction
+        os.utime(cache_fn)
+        self.stats['hits'] += 1
+        return dat
+
+    def store(self, fn, decoder_version, dat, counts=None):
+        # counts: optional decoder counters of dat, e.g. the increments of RegMon.stats
+        if not self.enabled:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_fn = self.get_fname(self.get_key(fn, decoder_version))
+        # write to a temporary file first so that concurrent readers never see partial files;
+        # the counters go first, a reader finding the array finds its counters as well
+        if counts is not None:
+            counts_fn = self.get_counts_fname(cache_fn)
+            tmp_fn = '%s.%d.tmp' % (counts_fn, os.getpid())
+            with open(tmp_fn, 'w') as fo:
+                json.dump(counts, fo)
+            os.replace(tmp_fn, counts_fn)
+        tmp_fn = '%s.%d.tmp' % (cache_fn, os.getpid())
+        with open(tmp_fn, 'wb') as fo:
+            np.save(fo, dat)
+        os.replace(tmp_fn, cache_fn)
+        self.stats['stores'] += 1
+        self.evict()
+
+    def evict(self):
+        # remove least recently used entries until the cache fits into max_size
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total_size = sum(e[1] for e in entries)
+        for mtime, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            try:
+                os.remove(self.get_counts_fname(path))
+            except OSError:
+                pass
+            total_size -= size
+            self.stats['evictions'] += 1
+
+    def get_or_decode(self, fn, decoder_version, decode, counters=None):
+        # cached decoded data of trace file fn, decode(fn) is only called on a miss; counters
+        # (e.g. RegMon.stats, updated by decode) are increased by the cached counts on a hit
+        if counters is None:
+            dat = self.load(fn, decoder_version)
+            if dat is None:
+                dat = decode(fn)
+                self.store(fn, decoder_version, dat)
+            return dat
+        entry = self.load(fn, decoder_version, with_counts=True)
+        if entry is not None:
+            dat, counts = entry
+            for key, val in counts.items():
+                counters[key] = counters.get(key, 0) + val
+            return dat
+        before = dict(counters)
+        dat = decode(fn)
+        counts = {key: val - before.get(key, 0) for key, val in counters.items()}
+        self.store(fn, decoder_version, dat, counts)
+        return dat
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy') or name.endswith('.json'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def print_stats(self):
+        print('Trace cache %s: %d hits, %d misses, %d stores, %d evictions' % (
+            self.cache_dir, self.stats['hits'], self.stats['misses'], self.stats['stores'],
+            self.stats['evictions']))
+
+def sum_stats(stats_list):
+    # adds up TraceCache.stats of several caches, e.g. from different worker processes
+    total = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+    for stats in stats_list:
+        for key, val in stats.items():
+            total[key] = total.get(key, 0) + val
+    return total
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+This is a data quality check of measurement folders, meant to run before the
+expensive decode. For each folder it checks
+
+- config.json and the files it references (exist, non-empty, not a git LFS pointer)
+- the gzip & pickle streams of the RegMon & iperf traces (intact, complete)
+- the RegMon lines (field count, hex/decimal digits)
+- the RegMon timing: non-monotonic ktime/TSF, duplicate samples, sampling gaps
+  relative to regmon.sampling_interval and the MIB reset frequency (warnings
+  only, the analysis copes with them, e.g. with ktime stepping backwards)
+
+and gives a per folder quality report. Folders with errors go into a quarantine
+list (one folder per line), which the batch scripts can skip, see
+batch_analysis.py --quarantine and run_campaign(skip=...).
+
+Usage:
+    python3 validate.py ../traces/wiplus_dl_lte-fb_20161223/ --report quality.json --quarantine quarantine.txt
+
+@author: Olbrich, Zubow (TU Berlin)
+"""
+import os
+import re
+import json
+import gzip
+import zlib
+import pickle
+import argparse
+import numpy as np
+
+from lteu_wifi.parser import RegMon, Iperf3, REGMON_NUM_FIELDS
+from lteu_wifi.campaign import run_campaign
+
+# sections of config.json whose result_file is needed for the analysis
+REQUIRED_FILES = ('regmon', 'iperf3')
+# a step in ktime of more than GAP_FACTOR sampling intervals is a gap
+GAP_FACTOR = 3.0
+# warn above this number of MIB resets per second
+MAX_MIB_RESETS_PER_S = 1.0
+# warn if the RegMon trace covers less than this share of the configured runtime
+MIN_RUNTIME_COVERAGE = 0.9
+# number of examples kept per issue
+MAX_EXAMPLES = 5
+
+# RegMon fields needed for the timing checks: ktime, TSF & MAC counter; all others are
+# only checked for valid digits
+REGMON_COLUMNS = (0, 1, 2)
+
+_LFS_POINTER = b'version https://git-lfs'
+_REGMON_LINE = re.compile(r'\s*\d+(?:\s+[0-9a-fA-F]+){%d}\s*' % (REGMON_NUM_FIELDS - 1))
+
+class QualityReport():
+    # issues of a single measurement folder: errors (folder is quarantined) & warnings
+    def __init__(self, directory):
+        self.directory = directory
+        self.errors = []
+        self.warnings = []
+        self.checks = {}
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+    def to_dict(self):
+        status = 'error' if self.errors else 'warning' if self.warnings else 'ok'
+        return {'directory': self.directory, 'status': status, 'errors': self.errors,
+                'warnings': self.warnings, 'checks': self.checks}
+
+def check_file(report, fn, required=True):
+    # exists, non-empty & not a git LFS pointer; returns True if the file can be read
+    issue = report.error if required else report.warning
+    name = os.path.basename(fn)
+    try:
+        size = os.path.getsize(fn)
+    except OSError:
+        issue('%s missing' % name)
+        return False
+    if size == 0:
+        issue('%s empty' % name)
+        return False
+    with open(fn, 'rb') as fo:
+        if fo.read(len(_LFS_POINTER)) == _LFS_POINTER:
+            issue('%s is a git LFS pointer, the data was not fetched' % name)
+            return False
+    return True
+
+def iter_pickle_stream(fn):
+    # yields the pickled objects of a gzip'ed stream; unlike RegMon.load_data_iter a truncated
+    # stream raises EOFError instead of ending silently
+    with gzip.open(fn, 'rb') as fo:
+        while True:
+            pos = fo.tell()
+            try:
+                obj = pickle.load(fo)
+            except EOFError:
+                # clean end: nothing of a further object was read & the gzip stream is complete
+                if fo.tell() != pos or fo.read(1) != b'':
+                    raise EOFError('truncated pickle stream')
+                return
+            yield obj
+
+def check_regmon_lines(regmon, chunk, offset, counts, examples):
+    # counts malformed lines of one chunk; returns ktime, TSF & MAC counter of the well-formed
+    # lines. The whole chunk is parsed at once, only chunks which fail are checked line by line.
+    lines = [line for line in chunk if line]
+    counts['empty_lines'] += len(chunk) - len(lines)
+    try:
+        return regmon.get_regmon_fields_array(lines, REGMON_COLUMNS)
+    except (ValueError, TypeError, AttributeError):
+        pass
+    good = []
+    for i, line in enumerate(chunk):
+        if not line:
+            continue
+        if not isinstance(line, str):
+            kind = 'not_text'
+        elif len(line.split()) != REGMON_NUM_FIELDS:
+            kind = 'wrong_field_count'
+        elif not _REGMON_LINE.fullmatch(line):
+            kind = 'invalid_digits'
+        else:
+            good.append(line)
+            continue
+        counts[kind] += 1
+        if len(examples) < MAX_EXAMPLES:
+            examples.append('line %d (%s): %r' % (offset + i, kind, line[:120] if isinstance(line, str) else line))
+    return regmon.get_regmon_fields_array(good, REGMON_COLUMNS)
+
+def check_regmon(report, fn, sampling_interval_ms, runtime_s):
+    counts = {'lines': 0, 'empty_lines': 0, 'wrong_field_count': 0, 'invalid_digits': 0, 'not_text': 0}
+    examples = []
+    regmon = RegMon()
+    parts = []
+    try:
+        for chunk in iter_pickle_stream(fn):
+            if not isinstance(chunk, (list, tuple)):
+                report.error('regmon: unexpected pickled object %s' % type(chunk).__name__)
+                return
+            fields = check_regmon_lines(regmon, chunk, counts['lines'], counts, examples)
+            counts['lines'] += len(chunk)
+            parts.append(fields)
+    except (OSError, EOFError, zlib.error, pickle.UnpicklingError, ValueError) as ex:
+        report.error('regmon: corrupted stream after %d lines (%s: %s)' % (counts['lines'], type(ex).__name__, ex))
+    report.checks['regmon'] = counts
+
+    num_malformed = counts['wrong_field_count'] + counts['invalid_digits'] + counts['not_text']
+    if num_malformed:
+        report.error('regmon: %d malformed lines, e.g. %s' % (num_malformed, '; '.join(examples)))
+    fields = np.concatenate(parts) if parts else np.zeros((0, 3), dtype=np.uint64)
+    if fields.shape[0] < 2:
+        report.error('regmon: less than 2 valid lines')
+        return
+    report.checks['regmon'].update(check_regmon_timing(report, fields, sampling_interval_ms, runtime_s))
+
+def check_regmon_timing(report, fields, sampling_interval_ms, runtime_s):
+    # ktime (ns), TSF (us) & MAC counter columns of all lines
+    ktime = fields[:, 0].astype(np.int64)
+    d_ktime = np.diff(ktime)
+    d_tsf = np.diff(fields[:, 1].astype(np.int64))
+    mac = fields[:, 2]
+    res_ns = sampling_interval_ms * 1e6
+
+    backwards = d_ktime < 0
+    duplicates = (d_ktime == 0) & (mac[1:] == mac[:-1])
+    gaps = d_ktime > GAP_FACTOR * res_ns
+    mib_resets = mac[1:] <= mac[:-1]
+    duration_s = (ktime.max() - ktime.min()) / 1e9
+    stats = {
+        'samples': int(ktime.size - 1),
+        'duration_s': float(duration_s),
+        'median_interval_ms': float(np.median(d_ktime) / 1e6),
+        'ktime_backwards': int(np.count_nonzero(backwards)),
+        'tsf_backwards': int(np.count_nonzero(d_tsf < 0)),
+        'duplicates': int(np.count_nonzero(duplicates)),
+        'gaps': int(np.count_nonzero(gaps)),
+        'max_gap_ms': float(d_ktime.max() / 1e6),
+        'gap_time_s': float(np.sum(d_ktime[gaps]) / 1e9),
+        'mib_resets': int(np.count_nonzero(mib_resets & ~duplicates)),
+    }
+    stats['mib_resets_per_s'] = stats['mib_resets'] / duration_s if duration_s > 0 else 0.0
+
+    if stats['ktime_backwards']:
+        first = int(np.argmax(backwards)) + 1
+        report.warning('regmon: ktime not monotonic (%d steps backwards, first at line %d)' % (
+            stats['ktime_backwards'], first))
+    if stats['tsf_backwards']:
+        report.warning('regmon: TSF not monotonic (%d steps backwards)' % stats['tsf_backwards'])
+    if stats['duplicates']:
+        report.warning('regmon: %d duplicate samples' % stats['duplicates'])
+    if stats['gaps']:
+        report.warning('regmon: %d sampling gaps > %g ms (max %.1f ms, %.3f s in total)' % (
+            stats['gaps'], GAP_FACTOR * sampling_interval_ms, stats['max_gap_ms'], stats['gap_time_s']))
+    if abs(stats['median_interval_ms'] - sampling_interval_ms) > 0.1 * sampling_interval_ms:
+        report.warning('regmon: median sampling interval %.3f ms, configured %g ms' % (
+            stats['median_interval_ms'], sampling_interval_ms))
+    if stats['mib_resets_per_s'] > MAX_MIB_RESETS_PER_S:
+        report.warning('regmon: %.1f MIB resets/s' % stats['mib_resets_per_s'])
+    if runtime_s and duration_s < MIN_RUNTIME_COVERAGE * runtime_s:
+        report.warning('regmon: trace covers %.1f s of the configured %g s' % (duration_s, runtime_s))
+    return stats
+
+def check_iperf3(report, fn):
+    iperf = Iperf3()
+    try:
+        dat = iperf.load_data(fn)
+    except (OSError, EOFError, zlib.error, pickle.UnpicklingError, ValueError, TypeError) as ex:
+        report.error('iperf3: unreadable (%s: %s)' % (type(ex).__name__, ex))
+        return
+    intervals = dat.get('intervals') if isinstance(dat, dict) else None
+    report.checks['iperf3'] = {'intervals': len(intervals) if intervals else 0}
+    if not intervals:
+        report.error('iperf3: no intervals')
+    elif 'start' not in dat:
+        report.error('iperf3: no start section')
+
+def validate_run(directory):
+    # quality report of a single measurement folder, see QualityReport.to_dict
+    report = QualityReport(directory)
+    config_fn = os.path.join(directory, 'config.json')
+    try:
+        with open(config_fn) as fo:
+            config_data = json.load(fo)
+        meas_name = config_data['common']['meas_name']
+    except (OSError, ValueError, KeyError, TypeError) as ex:
+        report.error('config.json unreadable (%s: %s)' % (type(ex).__name__, ex))
+        return report.to_dict()
+    report.checks['meas_name'] = meas_name
+
+    readable = {}
+    for section, params in sorted(config_data.items()):
+        if not isinstance(params, dict) or 'result_file' not in params or params.get('enable') is False:
+            continue
+        fn = os.path.join(directory, params['result_file'])
+        readable[section] = check_file(report, fn, required=section in REQUIRED_FILES)
+    for section in REQUIRED_FILES:
+        if section not in readable:
+            report.error('config.json: no %s result_file' % section)
+
+    if readable.get('regmon'):
+        check_regmon(report, os.path.join(directory, config_data['regmon']['result_file']),
+                     config_data['regmon'].get('sampling_interval', 0.5), config_data['common'].get('runtime'))
+    if readable.get('iperf3'):
+        check_iperf3(report, os.path.join(directory, config_data['iperf3']['result_file']))
+    return report.to_dict()
+
+### quarantine list ###
+def write_quarantine(fn, reports):
+    # folders with errors, one absolute path per line
+    with open(fn, 'w') as fo:
+        for report in reports:
+            if report['status'] == 'error':
+                fo.write(os.path.abspath(report['directory']) + '\n')
+
+def load_quarantine(fn):
+    # set of absolute folder paths, see write_quarantine
+    with open(fn) as fo:
+        return set(os.path.abspath(line.strip()) for line in fo if line.strip())
+
+def validate_campaign(base_dirs, processes=None):
+    # reports of all measurement folders, ordered by folder; a crash of the validator itself is
+    # reported as error of the folder
+    results, failures = run_campaign(base_dirs, validate_run, processes=processes)
+    for failure in failures:
+        results.append({'directory': failure['directory'], 'status': 'error',
+                        'errors': ['validator failed (%s: %s)' % (failure['error'], failure['message'])],
+                        'warnings': [], 'checks': {}})
+    return sorted(results, key=lambda rep: rep['directory'])
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Data quality check of measurement folders')
+    arg_parser.add_argument('roots', nargs='+', help='campaign folders')
+    arg_parser.add_argument('--report', help='per folder quality report (.json)')
+    arg_parser.add_argument('--quarantine', help='list of the folders with errors, to be skipped by the batch scripts')
+    arg_parser.add_argument('-v', '--verbose', action='store_true', help='show warnings of all folders')
+    arg_parser.add_argument('-j', '--processes', type=int, default=None, help='worker processes, default: all cores')
+    args = arg_parser.parse_args()
+
+    reports = validate_campaign(args.roots, args.processes)
+    for report in reports:
+        if report['status'] == 'error' or (args.verbose and report['warnings']):
+            print('%s: %s' % (report['status'].upper(), report['directory']))
+            for msg in report['errors'] + report['warnings']:
+                print('    %s' % msg)
+
+    num = {status: sum(1 for rep in reports if rep['status'] == status) for status in ('ok', 'warning', 'error')}
+    print('%d folders: %d ok, %d with warnings, %d with errors' % (len(reports), num['ok'], num['warning'],
+                                                                    num['error']))
+    if args.report:
+        with open(args.report, 'w') as fo:
+            json.dump(reports, fo, indent=4)
+        print('Report written to %s' % args.report)
+    if args.quarantine:
+        write_quarantine(args.quarantine, reports)
+        print('Quarantine list written to %s (%d folders)' % (args.quarantine, num['error']))
+
+if __name__ == '__main__':
+    main()